@@ -1,22 +1,237 @@
-from flask import Flask, request, jsonify, session, render_template
+from flask import Flask, request, jsonify, session, render_template, Response
 from flask_cors import CORS
-from database import Database
+from complexity import describe_budget
+from database import EXPORT_SOURCES, get_database, last_write_at
+from exports import EXPORT_FORMATS, export_chunks, export_filename, export_params
+from grader import GraderPool
+from live_updates import LivePublisher, Subscription
+from plagiarism import SIMILARITY_THRESHOLD
+from rate_limits import client_address, rate_limiter_from_env
+from search import SEARCH_KINDS
+from sandbox import GRADING_MODES, PERFORMANCE, RUN_ALL, FAIL_FAST, grading_total
+from serialization import CompactJSONProvider, dumps_json
 import os
-from openai import OpenAI
 import sys
-import io
+import threading
+import time
 import traceback
-from contextlib import redirect_stdout, redirect_stderr
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+app.json = CompactJSONProvider(app)
 CORS(app)
 
-db = Database()
+db = get_database()
+grader_pool = GraderPool(db.db_name, workers=int(os.environ.get('GRADER_WORKERS', 0)) or None)
 
-# the newest OpenAI model is "gpt-5" which was released August 7, 2025.
-# do not change this unless explicitly requested by the user
-openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+# Grading CPU quota per user: at most GRADING_CPU_QUOTA_MS of sandbox CPU time
+# within any GRADING_QUOTA_WINDOW seconds
+GRADING_CPU_QUOTA_MS = int(os.environ.get('GRADING_CPU_QUOTA_MS', 60000))
+GRADING_QUOTA_WINDOW = int(os.environ.get('GRADING_QUOTA_WINDOW', 3600))
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+REVIEW_PAGE_SIZE = 20
+REVIEW_MAX_PAGE_SIZE = 50
+
+# Usernames allowed to use the /api/instructor endpoints, comma-separated
+INSTRUCTORS = frozenset(name.strip() for name in os.environ.get('INSTRUCTORS', '').split(',') if name.strip())
+
+# Bounds for a user's grading weight: their share of grader CPU relative to
+# others when the queue is busy
+MIN_GRADING_WEIGHT = 0.1
+MAX_GRADING_WEIGHT = 10
+
+SIMILAR_SUBMISSION_COUNT = 20
+SIMILAR_SUBMISSION_MAX_COUNT = 100
+
+# Served from the table recommender.py fills (it stores 10 per learner)
+RECOMMENDATION_COUNT = 5
+RECOMMENDATION_MAX_COUNT = 10
+
+# Per-route request rate limits (see rate_limits.py). TRUSTED_PROXIES is the
+# number of reverse proxies in front of the app whose X-Forwarded-For
+# entries name the client.
+rate_limiter = rate_limiter_from_env()
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+# Created on first chatbot use: importing openai takes longer than loading
+# the rest of the app (see benchmarks/import_time.py)
+openai_client = None
+openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    global openai_client
+    with openai_client_lock:
+        if openai_client is None:
+            from openai import OpenAI
+            openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return openai_client
+
+# Helpers shared with the ASGI app (asgi.py)
+def safe_user_data(user):
+    # Return only safe user data (exclude password hash)
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'email': user['email'],
+        'full_name': user['full_name'],
+        'points': user['points']
+    }
+
+def score_quiz(quiz, answers):
+    score = 0
+    total = len(quiz['questions'])
+    results = []
+    
+    for i, question in enumerate(quiz['questions']):
+        user_answer = answers.get(str(i))
+        correct = user_answer == question['correct']
+        if correct:
+            score += 1
+        results.append({
+            'question': question['question'],
+            'correct': correct,
+            'user_answer': user_answer,
+            'correct_answer': question['correct']
+        })
+    
+    return {
+        'score': score,
+        'total': total,
+        'percentage': round((score / total) * 100, 2),
+        'points_earned': int((score / total) * quiz['points']),
+        'results': results
+    }
+
+def quiz_outcomes(result):
+    # Question index -> answered correctly, for the review scheduler
+    return {i: question['correct'] for i, question in enumerate(result['results'])}
+
+def is_instructor(user):
+    return user is not None and user['username'] in INSTRUCTORS
+
+def similar_submission_params(args):
+    threshold = min(max(0.0, args.get('threshold', SIMILARITY_THRESHOLD, type=float)), 1.0)
+    limit = min(max(1, args.get('limit', SIMILAR_SUBMISSION_COUNT, type=int)), SIMILAR_SUBMISSION_MAX_COUNT)
+    return threshold, limit
+
+def grading_weight_param(data):
+    """The weight from a request body; raises ValueError with a message for the client"""
+    weight = (data or {}).get('weight')
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) \
+            or not MIN_GRADING_WEIGHT <= weight <= MAX_GRADING_WEIGHT:
+        raise ValueError(f'weight must be a number from {MIN_GRADING_WEIGHT} to {MAX_GRADING_WEIGHT}')
+    return float(weight)
+
+def grading_quota_retry_after(usage):
+    """Seconds until a user over the grading CPU quota may submit again, or None"""
+    if usage['cpu_ms'] < GRADING_CPU_QUOTA_MS:
+        return None
+    # Capacity frees up as the oldest grading job in the window ages out
+    return max(1, usage['oldest_at'] + GRADING_QUOTA_WINDOW - int(time.time()))
+
+def challenge_view(challenge):
+    # Don't send test cases to frontend for security, nor the performance
+    # check's setup and call; the check is only described
+    challenge.pop('test_cases', None)
+    performance = challenge.pop('performance', None)
+    challenge['performance'] = describe_budget(performance) if performance else None
+    return challenge
+
+def too_many_requests(message, retry_after):
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def grading_job_view(job):
+    # Never echo the submitted code or worker internals back to the client
+    return {
+        'id': job['id'],
+        'challenge_id': job['challenge_id'],
+        'status': job['status'],
+        'mode': job['mode'],
+        'attempts': job['attempts'],
+        'test_results': job['test_results'],
+        'result': job['result'],
+        'error': 'Grading failed, please resubmit' if job['status'] == 'error' else None
+    }
+
+def sse(event, payload):
+    return f'event: {event}\ndata: {dumps_json(payload).decode()}\n\n'
+
+def dashboard_view(dashboard):
+    return dict(dashboard, user=safe_user_data(dashboard['user']))
+
+def search_params(args):
+    """(query, type, page, per_page) from /api/search's query string"""
+    kind = args.get('type') or None
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise ValueError(f"type must be one of: {', '.join(SEARCH_KINDS)}")
+    page = max(1, args.get('page', 1, type=int))
+    per_page = min(max(1, args.get('per_page', SEARCH_PAGE_SIZE, type=int)), SEARCH_MAX_PAGE_SIZE)
+    return args.get('q', '').strip(), kind, page, per_page
+
+def search_view(query, page, per_page, results, has_more):
+    return {'query': query, 'page': page, 'per_page': per_page, 'results': results, 'has_more': has_more}
+
+# Pushes leaderboard and progress changes to clients of /api/events
+live_publisher = LivePublisher(db, sse, dashboard_view)
+
+# Set once the server starts shutting down. Event streams would otherwise
+# stay open for minutes and hold up a graceful shutdown or reload
+streams_closing = threading.Event()
+
+def close_streams():
+    """End open event streams; clients reconnect, or poll for grading jobs"""
+    streams_closing.set()
+    live_publisher.close()
+
+def chatbot_request(user_message):
+    # the newest OpenAI model is "gpt-5" which was released August 7, 2025.
+    # do not change this unless explicitly requested by the user
+    return {
+        'model': "gpt-5",
+        'messages': [
+            {
+                "role": "system",
+                "content": "You are an AI assistant specialized in Machine Learning, Data Science, and Python programming. Help students understand ML concepts, debug code, and prepare for technical interviews. Provide clear explanations with examples when appropriate."
+            },
+            {
+                "role": "user",
+                "content": user_message
+            }
+        ],
+        'max_completion_tokens': 1000
+    }
+
+@app.before_request
+def limit_request_rate():
+    # CORS preflights don't count against the request they precede
+    if request.method == 'OPTIONS' or not rate_limiter.applies_to(request.endpoint):
+        return None
+    retry_after = rate_limiter.retry_after(
+        request.endpoint,
+        client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), TRUSTED_PROXIES),
+        session.get('user_id')
+    )
+    if retry_after:
+        return too_many_requests('Too many requests, please try again later', retry_after)
+
+# Read-your-writes: a session that just wrote reads from the primary until
+# replicas have caught up. The write time travels in the session cookie, so it
+# holds whichever server process handles the next request.
+@app.before_request
+def bind_database_session():
+    last_write_at.set(session.get('db_write_at'))
+
+@app.after_request
+def remember_database_writes(response):
+    written = last_write_at.get()
+    if db.replica_lag_seconds and written and written != session.get('db_write_at'):
+        session['db_write_at'] = written
+    return response
 
 # Routes
 @app.route('/')
@@ -43,15 +258,7 @@ def login():
     user = db.authenticate_user(data['username'], data['password'])
     if user:
         session['user_id'] = user['id']
-        # Return only safe user data (exclude password hash)
-        safe_user = {
-            'id': user['id'],
-            'username': user['username'],
-            'email': user['email'],
-            'full_name': user['full_name'],
-            'points': user['points']
-        }
-        return jsonify({'success': True, 'user': safe_user})
+        return jsonify({'success': True, 'user': safe_user_data(user)})
     return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
 
 @app.route('/api/logout', methods=['POST'])
@@ -64,16 +271,8 @@ def get_user():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     user = db.get_user(session['user_id'])
-    # Return only safe user data (exclude password hash)
     if user:
-        safe_user = {
-            'id': user['id'],
-            'username': user['username'],
-            'email': user['email'],
-            'full_name': user['full_name'],
-            'points': user['points']
-        }
-        return jsonify(safe_user)
+        return jsonify(safe_user_data(user))
     return jsonify({'error': 'User not found'}), 404
 
 @app.route('/api/modules', methods=['GET'])
@@ -83,7 +282,12 @@ def get_modules():
 
 @app.route('/api/modules/<int:module_id>', methods=['GET'])
 def get_module(module_id):
-    module = db.get_module(module_id)
+    # ?include=quiz returns the module's quiz along with it, saving the
+    # module page a second request
+    if request.args.get('include') == 'quiz':
+        module = db.get_module_with_quiz(module_id)
+    else:
+        module = db.get_module(module_id)
     if module:
         return jsonify(module)
     return jsonify({'error': 'Module not found'}), 404
@@ -116,52 +320,65 @@ def submit_quiz():
     if not quiz:
         return jsonify({'error': 'Quiz not found'}), 404
     
-    score = 0
-    total = len(quiz['questions'])
-    results = []
+    result = score_quiz(quiz, answers)
     
-    for i, question in enumerate(quiz['questions']):
-        user_answer = answers.get(str(i))
-        correct = user_answer == question['correct']
-        if correct:
-            score += 1
-        results.append({
-            'question': question['question'],
-            'correct': correct,
-            'user_answer': user_answer,
-            'correct_answer': question['correct']
-        })
+    # Each question's outcome also schedules its next review
+    db.record_quiz_attempt(session['user_id'], quiz_id, result['score'], result['total'],
+                             quiz_outcomes(result))
+    db.update_user_points(session['user_id'], result['points_earned'])
     
-    db.record_quiz_attempt(session['user_id'], quiz_id, score, total)
+    return jsonify(result)
+
+@app.route('/api/review/due', methods=['GET'])
+def get_due_reviews():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(1, request.args.get('limit', REVIEW_PAGE_SIZE, type=int)), REVIEW_MAX_PAGE_SIZE)
+    reviews = db.get_due_reviews(session['user_id'], limit + 1)
+    return jsonify({'reviews': reviews[:limit], 'has_more': len(reviews) > limit})
+
+@app.route('/api/review/answer', methods=['POST'])
+def answer_review():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
     
-    points_earned = int((score / total) * quiz['points'])
-    db.update_user_points(session['user_id'], points_earned)
+    data = request.json
+    quiz = db.get_quiz(data['quiz_id'])
+    question_index = data['question_index']
+    if not quiz or not 0 <= question_index < len(quiz['questions']):
+        return jsonify({'error': 'Question not found'}), 404
     
+    correct_answer = quiz['questions'][question_index]['correct']
+    correct = data.get('answer') == correct_answer
+    state = db.answer_review(session['user_id'], quiz['id'], question_index, correct)
     return jsonify({
-        'score': score,
-        'total': total,
-        'percentage': round((score / total) * 100, 2),
-        'points_earned': points_earned,
-        'results': results
+        'correct': correct,
+        'correct_answer': correct_answer,
+        'interval_days': state['interval_days'],
+        'due_at': state['due_at']
     })
 
 @app.route('/api/challenges', methods=['GET'])
 def get_challenges():
     challenges = db.get_all_challenges()
-    # Don't send test cases to frontend for security
-    for challenge in challenges:
-        challenge.pop('test_cases', None)
-    return jsonify(challenges)
+    return jsonify([challenge_view(challenge) for challenge in challenges])
 
 @app.route('/api/challenges/<int:challenge_id>', methods=['GET'])
 def get_challenge(challenge_id):
     challenge = db.get_challenge(challenge_id)
     if challenge:
-        # Don't send test cases to frontend
-        challenge.pop('test_cases', None)
-        return jsonify(challenge)
+        return jsonify(challenge_view(challenge))
     return jsonify({'error': 'Challenge not found'}), 404
 
+@app.route('/api/search', methods=['GET'])
+def search():
+    try:
+        query, kind, page, per_page = search_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results, has_more = db.search(query, kind, per_page, (page - 1) * per_page)
+    return jsonify(search_view(query, page, per_page, results, has_more))
+
 @app.route('/api/challenges/<int:challenge_id>/submit', methods=['POST'])
 def submit_challenge(challenge_id):
     if 'user_id' not in session:
@@ -169,156 +386,81 @@ def submit_challenge(challenge_id):
     
     data = request.json
     code = data['code']
+    mode = data.get('mode', RUN_ALL)
+    if mode not in GRADING_MODES:
+        return jsonify({'error': f'Unknown grading mode: {mode}'}), 400
     
     challenge = db.get_challenge(challenge_id)
     if not challenge:
         return jsonify({'error': 'Challenge not found'}), 404
+    if mode == PERFORMANCE and not challenge['performance']:
+        return jsonify({'error': 'This challenge has no performance check'}), 400
     
-    # Execute code with test cases
-    result = execute_code(code, challenge['test_cases'])
+    retry_after = grading_quota_retry_after(db.get_user_cpu_usage(session['user_id'], GRADING_QUOTA_WINDOW))
+    if retry_after:
+        return too_many_requests('Grading CPU quota exceeded, please try again later', retry_after)
     
-    # Record submission
-    db.record_submission(
-        session['user_id'],
-        challenge_id,
-        code,
-        result['status'],
-        result['passed'],
-        result['total']
-    )
+    # Grading happens in the grader workers; the client follows the job
+    # through /api/grading/jobs/<id> or its event stream. Practice runs are
+    # short and interactive, so they get a head start in the fair queue.
+    grader_pool.start()
+    priority = 1 if mode == FAIL_FAST else 0
+    job_id = db.enqueue_grading_job(session['user_id'], challenge_id, code, mode, priority)
     
-    # Award points if all tests passed
-    if result['status'] == 'passed':
-        db.update_user_points(session['user_id'], challenge['points'])
-    
-    return jsonify(result)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'mode': mode,
+        'total': grading_total(challenge['test_cases'], mode, challenge['performance'])
+    }), 202
 
-def execute_code(code, test_cases):
-    """Execute Python code with test cases in a restricted sandbox"""
-    import signal
-    import math
-    import random
-    
-    # Safe modules whitelist for imports
-    SAFE_MODULES = {'math', 'random', 'itertools', 'collections', 'functools'}
-    
-    # Custom import function that only allows whitelisted modules
-    def safe_import(name, *args, **kwargs):
-        if name not in SAFE_MODULES:
-            raise ImportError(f"Import of '{name}' is not allowed. Only {SAFE_MODULES} are permitted.")
-        return __import__(name, *args, **kwargs)
-    
-    # Restricted builtins - only allow safe functions
-    # Note: This is a basic sandbox for educational use only
-    # Block introspection methods that could access dangerous modules
-    safe_builtins = {
-        'abs': abs,
-        'all': all,
-        'any': any,
-        'bool': bool,
-        'dict': dict,
-        'enumerate': enumerate,
-        'float': float,
-        'int': int,
-        'len': len,
-        'list': list,
-        'max': max,
-        'min': min,
-        'pow': pow,
-        'print': print,
-        'range': range,
-        'round': round,
-        'set': set,
-        'sorted': sorted,
-        'str': str,
-        'sum': sum,
-        'tuple': tuple,
-        'zip': zip,
-        '__import__': safe_import,  # Restricted import with whitelist
-        # Pre-import safe modules
-        'math': math,
-        'random': random,
-        # Explicitly exclude: object, type, vars, dir, getattr, setattr, delattr, hasattr
-        # to prevent introspection attacks
-    }
-    
-    passed = 0
-    total = len(test_cases)
-    test_results = []
-    
-    for test_case in test_cases:
-        try:
-            # Timeout handler
-            def timeout_handler(signum, frame):
-                raise TimeoutError("Code execution timeout (5 seconds)")
-            
-            # Set 5 second timeout
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(5)
-            
-            # Create restricted execution environment with limited builtins
-            exec_globals = {
-                '__builtins__': safe_builtins,
-                '__name__': '__main__',
-                '__doc__': None
-            }
-            
-            # Execute user code with restrictions
-            exec(code, exec_globals)
-            
-            # Capture output
-            output_buffer = io.StringIO()
-            
-            with redirect_stdout(output_buffer):
-                # Execute test case
-                exec(test_case['input'], exec_globals)
-                output = output_buffer.getvalue().strip()
-            
-            # Cancel timeout
-            signal.alarm(0)
-            
-            # Check if output matches expected
-            expected = str(test_case['expected']).strip()
-            actual = output
-            
-            if actual == expected:
-                passed += 1
-                test_results.append({
-                    'input': test_case.get('description', 'Test case'),
-                    'expected': expected,
-                    'actual': actual,
-                    'passed': True
-                })
-            else:
-                test_results.append({
-                    'input': test_case.get('description', 'Test case'),
-                    'expected': expected,
-                    'actual': actual,
-                    'passed': False
-                })
-        except TimeoutError as e:
-            signal.alarm(0)
-            test_results.append({
-                'input': test_case.get('description', 'Test case'),
-                'error': 'Execution timeout (max 5 seconds)',
-                'passed': False
-            })
-        except Exception as e:
-            signal.alarm(0)
-            test_results.append({
-                'input': test_case.get('description', 'Test case'),
-                'error': str(e),
-                'passed': False
-            })
+def get_own_grading_job(job_id):
+    job = db.get_grading_job(job_id)
+    if job and job['user_id'] == session['user_id']:
+        return job
+    return None
+
+@app.route('/api/grading/jobs/<int:job_id>', methods=['GET'])
+def get_grading_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = get_own_grading_job(job_id)
+    if job:
+        return jsonify(grading_job_view(job))
+    return jsonify({'error': 'Job not found'}), 404
+
+@app.route('/api/grading/jobs/<int:job_id>/events', methods=['GET'])
+def grading_job_events(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = get_own_grading_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
     
-    status = 'passed' if passed == total else 'failed'
+    def generate():
+        sent = 0
+        attempts = None
+        deadline = time.time() + 300
+        while time.time() < deadline and not streams_closing.is_set():
+            job = db.get_grading_job(job_id)
+            # A retried job starts its test results over
+            if attempts and job['attempts'] != attempts:
+                sent = 0
+                yield sse('retry', {'attempts': job['attempts']})
+            attempts = job['attempts']
+            for test_result in job['test_results'][sent:]:
+                yield sse('progress', test_result)
+            sent = max(sent, len(job['test_results']))
+            if job['status'] in ('completed', 'error'):
+                yield sse('done', grading_job_view(job))
+                return
+            time.sleep(0.25)
+        yield sse('timeout', {'id': job_id})
     
-    return {
-        'status': status,
-        'passed': passed,
-        'total': total,
-        'test_results': test_results
-    }
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/api/chatbot', methods=['POST'])
 def chatbot():
@@ -326,22 +468,7 @@ def chatbot():
     user_message = data.get('message', '')
     
     try:
-        # the newest OpenAI model is "gpt-5" which was released August 7, 2025.
-        # do not change this unless explicitly requested by the user
-        response = openai_client.chat.completions.create(
-            model="gpt-5",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an AI assistant specialized in Machine Learning, Data Science, and Python programming. Help students understand ML concepts, debug code, and prepare for technical interviews. Provide clear explanations with examples when appropriate."
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ],
-            max_completion_tokens=1000
-        )
+        response = get_openai_client().chat.completions.create(**chatbot_request(user_message))
         
         bot_response = response.choices[0].message.content
         return jsonify({'response': bot_response})
@@ -361,10 +488,105 @@ def get_progress():
         'progress': progress
     })
 
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    # One round trip for the dashboard instead of /api/user plus /api/progress
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    dashboard = db.get_dashboard(session['user_id'])
+    if not dashboard:
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify(dashboard_view(dashboard))
+
+@app.route('/api/events', methods=['GET'])
+def live_events():
+    # Server-Sent Events: a leaderboard snapshot (and the user's dashboard, if
+    # logged in), then leaderboard deltas and progress updates as they happen
+    user_id = session.get('user_id')
+    subscription = Subscription(user_id)
+    leaderboard = live_publisher.subscribe(subscription)
+    dashboard = db.get_dashboard(user_id) if user_id else None
+    
+    def generate():
+        try:
+            yield sse('leaderboard', leaderboard)
+            if dashboard:
+                yield sse('progress', dashboard_view(dashboard))
+            while subscription.open():
+                # The comment line keeps proxies from closing an idle stream
+                yield subscription.get(timeout=15) or ': keep-alive\n\n'
+        finally:
+            live_publisher.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/recommendations', methods=['GET'])
+def get_recommendations():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(1, request.args.get('limit', RECOMMENDATION_COUNT, type=int)), RECOMMENDATION_MAX_COUNT)
+    recommendations = db.get_recommendations(session['user_id'], limit)
+    return jsonify(recommendations)
+
+@app.route('/api/instructor/submissions/<int:submission_id>/similar', methods=['GET'])
+def get_similar_submissions(submission_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    threshold, limit = similar_submission_params(request.args)
+    matches = db.get_similar_submissions(submission_id, threshold, limit)
+    if matches is None:
+        return jsonify({'error': 'Submission not found or not indexed yet'}), 404
+    return jsonify({'submission_id': submission_id, 'threshold': threshold, 'matches': matches})
+
+@app.route('/api/instructor/users/<int:user_id>/grading-weight', methods=['PUT'])
+def set_grading_weight(user_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    try:
+        weight = grading_weight_param(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not db.set_grading_weight(user_id, weight):
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify({'user_id': user_id, 'weight': weight})
+
+@app.route('/api/instructor/exports/<name>', methods=['GET'])
+def export_table(name):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    if name not in EXPORT_SOURCES:
+        return jsonify({'error': f'Unknown export: {name}'}), 404
+    try:
+        params = export_params(name, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Streamed a page at a time: memory use doesn't grow with the export
+    return Response(export_chunks(db.get_export_page, name, **params),
+                    mimetype=EXPORT_FORMATS[params['export_format']], headers={
+        'Content-Disposition': f"attachment; filename={export_filename(name, params['export_format'])}",
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
     leaderboard = db.get_leaderboard(limit=10)
     return jsonify(leaderboard)
 
 if __name__ == '__main__':
+    # Graders start with the server, so jobs queued before a restart are
+    # picked up without waiting for a new submission. The debug reloader
+    # serves from a child process (WERKZEUG_RUN_MAIN); its watcher doesn't grade.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        grader_pool.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
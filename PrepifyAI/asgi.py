@@ -0,0 +1,488 @@
+"""ASGI serving mode: the same API as app.py with async handlers
+
+Run it under an ASGI server, e.g.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Handlers await the database (through AsyncDatabase's thread pool) and the
+OpenAI API (through AsyncOpenAI) instead of holding a thread for the whole
+request, so one process can keep many slow chatbot calls and grading event
+streams open at once. Grading itself still runs in the grader workers.
+"""
+import asyncio
+import os
+import signal
+import time
+
+from quart import Quart, request, jsonify, session, render_template, Response
+
+from app import (
+    db as sync_db, grader_pool, live_publisher, rate_limiter, TRUSTED_PROXIES, GRADING_QUOTA_WINDOW, REVIEW_PAGE_SIZE, REVIEW_MAX_PAGE_SIZE,
+    RECOMMENDATION_COUNT, RECOMMENDATION_MAX_COUNT,
+    safe_user_data, is_instructor, similar_submission_params, grading_weight_param, score_quiz, grading_quota_retry_after, challenge_view, grading_job_view, sse, chatbot_request,
+    dashboard_view, search_params, search_view, quiz_outcomes, streams_closing, close_streams
+)
+from database import EXPORT_SOURCES, last_write_at
+from database_async import AsyncDatabase
+from exports import EXPORT_FORMATS, export_chunks_async, export_filename, export_params
+from live_updates import Subscription
+from rate_limits import client_address
+from sandbox import GRADING_MODES, PERFORMANCE, RUN_ALL, FAIL_FAST, grading_total
+from serialization import CompactJSONProvider
+
+class QuartCompactJSONProvider(CompactJSONProvider):
+    def accept_mimetypes(self):
+        return request.accept_mimetypes
+
+class AsyncSubscription(Subscription):
+    """Subscription whose events are awaited on the event loop"""
+
+    def __init__(self, user_id):
+        super().__init__(user_id)
+        self.queue = asyncio.Queue(self.queue.maxsize)
+        self.loop = asyncio.get_running_loop()
+
+    def deliver(self, message):
+        # Called from the publisher thread
+        self.loop.call_soon_threadsafe(self.put, message)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+app = Quart(__name__)
+app.secret_key = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+app.json = QuartCompactJSONProvider(app)
+
+db = AsyncDatabase(sync_db, max_workers=int(os.environ.get('DATABASE_THREADS', 0)) or None)
+# Created on first chatbot use, like app.get_openai_client
+openai_client = None
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        from openai import AsyncOpenAI
+        openai_client = AsyncOpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return openai_client
+
+def too_many_requests(message, retry_after):
+    # app.too_many_requests, built with Quart's jsonify
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@app.before_request
+async def limit_request_rate():
+    # Same limits as app.py; buckets are in memory or a local SQLite file,
+    # quick enough to check on the event loop
+    if request.method == 'OPTIONS' or not rate_limiter.applies_to(request.endpoint):
+        return None
+    retry_after = rate_limiter.retry_after(
+        request.endpoint,
+        client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), TRUSTED_PROXIES),
+        session.get('user_id')
+    )
+    if retry_after:
+        return too_many_requests('Too many requests, please try again later', retry_after)
+
+@app.before_request
+async def bind_database_session():
+    last_write_at.set(session.get('db_write_at'))
+
+@app.after_request
+async def remember_database_writes(response):
+    written = last_write_at.get()
+    if db.replica_lag_seconds and written and written != session.get('db_write_at'):
+        session['db_write_at'] = written
+    return response
+
+@app.after_request
+async def allow_cross_origin(response):
+    # Same open CORS policy as flask_cors' CORS(app) in app.py
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Content-Type'
+        )
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+@app.before_serving
+async def start_graders():
+    # Jobs queued before a restart are picked up without waiting for a new
+    # submission
+    grader_pool.start()
+    # The ASGI server only tells the app it's stopping once every connection
+    # has finished, which event streams never do by themselves, so end them
+    # from the server's own shutdown signal handlers
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(signum)
+        
+        def stop(signum, frame, previous=previous):
+            close_streams()
+            if callable(previous):
+                previous(signum, frame)
+        
+        signal.signal(signum, stop)
+
+# Routes
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/api/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    user_id = await db.create_user(
+        data['username'],
+        data['email'],
+        data['password'],
+        data['full_name']
+    )
+    if user_id:
+        session['user_id'] = user_id
+        return jsonify({'success': True, 'user_id': user_id})
+    return jsonify({'success': False, 'error': 'Username or email already exists'}), 400
+
+@app.route('/api/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    user = await db.authenticate_user(data['username'], data['password'])
+    if user:
+        session['user_id'] = user['id']
+        return jsonify({'success': True, 'user': safe_user_data(user)})
+    return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
+
+@app.route('/api/logout', methods=['POST'])
+async def logout():
+    session.pop('user_id', None)
+    return jsonify({'success': True})
+
+@app.route('/api/user', methods=['GET'])
+async def get_user():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    user = await db.get_user(session['user_id'])
+    if user:
+        return jsonify(safe_user_data(user))
+    return jsonify({'error': 'User not found'}), 404
+
+@app.route('/api/modules', methods=['GET'])
+async def get_modules():
+    modules = await db.get_all_modules()
+    return jsonify(modules)
+
+@app.route('/api/modules/<int:module_id>', methods=['GET'])
+async def get_module(module_id):
+    if request.args.get('include') == 'quiz':
+        module = await db.get_module_with_quiz(module_id)
+    else:
+        module = await db.get_module(module_id)
+    if module:
+        return jsonify(module)
+    return jsonify({'error': 'Module not found'}), 404
+
+@app.route('/api/modules/<int:module_id>/complete', methods=['POST'])
+async def complete_module(module_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    await db.mark_module_complete(session['user_id'], module_id)
+    await db.update_user_points(session['user_id'], 5)
+    return jsonify({'success': True})
+
+@app.route('/api/quiz/<int:module_id>', methods=['GET'])
+async def get_quiz(module_id):
+    quiz = await db.get_module_quiz(module_id)
+    if quiz:
+        return jsonify(quiz)
+    return jsonify({'error': 'Quiz not found'}), 404
+
+@app.route('/api/quiz/submit', methods=['POST'])
+async def submit_quiz():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = await request.get_json()
+    quiz_id = data['quiz_id']
+    answers = data['answers']
+    
+    quiz = await db.get_quiz(quiz_id)
+    if not quiz:
+        return jsonify({'error': 'Quiz not found'}), 404
+    
+    result = score_quiz(quiz, answers)
+    
+    # Each question's outcome also schedules its next review
+    await db.record_quiz_attempt(session['user_id'], quiz_id, result['score'], result['total'],
+                                   quiz_outcomes(result))
+    await db.update_user_points(session['user_id'], result['points_earned'])
+    
+    return jsonify(result)
+
+@app.route('/api/review/due', methods=['GET'])
+async def get_due_reviews():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(1, request.args.get('limit', REVIEW_PAGE_SIZE, type=int)), REVIEW_MAX_PAGE_SIZE)
+    reviews = await db.get_due_reviews(session['user_id'], limit + 1)
+    return jsonify({'reviews': reviews[:limit], 'has_more': len(reviews) > limit})
+
+@app.route('/api/review/answer', methods=['POST'])
+async def answer_review():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = await request.get_json()
+    quiz = await db.get_quiz(data['quiz_id'])
+    question_index = data['question_index']
+    if not quiz or not 0 <= question_index < len(quiz['questions']):
+        return jsonify({'error': 'Question not found'}), 404
+    
+    correct_answer = quiz['questions'][question_index]['correct']
+    correct = data.get('answer') == correct_answer
+    state = await db.answer_review(session['user_id'], quiz['id'], question_index, correct)
+    return jsonify({
+        'correct': correct,
+        'correct_answer': correct_answer,
+        'interval_days': state['interval_days'],
+        'due_at': state['due_at']
+    })
+
+@app.route('/api/challenges', methods=['GET'])
+async def get_challenges():
+    challenges = await db.get_all_challenges()
+    return jsonify([challenge_view(challenge) for challenge in challenges])
+
+@app.route('/api/challenges/<int:challenge_id>', methods=['GET'])
+async def get_challenge(challenge_id):
+    challenge = await db.get_challenge(challenge_id)
+    if challenge:
+        return jsonify(challenge_view(challenge))
+    return jsonify({'error': 'Challenge not found'}), 404
+
+@app.route('/api/search', methods=['GET'])
+async def search():
+    try:
+        query, kind, page, per_page = search_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results, has_more = await db.search(query, kind, per_page, (page - 1) * per_page)
+    return jsonify(search_view(query, page, per_page, results, has_more))
+
+@app.route('/api/challenges/<int:challenge_id>/submit', methods=['POST'])
+async def submit_challenge(challenge_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = await request.get_json()
+    code = data['code']
+    mode = data.get('mode', RUN_ALL)
+    if mode not in GRADING_MODES:
+        return jsonify({'error': f'Unknown grading mode: {mode}'}), 400
+    
+    challenge = await db.get_challenge(challenge_id)
+    if not challenge:
+        return jsonify({'error': 'Challenge not found'}), 404
+    if mode == PERFORMANCE and not challenge['performance']:
+        return jsonify({'error': 'This challenge has no performance check'}), 400
+    
+    retry_after = grading_quota_retry_after(await db.get_user_cpu_usage(session['user_id'], GRADING_QUOTA_WINDOW))
+    if retry_after:
+        return too_many_requests('Grading CPU quota exceeded, please try again later', retry_after)
+    
+    grader_pool.start()
+    priority = 1 if mode == FAIL_FAST else 0
+    job_id = await db.enqueue_grading_job(session['user_id'], challenge_id, code, mode, priority)
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'mode': mode,
+        'total': grading_total(challenge['test_cases'], mode, challenge['performance'])
+    }), 202
+
+async def get_own_grading_job(job_id):
+    job = await db.get_grading_job(job_id)
+    if job and job['user_id'] == session['user_id']:
+        return job
+    return None
+
+@app.route('/api/grading/jobs/<int:job_id>', methods=['GET'])
+async def get_grading_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = await get_own_grading_job(job_id)
+    if job:
+        return jsonify(grading_job_view(job))
+    return jsonify({'error': 'Job not found'}), 404
+
+@app.route('/api/grading/jobs/<int:job_id>/events', methods=['GET'])
+async def grading_job_events(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = await get_own_grading_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    async def generate():
+        sent = 0
+        attempts = None
+        deadline = time.time() + 300
+        while time.time() < deadline and not streams_closing.is_set():
+            job = await db.get_grading_job(job_id)
+            # A retried job starts its test results over
+            if attempts and job['attempts'] != attempts:
+                sent = 0
+                yield sse('retry', {'attempts': job['attempts']})
+            attempts = job['attempts']
+            for test_result in job['test_results'][sent:]:
+                yield sse('progress', test_result)
+            sent = max(sent, len(job['test_results']))
+            if job['status'] in ('completed', 'error'):
+                yield sse('done', grading_job_view(job))
+                return
+            await asyncio.sleep(0.25)
+        yield sse('timeout', {'id': job_id})
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # The stream ends itself after 300 seconds; don't let Quart cut it off sooner
+    response.timeout = None
+    return response
+
+@app.route('/api/chatbot', methods=['POST'])
+async def chatbot():
+    data = await request.get_json()
+    user_message = data.get('message', '')
+    
+    try:
+        response = await get_openai_client().chat.completions.create(**chatbot_request(user_message))
+        
+        bot_response = response.choices[0].message.content
+        return jsonify({'response': bot_response})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/progress', methods=['GET'])
+async def get_progress():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    stats, progress = await asyncio.gather(
+        db.get_user_stats(session['user_id']),
+        db.get_user_progress(session['user_id'])
+    )
+    
+    return jsonify({
+        'stats': stats,
+        'progress': progress
+    })
+
+@app.route('/api/dashboard', methods=['GET'])
+async def get_dashboard():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    dashboard = await db.get_dashboard(session['user_id'])
+    if not dashboard:
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify(dashboard_view(dashboard))
+
+@app.route('/api/events', methods=['GET'])
+async def live_events():
+    user_id = session.get('user_id')
+    subscription = AsyncSubscription(user_id)
+    leaderboard = await asyncio.to_thread(live_publisher.subscribe, subscription)
+    dashboard = await db.get_dashboard(user_id) if user_id else None
+    
+    async def generate():
+        try:
+            yield sse('leaderboard', leaderboard)
+            if dashboard:
+                yield sse('progress', dashboard_view(dashboard))
+            while subscription.open():
+                yield await subscription.get(timeout=15) or ': keep-alive\n\n'
+        finally:
+            live_publisher.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.timeout = None
+    return response
+
+@app.route('/api/recommendations', methods=['GET'])
+async def get_recommendations():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(1, request.args.get('limit', RECOMMENDATION_COUNT, type=int)), RECOMMENDATION_MAX_COUNT)
+    recommendations = await db.get_recommendations(session['user_id'], limit)
+    return jsonify(recommendations)
+
+@app.route('/api/instructor/submissions/<int:submission_id>/similar', methods=['GET'])
+async def get_similar_submissions(submission_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(await db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    threshold, limit = similar_submission_params(request.args)
+    matches = await db.get_similar_submissions(submission_id, threshold, limit)
+    if matches is None:
+        return jsonify({'error': 'Submission not found or not indexed yet'}), 404
+    return jsonify({'submission_id': submission_id, 'threshold': threshold, 'matches': matches})
+
+@app.route('/api/instructor/users/<int:user_id>/grading-weight', methods=['PUT'])
+async def set_grading_weight(user_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(await db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    try:
+        weight = grading_weight_param(await request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not await db.set_grading_weight(user_id, weight):
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify({'user_id': user_id, 'weight': weight})
+
+@app.route('/api/instructor/exports/<name>', methods=['GET'])
+async def export_table(name):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if not is_instructor(await db.get_user(session['user_id'])):
+        return jsonify({'error': 'Instructors only'}), 403
+    if name not in EXPORT_SOURCES:
+        return jsonify({'error': f'Unknown export: {name}'}), 404
+    try:
+        params = export_params(name, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = Response(export_chunks_async(db.get_export_page, name, **params),
+                        mimetype=EXPORT_FORMATS[params['export_format']], headers={
+        'Content-Disposition': f"attachment; filename={export_filename(name, params['export_format'])}",
+        'X-Accel-Buffering': 'no'
+    })
+    # Large exports take longer than the default response timeout
+    response.timeout = None
+    return response
+
+@app.route('/api/leaderboard', methods=['GET'])
+async def get_leaderboard():
+    leaderboard = await db.get_leaderboard(limit=10)
+    return jsonify(leaderboard)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=5000)
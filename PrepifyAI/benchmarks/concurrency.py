@@ -0,0 +1,215 @@
+"""Concurrent chatbot and grading requests: Flask (app.py) vs ASGI (asgi.py)
+
+Starts each server as a subprocess against a freshly seeded SQLite database
+and a stand-in OpenAI endpoint that answers after a fixed delay, then fires
+batches of concurrent requests at it:
+
+- chatbot: POST /api/chatbot, which waits on the (fake) OpenAI API
+- grading: submit a solution and follow its event stream until it is graded
+
+Besides throughput and latency it reports the server's peak thread count:
+Werkzeug's dev server starts a thread per open request, while the ASGI
+server keeps waiting requests on one event loop.
+
+Run from the PrepifyAI directory (needs the asgi extra for uvicorn):
+
+    python benchmarks/concurrency.py [concurrency ...]
+"""
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Typical chat completion latency is seconds; half a second keeps runs short
+UPSTREAM_DELAY_SECONDS = 0.5
+
+SOLUTION = 'def calculate_mean(numbers):\n    return sum(numbers) / len(numbers)\n'
+
+SERVERS = {
+    'flask (app.py)': ['-c', 'from app import app; app.run(port=int(__import__("sys").argv[1]), threaded=True)'],
+    'asgi (asgi.py)': ['-m', 'uvicorn', 'asgi:app', '--log-level', 'warning', '--port'],
+}
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(UPSTREAM_DELAY_SECONDS)
+        body = json.dumps({
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': 'gpt-5',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': 'A benchmark answer.'}}]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections when a burst arrives at once
+    request_queue_size = 1024
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class Client:
+    """One browser session: keeps its cookie between requests"""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookie = None
+
+    def request(self, method, path, payload=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        conn.request(method, path, json.dumps(payload) if payload is not None else None, headers)
+        response = conn.getresponse()
+        if response.getheader('Set-Cookie'):
+            self.cookie = response.getheader('Set-Cookie').split(';', 1)[0]
+        return conn, response
+
+    def json(self, method, path, payload=None):
+        conn, response = self.request(method, path, payload)
+        try:
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+def chatbot_request(port):
+    started = time.perf_counter()
+    status, body = Client(port).json('POST', '/api/chatbot', {'message': 'What is overfitting?'})
+    assert status == 200, body
+    return time.perf_counter() - started
+
+def grading_request(port):
+    client = Client(port)
+    name = uuid.uuid4().hex[:12]
+    client.json('POST', '/api/register', {
+        'username': name, 'email': f'{name}@bench.local', 'password': 'bench', 'full_name': name
+    })
+    started = time.perf_counter()
+    status, job = client.json('POST', '/api/challenges/1/submit', {'code': SOLUTION})
+    assert status == 202, job
+    conn, response = client.request('GET', f'/api/grading/jobs/{job["job_id"]}/events')
+    try:
+        for line in response:
+            if line.startswith(b'event: done'):
+                break
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+def wait_for_server(port, process):
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+def thread_count(pid):
+    # Linux only; elsewhere the peak thread column reads 0
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def run_batch(target, port, concurrency, pid):
+    peak_threads = thread_count(pid)
+    done = threading.Event()
+
+    def sample_threads():
+        nonlocal peak_threads
+        while not done.wait(0.02):
+            peak_threads = max(peak_threads, thread_count(pid))
+
+    sampler = threading.Thread(target=sample_threads)
+    sampler.start()
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(lambda _: target(port), range(concurrency)))
+        elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    latencies.sort()
+    return {
+        'threads': peak_threads,
+        'throughput': concurrency / elapsed,
+        'median_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+    }
+
+def benchmark_server(label, args, env, levels):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, *args, str(port)], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(port, process)
+        # Warm up the grader pool and the database connections
+        grading_request(port)
+        for name, target in (('chatbot', chatbot_request), ('grading', grading_request)):
+            for concurrency in levels:
+                stats = run_batch(target, port, concurrency, process.pid)
+                print(f'{label:<16} {name:<8} x{concurrency:<5} '
+                      f'{stats["throughput"]:8.1f} req/s   median {stats["median_ms"]:8.1f} ms   '
+                      f'p95 {stats["p95_ms"]:8.1f} ms   peak threads {stats["threads"]:4d}')
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [8, 32, 128]
+
+    upstream = FakeOpenAIServer(('127.0.0.1', 0), FakeOpenAI)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=os.path.join(tmp, 'bench.db'),
+            OPENAI_API_KEY='bench',
+            OPENAI_BASE_URL=f'http://127.0.0.1:{upstream.server_port}/v1',
+            GRADER_WORKERS=os.environ.get('GRADER_WORKERS', '4'),
+            PYTHONPATH=ROOT
+        )
+        subprocess.run([sys.executable, 'seed_data.py'], cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        print(f'fake OpenAI latency {UPSTREAM_DELAY_SECONDS * 1000:.0f} ms, '
+              f'{env["GRADER_WORKERS"]} grader workers')
+        for label, args in SERVERS.items():
+            benchmark_server(label, args, env, levels)
+
+    upstream.shutdown()
+
+if __name__ == '__main__':
+    main()
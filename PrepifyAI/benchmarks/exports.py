@@ -0,0 +1,110 @@
+"""Streaming export memory use and its effect on concurrent writes
+
+Fills a scratch SQLite database with challenge submissions (300,000 by
+default, about 2 KB of code each), then streams the challenge_submissions
+export as CSV and JSON Lines to a byte counter, reporting throughput and
+the peak Python memory allocated while exporting. Meanwhile a writer process,
+standing in for another server worker, records a quiz attempt every 10 ms;
+its latencies are compared with the same writes while no export runs.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/exports.py [submissions]
+"""
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from exports import export_chunks
+
+LEARNERS = 10000
+BATCH = 10000
+WRITE_INTERVAL = 0.01
+
+def fill(db, submissions, seed=1):
+    rng = random.Random(seed)
+    lines = [f'    total = total + values[{i}] * {i}  # step {i}' for i in range(200)]
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                       [(user_id, f'user{user_id}', f'user{user_id}@example.com', '') for user_id in range(1, LEARNERS + 1)])
+    cursor.execute("INSERT INTO quizzes (id, title, questions) VALUES (1, 'Quiz', '[]')")
+    for start in range(0, submissions, BATCH):
+        cursor.executemany('''
+            INSERT INTO challenge_submissions (user_id, challenge_id, code, status, passed_tests, total_tests)
+            VALUES (?, ?, ?, ?, ?, 5)
+        ''', [(
+            rng.randint(1, LEARNERS), rng.randint(1, 20),
+            'def solution(values):\n    total = 0\n' + '\n'.join(rng.sample(lines, 40)) + '\n    return total\n',
+            rng.choice(['passed', 'failed']), rng.randint(0, 5)
+        ) for _ in range(min(BATCH, submissions - start))])
+        conn.commit()
+    conn.close()
+
+def write_latencies(db_name, stop, results):
+    """Record quiz attempts until stop is set, then send each write's ms"""
+    db = Database(db_name, init=False)
+    timings = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        db.record_quiz_attempt(1, 1, 3, 5)
+        timings.append((time.perf_counter() - started) * 1000)
+        time.sleep(WRITE_INTERVAL)
+    results.put(timings)
+
+def run_writer(db, seconds=None, work=None):
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    writer = multiprocessing.Process(target=write_latencies, args=(db.db_name, stop, results))
+    writer.start()
+    outcome = work() if work else time.sleep(seconds)
+    stop.set()
+    timings = results.get()
+    writer.join()
+    return outcome, timings
+
+def export(db, export_format):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    for chunk in export_chunks(db.get_export_page, 'challenge_submissions', export_format):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(f'{label:<28}{statistics.median(timings):>9.2f}{timings[int(len(timings) * 0.99)]:>9.2f}{timings[-1]:>9.2f}')
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'exports.db'))
+        fill(db, submissions)
+
+        print(f'{"export":<28}{"MB":>9}{"seconds":>9}{"MB/s":>9}{"peak MB":>9}')
+        latencies = {}
+        for export_format in ('csv', 'jsonl'):
+            (size, elapsed, peak), latencies[export_format] = run_writer(db, work=lambda: export(db, export_format))
+            print(f'{export_format:<28}{size / 1e6:>9.0f}{elapsed:>9.1f}{size / 1e6 / elapsed:>9.0f}{peak / 1e6:>9.1f}')
+
+        _, idle = run_writer(db, seconds=5)
+        print(f'\n{"quiz attempt write":<28}{"p50 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+        report('no export running', idle)
+        report('during CSV export', latencies['csv'])
+        report('during JSONL export', latencies['jsonl'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Startup-time budget: how long importing each entry point takes
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each entry point (importing app.py also opens the database and checks its
+schema), reports the cumulative import time and the slowest modules pulled
+in, and exits with status 1 if any entry point is over its budget.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/import_time.py [runs]
+
+Budgets are in milliseconds; IMPORT_BUDGET_SCALE scales them all (e.g. 2 on
+a slow CI machine).
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUDGETS_MS = {
+    'app': 350,
+    'seed_data': 100,
+}
+
+def import_times(module, env):
+    """Cumulative import time (ms) of `import <module>` and of each module it imports directly"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown by two spaces of indentation per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(cumulative) / 1000, depth))
+
+    # Children are listed before their parent, so the module's own imports
+    # are the depth-1 entries since the previous top-level one (site etc.)
+    times = {}
+    for name, cumulative, depth in entries:
+        if depth == 0 and name != module:
+            times = {}
+        elif depth == 1:
+            times[name] = cumulative
+        elif name == module:
+            return cumulative, times
+    raise RuntimeError(f'{module} not found in -X importtime output')
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    scale = float(os.environ.get('IMPORT_BUDGET_SCALE', 1))
+    over_budget = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=os.path.join(tmp, 'startup.db'), PYTHONPATH=ROOT)
+        # Create the schema up front so every run measures a normal start
+        subprocess.run([sys.executable, '-c', 'import database; database.get_database()'],
+                       cwd=ROOT, env=env, check=True)
+
+        for module, budget in BUDGETS_MS.items():
+            budget *= scale
+            samples = [import_times(module, env) for _ in range(runs)]
+            total = statistics.median(cumulative for cumulative, _ in samples)
+            status = 'ok' if total <= budget else 'OVER BUDGET'
+            over_budget = over_budget or total > budget
+            print(f'import {module:<10} median {total:7.1f} ms   budget {budget:6.0f} ms   {status}')
+
+            # Slowest direct imports in the last run
+            _, direct = samples[-1]
+            for name in sorted(direct, key=direct.get, reverse=True)[:5]:
+                print(f'    {name:<24} {direct[name]:7.1f} ms')
+
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Near-duplicate lookups over hundreds of thousands of submissions
+
+Fills a scratch SQLite database with synthetic submissions (200,000 by
+default, spread over 20 challenges): randomly generated functions, plus a
+share of disguised copies of earlier submissions by other learners, with
+identifiers renamed, comments and docstrings added and a statement
+appended. Then signs and indexes everything with
+Database.index_submissions and times "similar submissions to this one"
+lookups, checking how many of the planted copies they find.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/plagiarism.py [submissions] [iterations]
+"""
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from plagiarism import SIMILARITY_THRESHOLD, get_numpy, shingles
+
+CHALLENGES = 20
+LEARNERS = 20000
+COPY_SHARE = 0.02
+STARTER_CODE = 'def solution(nums):\n    # Your code here\n    pass\n'
+NAMES = ['nums', 'values', 'items', 'total', 'count', 'result', 'acc', 'best', 'seen', 'left', 'right',
+         'mid', 'i', 'j', 'k', 'x', 'y', 'n', 'tmp', 'cur', 'prev', 'stack', 'queue', 'memo', 'dp']
+OPERATORS = ['+', '-', '*', '//', '%']
+COMPARISONS = ['<', '>', '==', '!=', '<=']
+
+def expression(rng, names, depth=0):
+    if depth > 1 or rng.random() < 0.4:
+        return rng.choice(names) if rng.random() < 0.7 else str(rng.randint(0, 9))
+    if rng.random() < 0.2:
+        return f'{rng.choice(["len", "abs", "max", "min", "sum"])}({rng.choice(names)})'
+    return f'{expression(rng, names, depth + 1)} {rng.choice(OPERATORS)} {expression(rng, names, depth + 1)}'
+
+def block(rng, names, indent, depth=0):
+    lines = []
+    for _ in range(rng.randint(2, 5)):
+        choice = rng.random()
+        if depth < 2 and choice < 0.2:
+            variable = rng.choice(NAMES)
+            names.append(variable)
+            lines.append(f'{indent}for {variable} in range({expression(rng, names)}):')
+            lines += block(rng, names, indent + '    ', depth + 1)
+        elif depth < 2 and choice < 0.35:
+            lines.append(f'{indent}if {expression(rng, names)} {rng.choice(COMPARISONS)} {expression(rng, names)}:')
+            lines += block(rng, names, indent + '    ', depth + 1)
+        elif choice < 0.45:
+            lines.append(f'{indent}{rng.choice(names)}.append({expression(rng, names)})')
+        else:
+            variable = rng.choice(NAMES)
+            lines.append(f'{indent}{variable} = {expression(rng, names)}')
+            names.append(variable)
+    return lines
+
+def solution(rng):
+    names = ['nums']
+    lines = ['def solution(nums):'] + block(rng, names, '    ')
+    lines.append(f'    return {expression(rng, names)}')
+    return '\n'.join(lines) + '\n'
+
+def disguise(rng, code):
+    """A copy with new identifiers, comments, a docstring and one extra line"""
+    renames = {name: f'{name}_{rng.randint(1, 99)}' for name in NAMES}
+    code = re.sub(r'\b(' + '|'.join(NAMES) + r')\b', lambda m: renames[m.group(1)], code)
+    lines = code.splitlines()
+    lines.insert(1, '    """Solution to the challenge"""')
+    lines.insert(rng.randint(2, len(lines)), '    # check the edge cases first')
+    lines.insert(len(lines) - 1, '    unused = 0')
+    return '\n'.join(lines) + '\n'
+
+def jaccard(code, other):
+    starter = shingles(STARTER_CODE)
+    code, other = shingles(code) - starter, shingles(other) - starter
+    return len(code & other) / len(code | other)
+
+def fill(db, submissions, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    copies = []
+    for submission_id in range(1, submissions + 1):
+        challenge_id = rng.randint(1, CHALLENGES)
+        user_id = rng.randint(1, LEARNERS)
+        code = solution(rng)
+        if rows and rng.random() < COPY_SHARE:
+            original = rows[rng.randrange(len(rows))]
+            challenge_id = original[2]
+            user_id = original[1] % LEARNERS + 1
+            code = disguise(rng, original[3])
+            copies.append((submission_id, original[0], jaccard(original[3], code)))
+        rows.append((submission_id, user_id, challenge_id, code))
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                       [(user_id, f'user{user_id}', f'user{user_id}@example.com', '') for user_id in range(1, LEARNERS + 1)])
+    cursor.executemany('''
+        INSERT INTO challenges (id, title, description, difficulty, starter_code, test_cases) VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(i, f'Challenge {i}', '', 'Easy', STARTER_CODE, '[]')
+          for i in range(1, CHALLENGES + 1)])
+    cursor.executemany('''
+        INSERT INTO challenge_submissions (id, user_id, challenge_id, code, status, passed_tests, total_tests)
+        VALUES (?, ?, ?, ?, 'failed', 0, 1)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return copies
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = random.Random(2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'plagiarism.db'))
+        copies = fill(db, submissions)
+
+        started = time.perf_counter()
+        db.index_submissions()
+        elapsed = time.perf_counter() - started
+        print(f'signed and indexed {submissions} submissions in {elapsed:.1f}s '
+              f'({elapsed / submissions * 1000:.2f} ms each, numpy {"on" if get_numpy() else "off"})\n')
+
+        timings = []
+        for _ in range(iterations):
+            submission_id = rng.randint(1, submissions)
+            started = time.perf_counter()
+            db.get_similar_submissions(submission_id)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'similar submissions lookup: p50 {statistics.median(timings):.2f} ms, '
+              f'p95 {timings[int(len(timings) * 0.95)]:.2f} ms')
+
+        # A short copy can fall below the threshold through the one added
+        # line alone, so recall is also given for the copies above it
+        sample = rng.sample(copies, min(iterations, len(copies)))
+        found = [any(match['submission_id'] == copy_id for match in db.get_similar_submissions(original_id))
+                 for copy_id, original_id, _ in sample]
+        above = [hit for hit, (_, _, similarity) in zip(found, sample) if similarity >= SIMILARITY_THRESHOLD]
+        print(f'planted copies found: {sum(found)} of {len(sample)} ({sum(found) / len(sample):.1%}); '
+              f'{sum(above)} of the {len(above)} at least {SIMILARITY_THRESHOLD:.0%} similar '
+              f'({sum(above) / max(len(above), 1):.1%})')
+
+if __name__ == '__main__':
+    main()
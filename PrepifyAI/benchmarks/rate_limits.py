@@ -0,0 +1,106 @@
+"""Cost of the request rate limiter, per check and per request
+
+Times RateLimiter.retry_after on its own, spread over 10,000 client IPs, with
+the in-memory store and the shared SQLite store (RATE_LIMIT_DB). Then times
+requests to a cheap route (POST /api/logout) through the Flask app with and
+without a limit on it, alternating rounds, and reports the difference, which
+is what limiting adds to each request. Finally several processes share one
+SQLite bucket, checking that together they get exactly its capacity.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/rate_limits.py [requests]
+"""
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rate_limits import MemoryBucketStore, RateLimiter, SQLiteBucketStore
+
+CLIENTS = 10000
+ROUNDS = 10
+PROCESSES = 4
+SHARED_CAPACITY = 2000
+# High enough that the benchmark itself is never turned away
+UNLIMITED = [('ip', 10 ** 9, 60)]
+
+def check_timings(limiter, checks):
+    timings = []
+    for i in range(checks):
+        ip = f'10.0.{i % CLIENTS // 256}.{i % 256}'
+        started = time.perf_counter()
+        limiter.retry_after('login', ip, i % 7 or None)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return sorted(timings)
+
+def request_time(client, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.post('/api/logout')
+    return (time.perf_counter() - started) / requests * 1e6
+
+def request_overhead(app, store, requests):
+    """Median per-request cost of the limit on /api/logout, in microseconds"""
+    client = app.app.test_client()
+    limited = {'logout': UNLIMITED}
+    differences = []
+    for _ in range(ROUNDS):
+        app.rate_limiter = RateLimiter({}, store)
+        plain = request_time(client, requests)
+        app.rate_limiter = RateLimiter(limited, store)
+        differences.append(request_time(client, requests) - plain)
+    return plain, statistics.median(differences)
+
+def take_shared(path, attempts, results):
+    limiter = RateLimiter({'login': [('ip', SHARED_CAPACITY, 3600)]}, SQLiteBucketStore(path))
+    allowed = 0
+    started = time.perf_counter()
+    for _ in range(attempts):
+        if limiter.retry_after('login', '10.0.0.1') is None:
+            allowed += 1
+    results.put((allowed, (time.perf_counter() - started) / attempts * 1e6))
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.path.join(tmp, 'rate_limits.db')
+        stores = {
+            'memory': MemoryBucketStore(),
+            'sqlite': SQLiteBucketStore(os.path.join(tmp, 'buckets.db')),
+        }
+
+        print(f'{"retry_after":<24}{"p50 us":>9}{"p99 us":>9}')
+        for name, store in stores.items():
+            limiter = RateLimiter({'login': [('ip', 20, 60), ('user', 100, 60)]}, store)
+            timings = check_timings(limiter, requests * 10)
+            print(f'{name:<24}{statistics.median(timings):>9.1f}{timings[int(len(timings) * 0.99)]:>9.1f}')
+
+        import app
+        print(f'\n{"POST /api/logout":<24}{"us/req":>9}{"+limit us":>10}')
+        for name, store in stores.items():
+            plain, overhead = request_overhead(app, store, requests)
+            print(f'{name:<24}{plain:>9.1f}{overhead:>10.1f}')
+
+        path = os.path.join(tmp, 'shared.db')
+        SQLiteBucketStore(path)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=take_shared, args=(path, SHARED_CAPACITY, results))
+                   for _ in range(PROCESSES)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        print(f'\n{PROCESSES} processes sharing one bucket of {SHARED_CAPACITY}: '
+              f'{sum(allowed for allowed, _ in outcomes)} allowed of {PROCESSES * SHARED_CAPACITY}, '
+              f'{max(us for _, us in outcomes):.1f} us per check')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Recommendation job and serving cost at 100,000 learners
+
+Fills a scratch SQLite database with synthetic cohorts: each learner follows
+one of a few tracks through 40 modules (with quizzes) and 60 challenges,
+getting a random distance along it, with some detours. Then runs the
+recommender.py job phase by phase and times GET /api/recommendations'
+database call for random learners.
+
+Run from the PrepifyAI directory (needs the recommendations extra):
+
+    python benchmarks/recommendations.py [learners] [iterations]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from recommender import compute_recommendations
+
+MODULES = 40
+CHALLENGES = 60
+TRACKS = 5
+
+def fill(db, learners, seed=1):
+    rng = random.Random(seed)
+    items = [('module', i) for i in range(1, MODULES + 1)] + [('challenge', i) for i in range(1, CHALLENGES + 1)]
+    tracks = [rng.sample(items, 30) for _ in range(TRACKS)]
+
+    progress, attempts, submissions = [], [], []
+    for user_id in range(1, learners + 1):
+        track = tracks[user_id % TRACKS]
+        path = track[:rng.randint(0, len(track))] + rng.sample(items, rng.randint(0, 3))
+        for item_type, item_id in set(path):
+            if item_type == 'module':
+                progress.append((user_id, item_id))
+                attempts.append((user_id, item_id, rng.randint(1, 5)))
+            else:
+                submissions.append((user_id, item_id, 'passed' if rng.random() < 0.7 else 'failed'))
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                       [(user_id, f'user{user_id}', f'user{user_id}@example.com', '') for user_id in range(1, learners + 1)])
+    cursor.executemany('INSERT INTO modules (id, title, category, difficulty, content, order_index) VALUES (?, ?, ?, ?, ?, ?)',
+                       [(i, f'Module {i}', 'Synthetic', 'Beginner', '', i) for i in range(1, MODULES + 1)])
+    cursor.executemany('INSERT INTO quizzes (id, module_id, title, questions) VALUES (?, ?, ?, ?)',
+                       [(i, i, f'Quiz {i}', '[]') for i in range(1, MODULES + 1)])
+    cursor.executemany('INSERT INTO challenges (id, title, description, difficulty, test_cases) VALUES (?, ?, ?, ?, ?)',
+                       [(i, f'Challenge {i}', '', 'Easy', '[]') for i in range(1, CHALLENGES + 1)])
+    cursor.executemany('INSERT INTO user_progress (user_id, module_id, completed) VALUES (?, ?, 1)', progress)
+    cursor.executemany('INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions) VALUES (?, ?, ?, 5)',
+                       attempts)
+    cursor.executemany('''
+        INSERT INTO challenge_submissions (user_id, challenge_id, code, status, passed_tests, total_tests)
+        VALUES (?, ?, '', ?, 0, 1)
+    ''', submissions)
+    conn.commit()
+    conn.close()
+
+def timed(label, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f'{label:<28}{time.perf_counter() - started:>8.2f}s')
+    return result
+
+def main():
+    learners = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'recommendations.db'))
+        fill(db, learners)
+
+        items = db.get_recommendable_items()
+        interactions = timed('load interactions', db.get_interactions)
+        rows = timed('compute', lambda: list(compute_recommendations(items, interactions)))
+        timed('store', db.replace_recommendations, rows)
+        print(f'{len(interactions)} interactions, {len(items)} items, {len(rows)} recommendations stored\n')
+
+        rng = random.Random(2)
+        timings = []
+        for _ in range(iterations):
+            user_id = rng.randint(1, learners)
+            started = time.perf_counter()
+            db.get_recommendations(user_id)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'serve 5 recommendations: p50 {statistics.median(timings):.3f} ms, '
+              f'p95 {timings[int(len(timings) * 0.95)]:.3f} ms')
+
+if __name__ == '__main__':
+    main()
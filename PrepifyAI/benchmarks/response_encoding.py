@@ -0,0 +1,70 @@
+"""Payload size and encode time per endpoint: JSON (stdlib, orjson) vs MessagePack
+
+Builds the response bodies of the heaviest API endpoints from a freshly
+seeded database (through the app's own routes, plus a graded challenge
+submission for the grading job view) and encodes each one with Flask's
+default JSON provider, orjson and msgpack.
+
+Run from the PrepifyAI directory (needs the fast-encoding extra):
+
+    python benchmarks/response_encoding.py [iterations]
+"""
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = ['/api/modules', '/api/modules/1', '/api/quiz/1', '/api/challenges', '/api/challenges/1']
+
+def load_payloads():
+    import app
+    from sandbox import execute_code
+
+    client = app.app.test_client()
+    payloads = {url: client.get(url, headers={'Accept': 'application/json'}).get_json() for url in ENDPOINTS}
+
+    # What /api/grading/jobs/<id> returns for a finished submission
+    challenge = app.db.get_challenge(1)
+    code = 'def calculate_mean(numbers):\n    return sum(numbers) / len(numbers)\n'
+    result = execute_code(code, challenge['test_cases'])
+    payloads['/api/grading/jobs/<id>'] = app.grading_job_view({
+        'id': 1, 'challenge_id': 1, 'status': 'completed', 'mode': result['mode'],
+        'attempts': 1, 'test_results': result['test_results'], 'result': result
+    })
+    return payloads
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.path.join(tmp, 'encoding.db')
+        subprocess.run([sys.executable, 'seed_data.py'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        payloads = load_payloads()
+
+    import orjson
+    import msgpack
+
+    # Flask's default provider: sorted keys, compact separators
+    encoders = {
+        'json': lambda obj: json.dumps(obj, sort_keys=True, separators=(',', ':')).encode(),
+        'orjson': orjson.dumps,
+        'msgpack': lambda obj: msgpack.packb(obj, use_bin_type=True),
+    }
+
+    print(f'{"endpoint":<24}' + ''.join(f'{name + " bytes":>14}{"gzip":>8}{"us":>8}' for name in encoders))
+    for url, payload in payloads.items():
+        row = f'{url:<24}'
+        for encode in encoders.values():
+            body = encode(payload)
+            seconds = timeit.timeit(lambda: encode(payload), number=iterations)
+            row += f'{len(body):>14}{len(gzip.compress(body)):>8}{seconds / iterations * 1e6:>8.1f}'
+        print(row)
+
+if __name__ == '__main__':
+    main()
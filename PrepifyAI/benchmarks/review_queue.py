@@ -0,0 +1,88 @@
+"""Review queue latency with millions of user-question pairs
+
+Fills a scratch SQLite database with review state for many users (2,000,000
+pairs by default: 20,000 users who each answered 20 five-question quizzes,
+with due times spread over the past and next month), then times the two
+operations the app performs: fetching a user's due reviews and recording a
+quiz submission, which advances the schedule of each of its questions.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/review_queue.py [users] [iterations]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from review import DAY_SECONDS
+
+QUIZZES = 20
+QUESTIONS_PER_QUIZ = 5
+
+def fill(db, users, now, seed=1):
+    rng = random.Random(seed)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                       [(user_id, f'user{user_id}', f'user{user_id}@example.com', '') for user_id in range(1, users + 1)])
+    questions = '[' + ','.join(['{"question": "?", "options": ["a", "b"], "correct": 0}'] * QUESTIONS_PER_QUIZ) + ']'
+    cursor.executemany('INSERT INTO quizzes (id, title, questions) VALUES (?, ?, ?)',
+                       [(quiz_id, f'Quiz {quiz_id}', questions) for quiz_id in range(1, QUIZZES + 1)])
+    for user_id in range(1, users + 1):
+        cursor.executemany('''
+            INSERT INTO review_items (user_id, quiz_id, question_index, ease, interval_days,
+                                      repetitions, lapses, due_at, reviewed_at)
+            VALUES (?, ?, ?, 2.5, 6, 2, 0, ?, ?)
+        ''', [
+            (user_id, quiz_id, question_index, now + rng.uniform(-30, 30) * DAY_SECONDS, now)
+            for quiz_id in range(1, QUIZZES + 1)
+            for question_index in range(QUESTIONS_PER_QUIZ)
+        ])
+    conn.commit()
+    conn.close()
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f'{label:<36}{statistics.median(timings):>9.3f}{p95:>9.3f}')
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = random.Random(2)
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'review.db'))
+        started = time.perf_counter()
+        fill(db, users, now)
+        pairs = users * QUIZZES * QUESTIONS_PER_QUIZ
+        print(f'stored {pairs} user-question pairs in {time.perf_counter() - started:.1f}s\n')
+
+        print(f'{"operation":<36}{"p50 ms":>9}{"p95 ms":>9}')
+        timings = []
+        for _ in range(iterations):
+            user_id = rng.randint(1, users)
+            started = time.perf_counter()
+            db.get_due_reviews(user_id, limit=21)
+            timings.append((time.perf_counter() - started) * 1000)
+        report('due reviews (20 per page)', timings)
+
+        timings = []
+        for _ in range(iterations):
+            user_id = rng.randint(1, users)
+            outcomes = {i: rng.random() < 0.7 for i in range(QUESTIONS_PER_QUIZ)}
+            started = time.perf_counter()
+            db.record_quiz_attempt(user_id, rng.randint(1, QUIZZES), 0, QUESTIONS_PER_QUIZ, outcomes)
+            timings.append((time.perf_counter() - started) * 1000)
+        report('quiz submission (5 questions)', timings)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Compare sandbox startup cost: cold interpreter spawn vs fork of a warm zygote
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/sandbox_startup.py [iterations]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox import execute_code
+from zygote import execute_code_forked
+
+CODE = 'def calculate_mean(numbers):\n    return sum(numbers) / len(numbers)\n'
+TEST_CASES = [{'description': 'Test 1', 'input': 'print(calculate_mean([1, 2, 3]))', 'expected': '2.0'}]
+
+# What a cold worker has to do before it can grade: start Python, import the
+# sandbox (and with it the SAFE_MODULES whitelist), then run the submission
+COLD_SCRIPT = '''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from sandbox import execute_code
+payload = json.load(sys.stdin)
+print(json.dumps(execute_code(payload['code'], payload['test_cases'])))
+'''
+
+def time_cold_spawn():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    payload = json.dumps({'code': CODE, 'test_cases': TEST_CASES})
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', COLD_SCRIPT, root],
+        input=payload, capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - started) * 1000
+
+def time_forked():
+    started = time.perf_counter()
+    result = execute_code_forked(CODE, TEST_CASES)
+    return (time.perf_counter() - started) * 1000, result['startup_ms']
+
+def time_in_process():
+    started = time.perf_counter()
+    execute_code(CODE, TEST_CASES)
+    return (time.perf_counter() - started) * 1000
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f'{label:<28} median {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms')
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    cold = [time_cold_spawn() for _ in range(iterations)]
+    forked = [time_forked() for _ in range(iterations)]
+    in_process = [time_in_process() for _ in range(iterations)]
+
+    print(f'{iterations} runs of a one-test submission')
+    report('cold interpreter spawn', cold)
+    report('forked zygote (total)', [total for total, _ in forked])
+    report('forked zygote (startup)', [startup for _, startup in forked])
+    report('in-process (no isolation)', in_process)
+
+if __name__ == '__main__':
+    main()
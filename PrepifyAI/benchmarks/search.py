@@ -0,0 +1,133 @@
+"""Search latency on a large corpus
+
+Fills a scratch SQLite database with synthetic modules, quizzes and
+challenges (100,000 documents by default, indexed through the same triggers
+the app uses), then times Database.search for a mix of queries: common and
+rare words, prefixes of a word still being typed, multi-word queries,
+type-filtered queries and later pages. The "ranked" column says whether
+the query was selective enough to be ranked by relevance.
+
+Run from the PrepifyAI directory:
+
+    python benchmarks/search.py [documents] [iterations]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+
+# Word frequencies follow Zipf's law, as in natural text: a few filler words
+# appear in nearly every document, topic words in a few percent of them and
+# the long tail of made-up words in a handful each
+FILLER_WORDS = ['the', 'a', 'of', 'and', 'to', 'is', 'in', 'for', 'with', 'that', 'on', 'as', 'are', 'by']
+TOPIC_WORDS = ['learning', 'model', 'models', 'data', 'training', 'python', 'function', 'value', 'feature',
+               'features', 'regression', 'classification', 'clustering', 'gradient', 'descent', 'neural',
+               'network', 'networks', 'tensor', 'matrix', 'vector', 'probability', 'bayes', 'entropy', 'kernel',
+               'margin', 'boosting', 'forest', 'decision', 'tree', 'activation', 'softmax', 'embedding',
+               'attention', 'loss', 'optimizer', 'accuracy', 'precision', 'recall', 'validation']
+
+QUERIES = [
+    ('filler word', 'the', None, 1),
+    ('topic word', 'regression', None, 1),
+    ('rare word', 'xenolith', None, 1),
+    ('prefix', 'regr', None, 1),
+    ('short prefix', 'gr', None, 1),
+    ('plural', 'networks', None, 1),
+    ('two words', 'gradient descent', None, 1),
+    ('three words', 'neural network activation', None, 1),
+    ('quizzes only', 'probability', 'quiz', 1),
+    ('page 5', 'matrix', None, 5),
+    ('no match', 'qwertyuiop', None, 1),
+]
+
+def vocabulary(rng):
+    made_up = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(5, 10)))
+               for _ in range(30000)]
+    # Topic words rank between 20 and a few hundred
+    words = FILLER_WORDS + made_up
+    for i, word in enumerate(TOPIC_WORDS):
+        words.insert(20 + i * 8, word)
+    words.append('xenolith')
+    weights = []
+    total = 0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        weights.append(total)
+    return words, weights
+
+def paragraph(rng, words, weights, length=60):
+    return ' '.join(rng.choices(words, cum_weights=weights, k=length))
+
+def fill(db, documents, seed=1):
+    rng = random.Random(seed)
+    words, weights = vocabulary(rng)
+    per_kind = documents // 3
+
+    def text(length):
+        return paragraph(rng, words, weights, length)
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO modules (title, category, difficulty, content, order_index) VALUES (?, ?, ?, ?, ?)
+    ''', [(
+        text(4).title(), 'Synthetic', 'Beginner',
+        ''.join(f'<h2>{text(3)}</h2><p>{text(60)}</p>' for _ in range(3)), i
+    ) for i in range(per_kind)])
+    cursor.executemany('''
+        INSERT INTO quizzes (module_id, title, questions, points) VALUES (?, ?, ?, ?)
+    ''', [(
+        i + 1, text(3).title() + ' Quiz',
+        json.dumps([{'question': text(12) + '?', 'options': ['a', 'b'], 'correct': 0} for _ in range(5)]), 10
+    ) for i in range(per_kind)])
+    cursor.executemany('''
+        INSERT INTO challenges (title, description, difficulty, starter_code, test_cases, hints, points)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(
+        text(4).title(), text(40), 'Easy', '', '[]', '', 20
+    ) for i in range(documents - 2 * per_kind)])
+    # As the app's own writes do, index the modules' text rather than their markup
+    cursor.execute('SELECT id, content FROM modules')
+    for row in cursor.fetchall():
+        db.index_plain_text(cursor, 'module', row['id'], row['content'])
+    conn.commit()
+    conn.close()
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'search.db'))
+        started = time.perf_counter()
+        fill(db, documents)
+        print(f'indexed {documents} documents in {time.perf_counter() - started:.1f}s\n')
+
+        print(f'{"query":<40}{"results":>9}{"ranked":>8}{"p50 ms":>9}{"p95 ms":>9}')
+        for label, query, kind, page in QUERIES:
+            per_page = 20
+            offset = (page - 1) * per_page
+            results, _ = db.search(query, kind, per_page, offset)
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                db.search(query, kind, per_page, offset)
+                timings.append((time.perf_counter() - started) * 1000)
+            ranked = 'yes' if results and results[0]['score'] is not None else 'no'
+            print(f'{label + " " + repr(query):<40}{len(results):>9}{ranked:>8}'
+                  f'{statistics.median(timings):>9.2f}{percentile(timings, 0.95):>9.2f}')
+
+if __name__ == '__main__':
+    main()
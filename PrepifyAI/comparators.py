@@ -0,0 +1,143 @@
+import ast
+import json
+import math
+import re
+
+# Output comparators for challenge test cases. A test case picks one with
+# 'compare' (and optionally 'tolerance' and 'abs_tolerance'); the expected side is parsed once
+# when the challenge is saved (see prepare_expected) so grading only has to
+# parse the submission's output.
+
+EXACT = 'exact'
+WHITESPACE = 'whitespace'
+NUMERIC = 'numeric'
+LITERAL = 'literal'
+COMPARATORS = (EXACT, WHITESPACE, NUMERIC, LITERAL)
+
+# Looser comparison is something a challenge opts into, so that an answer
+# that's merely close (say an off-by-one in a large count) doesn't pass
+DEFAULT_COMPARATOR = EXACT
+# Relative, and absolute unless a test case sets 'abs_tolerance' too, so float
+# residue like 5.55e-17 still matches an expected 0
+DEFAULT_TOLERANCE = 1e-9
+
+# Splits text into alternating non-number / number parts. inf and nan only
+# count as whole words, not as the end of one like "Hannan"
+NUMBER_RE = re.compile(r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|(?<!\w)[-+]?(?:inf|nan)\b)')
+INTEGER_RE = re.compile(r'[-+]?\d+')
+
+def normalize_whitespace(text):
+    return ' '.join(text.split())
+
+def split_numbers(text):
+    parts = NUMBER_RE.split(normalize_whitespace(text))
+    # Odd positions are the captured numbers
+    return [parse_number(part) if i % 2 else part for i, part in enumerate(parts)]
+
+def parse_number(token):
+    # Integers stay exact; floats would round away digits past the 16th
+    return int(token) if INTEGER_RE.fullmatch(token) else float(token)
+
+def numbers_close(a, b, tolerance, abs_tolerance):
+    """Integers must be equal; tolerance only applies when either side is a
+    float (it had a fraction or an exponent)"""
+    if isinstance(a, int) and isinstance(b, int):
+        return a == b
+    try:
+        a, b = float(a), float(b)
+    except OverflowError:
+        return False
+    if math.isnan(a) and math.isnan(b):
+        return True
+    return math.isclose(a, b, rel_tol=tolerance, abs_tol=abs_tolerance)
+
+def parse_literal(text):
+    try:
+        return True, ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return False, None
+
+def values_match(actual, expected, tolerance, abs_tolerance):
+    # Structural comparison: lists and tuples are interchangeable, numbers
+    # compare as in numbers_close, everything else must be equal
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        # True == 1 and False == 0.0, so the types have to be checked
+        return type(actual) is type(expected) and actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        return numbers_close(actual, expected, tolerance, abs_tolerance)
+    if isinstance(actual, (list, tuple)) and isinstance(expected, (list, tuple)):
+        return len(actual) == len(expected) and all(
+            values_match(a, e, tolerance, abs_tolerance) for a, e in zip(actual, expected)
+        )
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        return actual.keys() == expected.keys() and all(
+            values_match(actual[key], expected[key], tolerance, abs_tolerance) for key in actual
+        )
+    return actual == expected
+
+def json_safe(value):
+    # Only keep precomputed forms that survive a JSON round trip unchanged
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+def prepare_expected(test_case):
+    """Precompute the parsed expected value for a test case's comparator
+
+    Returns None when there is nothing to precompute (or the parsed form
+    can't be stored as JSON), in which case compare_output parses at grade time.
+    """
+    comparator = test_case.get('compare', DEFAULT_COMPARATOR)
+    if comparator not in COMPARATORS:
+        raise ValueError(f'Unknown comparator: {comparator}')
+    expected = str(test_case['expected']).strip()
+    if comparator == WHITESPACE:
+        return normalize_whitespace(expected)
+    if comparator == NUMERIC:
+        return split_numbers(expected)
+    if comparator == LITERAL:
+        parsed, value = parse_literal(expected)
+        if parsed and json_safe(value):
+            return {'value': value}
+    return None
+
+def compare_output(actual, test_case, prepared=None):
+    """Check a submission's output against a test case's expected output"""
+    expected = str(test_case['expected']).strip()
+    if actual == expected:
+        return True
+
+    comparator = test_case.get('compare', DEFAULT_COMPARATOR)
+    tolerance = test_case.get('tolerance', DEFAULT_TOLERANCE)
+    abs_tolerance = test_case.get('abs_tolerance', tolerance)
+
+    if comparator == WHITESPACE:
+        return normalize_whitespace(actual) == (prepared or normalize_whitespace(expected))
+
+    if comparator == NUMERIC:
+        expected_parts = prepared or split_numbers(expected)
+        actual_parts = split_numbers(actual)
+        if len(actual_parts) != len(expected_parts):
+            return False
+        for i, (a, e) in enumerate(zip(actual_parts, expected_parts)):
+            if i % 2:
+                if not numbers_close(a, e, tolerance, abs_tolerance):
+                    return False
+            elif a.strip() != e.strip():
+                return False
+        return True
+
+    if comparator == LITERAL:
+        if prepared:
+            expected_value = prepared['value']
+        else:
+            parsed, expected_value = parse_literal(expected)
+            if not parsed:
+                return normalize_whitespace(actual) == normalize_whitespace(expected)
+        parsed, actual_value = parse_literal(actual)
+        if not parsed:
+            return False
+        return values_match(actual_value, expected_value, tolerance, abs_tolerance)
+
+    return False
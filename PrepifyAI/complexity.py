@@ -0,0 +1,104 @@
+import math
+
+# Performance checks for challenges. A challenge may declare a 'performance'
+# spec: setup code that builds an input of size n, a call to time on it, the
+# sizes to try, the growth allowed and per-call budgets. The sandbox runs the
+# call at each size, measuring CPU time and counting the lines of submitted
+# code executed (steps), then fits how both grow with n.
+#
+#     {
+#         "setup": "numbers = [random.random() for _ in range(n)]",
+#         "call": "calculate_mean(numbers)",
+#         "sizes": [10000, 20000, 40000, 80000],
+#         "max_growth": "linear",
+#         "time_budget_ms": 50,
+#         "step_budget": 100000
+#     }
+
+# Growth classes as exponents of n. Over the few doublings a check covers, a
+# log factor looks like a small extra exponent.
+GROWTH_EXPONENTS = {
+    'constant': 0.0,
+    'logarithmic': 0.15,
+    'linear': 1.0,
+    'linearithmic': 1.15,
+    'quadratic': 2.0,
+    'cubic': 3.0,
+}
+# How far a measured exponent may exceed the allowed one: timings wobble, and
+# fixed per-call costs flatten the curve at small sizes
+GROWTH_TOLERANCE = 0.4
+
+DEFAULT_TIME_BUDGET_MS = 250
+DEFAULT_STEP_BUDGET = 1000000
+# Runs shorter than this are mostly timer noise; their growth isn't judged
+# from timings, only from steps
+MIN_TIMED_MS = 0.5
+
+def validate_performance(spec):
+    """Check a challenge's performance spec; raises ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError('performance must be an object')
+    for key in ('setup', 'call'):
+        if not isinstance(spec.get(key), str):
+            raise ValueError(f'performance.{key} must be code')
+    compile(spec['setup'], '<performance setup>', 'exec')
+    compile(spec['call'], '<performance call>', 'eval')
+    sizes = spec.get('sizes')
+    if (not isinstance(sizes, list) or len(sizes) < 2
+            or not all(isinstance(size, int) and size > 0 for size in sizes)
+            or sizes != sorted(set(sizes))):
+        raise ValueError('performance.sizes must be at least two increasing positive integers')
+    if spec.get('max_growth') is not None and spec['max_growth'] not in GROWTH_EXPONENTS:
+        raise ValueError(f"performance.max_growth must be one of: {', '.join(GROWTH_EXPONENTS)}")
+    for key in ('time_budget_ms', 'step_budget'):
+        if spec.get(key) is not None and not (isinstance(spec[key], (int, float)) and spec[key] > 0):
+            raise ValueError(f'performance.{key} must be a positive number')
+
+def fit_exponent(sizes, values):
+    """Slope of log(value) against log(n): k for values growing like n**k"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in values]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+def growth_name(exponent):
+    return min(GROWTH_EXPONENTS, key=lambda name: abs(GROWTH_EXPONENTS[name] - exponent))
+
+def estimate_growth(profile):
+    """Growth exponent of a profile, from steps and from timings long enough
+    to trust; whichever grows faster counts. None if neither can tell."""
+    sizes = [point['n'] for point in profile]
+    exponents = []
+    if profile[-1]['steps'] > len(profile):
+        exponents.append(fit_exponent(sizes, [point['steps'] for point in profile]))
+    if profile[-1]['ms'] >= MIN_TIMED_MS:
+        exponents.append(fit_exponent(sizes, [point['ms'] for point in profile]))
+    return max(exponents) if exponents else None
+
+def describe_budget(spec):
+    growth = f"{spec['max_growth']} growth or better, " if spec.get('max_growth') else ''
+    return (f"{growth}at most {spec.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)} ms and "
+            f"{spec.get('step_budget', DEFAULT_STEP_BUDGET)} steps per call")
+
+def performance_verdict(spec, profile):
+    """The 'Performance' test result for a completed profile"""
+    exponent = estimate_growth(profile)
+    largest = profile[-1]
+    result = {
+        'input': 'Performance',
+        'expected': describe_budget(spec),
+        'profile': profile,
+        'exponent': None if exponent is None else round(exponent, 2),
+        'growth': None if exponent is None else growth_name(exponent),
+    }
+    measured = f"{largest['ms']} ms and {largest['steps']} steps at n={largest['n']}"
+    if exponent is None:
+        result['actual'] = f'too fast to measure growth; {measured}'
+    else:
+        result['actual'] = f"{result['growth']} growth (n^{result['exponent']}); {measured}"
+    allowed = GROWTH_EXPONENTS.get(spec.get('max_growth'))
+    result['passed'] = allowed is None or exponent is None or exponent <= allowed + GROWTH_TOLERANCE
+    return result
@@ -1,315 +1,1221 @@
 import sqlite3
+import contextvars
 import hashlib
 import json
-from datetime import datetime
+import os
+import queue
+import time
+from datetime import datetime, timedelta, timezone
+
+from comparators import prepare_expected
+from complexity import validate_performance
+from plagiarism import SIMILARITY_THRESHOLD, estimate_similarity, signature_buckets, submission_signature
+from review import new_review_state, schedule_review
+from sandbox import FAIL_FAST
+from search import SEARCH_KINDS, MATCH_START, MATCH_END, fts5_query, search_result, search_terms, strip_html
+
+# CPU cost (ms) charged to a user's fair-queueing clock when a grading job is
+# enqueued; corrected with the measured cost once the job completes
+DEFAULT_GRADING_COST_MS = 100
+# How much sooner a priority job is served, in the same weighted CPU ms as the
+# fair-queueing clock. A head start rather than a separate queue, so a user
+# flooding priority jobs still falls behind everyone else by their CPU use.
+PRIORITY_HEAD_START_MS = 1000
+
+# Stored in SQLite's user_version once init_db has brought a file up to date,
+# so later starts can skip the DDL. Bump it whenever init_db changes.
+SCHEMA_VERSION = 12
+
+# Queries matching more documents than this aren't ranked: bm25() scores every
+# match, which takes tens of milliseconds for a word in most of 100k documents.
+# Such queries list the newest matches first instead.
+SEARCH_RANK_LIMIT = 2000
+
+# recommendations rows under this user id are what recommender.py suggests to
+# learners with no history yet
+RECOMMENDATION_DEFAULT_USER = 0
+
+# Most submissions read from one LSH bucket when looking for copies. Bounds a
+# lookup when many submissions share a bucket, e.g. an easy challenge's
+# one-line answer; the newest ones are read.
+PLAGIARISM_BUCKET_LIMIT = 200
+
+# What the search index holds for each searchable table: SQL for a row's
+# title and body, with {row} standing for the row (NEW in a trigger). The
+# triggers use only built-in SQL so that any client can write these tables.
+SEARCH_SOURCES = [
+    ('modules', 'module', '{row}.title', '{row}.content'),
+    ('quizzes', 'quiz', '{row}.title',
+     "(SELECT group_concat(json_extract(value, '$.question'), ' ') FROM json_each({row}.questions))"),
+    ('challenges', 'challenge', '{row}.title', '{row}.description'),
+]
+# Bodies stored as HTML. The triggers index the markup as it is; the app
+# replaces that with the plain text (see index_plain_text) whenever it writes
+# one of these tables
+SEARCH_HTML_COLUMNS = {'modules': 'content', 'challenges': 'description'}
+
+# What the admin exports (see exports.py) read: each table's columns in output
+# order as (name, SQL) pairs, the key pages are ordered by, the timestamp a
+# date range applies to, and how to keep only rows about one module (None
+# where that means nothing). Password hashes are never exported.
+EXPORT_SOURCES = {
+    'users': {
+        'columns': [('id', 'u.id'), ('username', 'u.username'), ('email', 'u.email'),
+                    ('full_name', 'u.full_name'), ('points', 'u.points'), ('created_at', 'u.created_at')],
+        'from': 'users u',
+        'key': 'u.id',
+        'timestamp': 'u.created_at',
+        # Learners who completed the module
+        'module': 'u.id IN (SELECT user_id FROM user_progress WHERE module_id = ? AND completed = 1)',
+    },
+    'quiz_attempts': {
+        'columns': [('id', 'a.id'), ('user_id', 'a.user_id'), ('username', 'u.username'),
+                    ('quiz_id', 'a.quiz_id'), ('module_id', 'q.module_id'), ('score', 'a.score'),
+                    ('total_questions', 'a.total_questions'), ('attempted_at', 'a.attempted_at')],
+        'from': 'quiz_attempts a LEFT JOIN quizzes q ON q.id = a.quiz_id LEFT JOIN users u ON u.id = a.user_id',
+        'key': 'a.id',
+        'timestamp': 'a.attempted_at',
+        'module': 'q.module_id = ?',
+    },
+    'challenge_submissions': {
+        'columns': [('id', 's.id'), ('user_id', 's.user_id'), ('username', 'u.username'),
+                    ('challenge_id', 's.challenge_id'), ('status', 's.status'), ('passed_tests', 's.passed_tests'),
+                    ('total_tests', 's.total_tests'), ('cpu_ms', 's.cpu_ms'), ('max_rss_kb', 's.max_rss_kb'),
+                    ('submitted_at', 's.submitted_at'), ('code', 's.code')],
+        'from': 'challenge_submissions s LEFT JOIN users u ON u.id = s.user_id',
+        'key': 's.id',
+        'timestamp': 's.submitted_at',
+        # Challenges don't belong to modules
+        'module': None,
+    },
+}
+
+def utc_epoch(timestamp):
+    # CURRENT_TIMESTAMP columns come back as text from SQLite and as naive
+    # UTC datetimes from Postgres
+    if isinstance(timestamp, str):
+        timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp())
+
+# When the current session last wrote to the database (epoch seconds). The app
+# sets it per request from the session cookie; writer commits update it.
+last_write_at = contextvars.ContextVar('last_write_at', default=None)
+
+class PooledConnection:
+    """A connection borrowed from a pool, with the sqlite3 calls Database uses
+
+    Used as a context manager: leaving the block, normally or because a query
+    raised, rolls back anything left uncommitted and returns the connection to
+    its pool. Relying on garbage collection for that would leave the single
+    SQLite writer pinned for as long as a traceback holds the frame.
+    """
+
+    def __init__(self, conn, release, on_commit=None):
+        self.conn = conn
+        self.release = release
+        self.on_commit = on_commit
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self.conn.commit()
+        if self.on_commit:
+            self.on_commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            conn.rollback()
+            self.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class SQLitePool:
+    """Fixed set of reusable SQLite connections
+
+    With overflow, a borrower never waits: extra connections are opened when
+    the pool is empty and closed again when it is full. Without it (the single
+    writer connection), borrowers queue for up to timeout seconds.
+    """
+
+    def __init__(self, connect, size, overflow=True, timeout=30):
+        self.connect = connect
+        self.overflow = overflow
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self.idle.put(connect())
+
+    def acquire(self, on_commit=None):
+        try:
+            if self.overflow:
+                conn = self.idle.get_nowait()
+            else:
+                conn = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            if not self.overflow:
+                raise sqlite3.OperationalError('Timed out waiting for the database writer connection')
+            conn = self.connect()
+        return PooledConnection(conn, self.release, on_commit)
+
+    def release(self, conn):
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def get_database(url=None, init=True):
+    """Open the configured storage backend
+
+    DATABASE_URL selects it: a postgres:// or postgresql:// URL uses the
+    PostgreSQL backend, anything else is a SQLite file path (default prepify.db).
+    Pass init=False from processes started after the schema is already set up.
+    """
+    url = url or os.environ.get('DATABASE_URL', 'prepify.db')
+    if url.startswith(('postgres://', 'postgresql://')):
+        from database_postgres import PostgresDatabase
+        return PostgresDatabase(url, init)
+    return Database(url, init)
 
 class Database:
-    def __init__(self, db_name='prepify.db'):
+    """SQLite storage backend
+
+    The query methods stick to SQL that PostgreSQL also accepts, so
+    PostgresDatabase only swaps the connection handling and the schema DDL.
+    """
+    IntegrityError = sqlite3.IntegrityError
+    # Extra locking for the grading job claim subquery (SQLite locks the whole
+    # database for the UPDATE, so nothing more is needed here)
+    claim_lock_clause = ''
+    # How long a session's reads stay on the writer after it writes. Read-only
+    # connections open the same file, so they already see every commit.
+    replica_lag_seconds = 0
+    
+    def __init__(self, db_name='prepify.db', init=True):
         self.db_name = db_name
-        self.init_db()
+        self.read_pool_size = int(os.environ.get('DATABASE_READ_POOL_SIZE', 0)) or os.cpu_count() or 1
+        self.pools = None
+        self.pools_pid = None
+        if init:
+            self.init_db()
     
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_name)
+    def connect(self, read_only=False):
+        if read_only:
+            # urllib.request pulls in http.client and ssl; only readers need it
+            from urllib.request import pathname2url
+            uri = 'file:' + pathname2url(os.path.abspath(self.db_name)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         return conn
     
+    def connection_pools(self):
+        # Connections can't cross a fork, so each process opens its own
+        if self.pools_pid != os.getpid():
+            writer = SQLitePool(self.connect, 1, overflow=False)
+            readers = SQLitePool(lambda: self.connect(read_only=True), self.read_pool_size)
+            self.pools = (writer, readers)
+            self.pools_pid = os.getpid()
+        return self.pools
+    
+    def get_connection(self):
+        """Borrow the writer connection"""
+        writer, _ = self.connection_pools()
+        return writer.acquire(on_commit=self.mark_write)
+    
+    def get_read_connection(self):
+        """Borrow a read-only connection, or the writer if this session wrote too recently"""
+        if self.replica_lag_seconds and self.wrote_recently():
+            return self.get_connection()
+        _, readers = self.connection_pools()
+        return readers.acquire()
+    
+    def mark_write(self):
+        last_write_at.set(time.time())
+    
+    def wrote_recently(self):
+        written = last_write_at.get()
+        return written is not None and time.time() - written < self.replica_lag_seconds
+    
     def init_db(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                full_name TEXT,
-                points INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            if cursor.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+                return
         
-        # Learning modules table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS modules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                category TEXT NOT NULL,
-                difficulty TEXT NOT NULL,
-                content TEXT NOT NULL,
-                order_index INTEGER
-            )
-        ''')
+            # WAL lets the grader worker processes write while the web process reads
+            cursor.execute('PRAGMA journal_mode=WAL')
         
-        # Quizzes table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS quizzes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                module_id INTEGER,
-                title TEXT NOT NULL,
-                questions TEXT NOT NULL,
-                points INTEGER DEFAULT 10,
-                FOREIGN KEY (module_id) REFERENCES modules (id)
-            )
-        ''')
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    full_name TEXT,
+                    points INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
         
-        # Coding challenges table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS challenges (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL,
-                difficulty TEXT NOT NULL,
-                starter_code TEXT,
-                test_cases TEXT NOT NULL,
-                hints TEXT,
-                points INTEGER DEFAULT 20
-            )
-        ''')
+            # Learning modules table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS modules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    order_index INTEGER
+                )
+            ''')
         
-        # User progress table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                module_id INTEGER,
-                completed BOOLEAN DEFAULT 0,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (module_id) REFERENCES modules (id),
-                UNIQUE(user_id, module_id)
-            )
-        ''')
+            # Quizzes table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS quizzes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    module_id INTEGER,
+                    title TEXT NOT NULL,
+                    questions TEXT NOT NULL,
+                    points INTEGER DEFAULT 10,
+                    FOREIGN KEY (module_id) REFERENCES modules (id)
+                )
+            ''')
         
-        # Quiz attempts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                quiz_id INTEGER,
-                score INTEGER,
-                total_questions INTEGER,
-                attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
-            )
-        ''')
+            # Coding challenges table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS challenges (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    starter_code TEXT,
+                    test_cases TEXT NOT NULL,
+                    hints TEXT,
+                    points INTEGER DEFAULT 20
+                )
+            ''')
+        
+            # User progress table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_progress (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    module_id INTEGER,
+                    completed BOOLEAN DEFAULT 0,
+                    completed_at TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (module_id) REFERENCES modules (id),
+                    UNIQUE(user_id, module_id)
+                )
+            ''')
+        
+            # Quiz attempts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS quiz_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    quiz_id INTEGER,
+                    score INTEGER,
+                    total_questions INTEGER,
+                    attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+                )
+            ''')
+        
+            # Challenge submissions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS challenge_submissions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    challenge_id INTEGER,
+                    code TEXT NOT NULL,
+                    status TEXT,
+                    passed_tests INTEGER,
+                    total_tests INTEGER,
+                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (challenge_id) REFERENCES challenges (id)
+                )
+            ''')
+        
+            # Grading job queue table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS grading_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    challenge_id INTEGER,
+                    code TEXT NOT NULL,
+                    mode TEXT DEFAULT 'run-all',
+                    status TEXT DEFAULT 'queued',
+                    priority INTEGER DEFAULT 0,
+                    virtual_finish REAL DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER DEFAULT 3,
+                    available_at REAL NOT NULL,
+                    locked_until REAL,
+                    worker_id TEXT,
+                    test_results TEXT DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (challenge_id) REFERENCES challenges (id)
+                )
+            ''')
+            # Per-user weighted fair queueing state for grading jobs
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_grading_usage (
+                    user_id INTEGER PRIMARY KEY,
+                    weight REAL DEFAULT 1,
+                    virtual_finish REAL DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS grading_scheduler (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    virtual_time REAL NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO grading_scheduler (id, virtual_time) VALUES (1, 0)')
+        
+            # Change log of users' points and progress, read by the live update
+            # publisher in each server process (see live_updates.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    created_at REAL NOT NULL
+                )
+            ''')
+        
+            # Spaced-repetition state of each quiz question a user has answered
+            # (see review.py). One small row per pair, without a rowid, so it stays
+            # compact at millions of pairs; the due index serves the review queue.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS review_items (
+                    user_id INTEGER,
+                    quiz_id INTEGER,
+                    question_index INTEGER,
+                    ease REAL NOT NULL,
+                    interval_days REAL NOT NULL,
+                    repetitions INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    due_at REAL NOT NULL,
+                    reviewed_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, quiz_id, question_index),
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_review_items_due
+                ON review_items (user_id, due_at)
+            ''')
+        
+            # Each learner's next modules and challenges, precomputed by recommender.py
+            self.create_recommendations_table(cursor, 'recommendations')
+        
+            # MinHash signature of each submission and its LSH buckets, for finding
+            # near-duplicate submissions (see plagiarism.py). An empty signature
+            # marks a submission with nothing beyond the starter code.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS submission_signatures (
+                    submission_id INTEGER PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    FOREIGN KEY (submission_id) REFERENCES challenge_submissions (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS submission_buckets (
+                    challenge_id INTEGER,
+                    band INTEGER,
+                    bucket INTEGER,
+                    submission_id INTEGER,
+                    PRIMARY KEY (challenge_id, band, bucket, submission_id)
+                ) WITHOUT ROWID
+            ''')
+        
+            # Columns added after a table was first created
+            self.ensure_column(cursor, 'grading_jobs', 'mode', "TEXT DEFAULT 'run-all'")
+            self.ensure_column(cursor, 'grading_jobs', 'virtual_finish', 'REAL DEFAULT 0')
+            self.ensure_column(cursor, 'challenge_submissions', 'cpu_ms', 'REAL')
+            self.ensure_column(cursor, 'challenge_submissions', 'max_rss_kb', 'INTEGER')
+            self.ensure_column(cursor, 'challenges', 'expected_values', 'TEXT')
+            self.ensure_column(cursor, 'challenges', 'performance', 'TEXT')
+            self.ensure_column(cursor, 'grading_jobs', 'cpu_ms', 'REAL')
+        
+            # Index first: the backfill's updates go through the search triggers,
+            # and those of an older schema may call functions that no longer exist
+            self.create_search_index(cursor)
+            self.backfill_expected_values(cursor)
         
-        # Challenge submissions table
+            cursor.execute('DROP INDEX IF EXISTS idx_grading_jobs_claim')
+            cursor.execute('DROP INDEX IF EXISTS idx_grading_jobs_fair_claim')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_grading_jobs_tag_claim
+                ON grading_jobs (status, virtual_finish, id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_challenge_submissions_user_time
+                ON challenge_submissions (user_id, submitted_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_grading_jobs_user_time
+                ON grading_jobs (user_id, created_at)
+            ''')
+        
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+    
+    def backfill_expected_values(self, cursor):
+        # Precompute comparator forms for challenges saved before they existed,
+        # and redo the rest since the forms change along with the comparators
+        cursor.execute('SELECT id, description, test_cases FROM challenges')
+        for challenge in cursor.fetchall():
+            cursor.execute('UPDATE challenges SET expected_values = ? WHERE id = ?', (
+                self.prepare_expected_values(json.loads(challenge['test_cases'])),
+                challenge['id']
+            ))
+            self.index_plain_text(cursor, 'challenge', challenge['id'], challenge['description'])
+    
+    def create_search_index(self, cursor):
+        """(Re)build the full-text index and the triggers that keep it current"""
+        # Not stemmed, see search.query_words
+        cursor.execute('DROP TABLE IF EXISTS search_index')
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS challenge_submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                challenge_id INTEGER,
-                code TEXT NOT NULL,
-                status TEXT,
-                passed_tests INTEGER,
-                total_tests INTEGER,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (challenge_id) REFERENCES challenges (id)
+            CREATE VIRTUAL TABLE search_index USING fts5(
+                title, body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
             )
         ''')
-        
-        conn.commit()
-        conn.close()
+        for table, kind, title, body in SEARCH_SOURCES:
+            code = SEARCH_KINDS[kind]
+            insert_new = f'''
+                INSERT INTO search_index (rowid, title, body)
+                VALUES (NEW.id * 4 + {code}, {title.format(row='NEW')}, {body.format(row='NEW')});
+            '''
+            delete_old = f'DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code};'
+            for event, actions in (('INSERT', insert_new),
+                                   ('UPDATE', delete_old + insert_new),
+                                   ('DELETE', delete_old)):
+                trigger = f'{table}_search_{event.lower()}'
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                cursor.execute(f'CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN {actions} END')
+            cursor.execute(f'''
+                INSERT INTO search_index (rowid, title, body)
+                SELECT id * 4 + {code}, {title.format(row=table)}, {body.format(row=table)} FROM {table}
+            ''')
+            if table in SEARCH_HTML_COLUMNS:
+                cursor.execute(f'SELECT id, {SEARCH_HTML_COLUMNS[table]} AS html FROM {table}')
+                for row in cursor.fetchall():
+                    self.index_plain_text(cursor, kind, row['id'], row['html'])
+    
+    def rebuild_search_index(self):
+        """Reindex every searchable row, e.g. after another client wrote HTML"""
+        with self.get_connection() as conn:
+            self.create_search_index(conn.cursor())
+            conn.commit()
+    
+    def index_plain_text(self, cursor, kind, row_id, html):
+        # Any update to the row re-runs its trigger, so this follows every
+        # write. Rows written by other clients keep their markup in the index
+        # until it is rebuilt (python search.py rebuild), which costs nothing
+        # worse than a few stray words
+        cursor.execute('UPDATE search_index SET body = ? WHERE rowid = ?',
+                       (strip_html(html), row_id * 4 + SEARCH_KINDS[kind]))
+    
+    def ensure_column(self, cursor, table, column, definition):
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [row['name'] for row in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
     
     # User methods
     def create_user(self, username, email, password, full_name):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        try:
-            cursor.execute('''
-                INSERT INTO users (username, email, password, full_name)
-                VALUES (?, ?, ?, ?)
-            ''', (username, email, hashed_password, full_name))
-            conn.commit()
-            user_id = cursor.lastrowid
-            conn.close()
-            return user_id
-        except sqlite3.IntegrityError:
-            conn.close()
-            return None
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            try:
+                cursor.execute('''
+                    INSERT INTO users (username, email, password, full_name)
+                    VALUES (?, ?, ?, ?)
+                    RETURNING id
+                ''', (username, email, hashed_password, full_name))
+                user_id = cursor.fetchone()['id']
+                # A new user can enter a short leaderboard
+                self.record_user_event(cursor, user_id)
+                conn.commit()
+                return user_id
+            except self.IntegrityError:
+                return None
     
     def authenticate_user(self, username, password):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        cursor.execute('''
-            SELECT * FROM users WHERE username = ? AND password = ?
-        ''', (username, hashed_password))
-        user = cursor.fetchone()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            cursor.execute('''
+                SELECT * FROM users WHERE username = ? AND password = ?
+            ''', (username, hashed_password))
+            user = cursor.fetchone()
         return dict(user) if user else None
     
     def get_user(self, user_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        user = cursor.fetchone()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
         return dict(user) if user else None
     
     def update_user_points(self, user_id, points):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE users SET points = points + ? WHERE id = ?
-        ''', (points, user_id))
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users SET points = points + ? WHERE id = ?
+            ''', (points, user_id))
+            self.record_user_event(cursor, user_id)
+            conn.commit()
+    
+    def record_user_event(self, cursor, user_id):
+        # Call inside the transaction that changes the user's points or progress
+        cursor.execute('INSERT INTO user_events (user_id, created_at) VALUES (?, ?)', (user_id, time.time()))
+    
+    def get_latest_user_event_id(self):
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) AS id FROM user_events')
+            latest = cursor.fetchone()['id']
+        return latest or 0
+    
+    def get_user_events_since(self, event_id):
+        """Latest event id and the set of users changed after event_id"""
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, user_id FROM user_events WHERE id > ? ORDER BY id', (event_id,))
+            events = cursor.fetchall()
+        if not events:
+            return event_id, set()
+        return events[-1]['id'], {event['user_id'] for event in events}
+    
+    def prune_user_events(self, before):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM user_events WHERE created_at < ?', (before,))
+            conn.commit()
     
     # Module methods
     def add_module(self, title, category, difficulty, content, order_index):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO modules (title, category, difficulty, content, order_index)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, category, difficulty, content, order_index))
-        conn.commit()
-        module_id = cursor.lastrowid
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO modules (title, category, difficulty, content, order_index)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (title, category, difficulty, content, order_index))
+            module_id = cursor.fetchone()['id']
+            self.index_plain_text(cursor, 'module', module_id, content)
+            conn.commit()
         return module_id
     
     def get_all_modules(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM modules ORDER BY order_index')
-        modules = cursor.fetchall()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM modules ORDER BY order_index')
+            modules = cursor.fetchall()
         return [dict(module) for module in modules]
     
     def get_module(self, module_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM modules WHERE id = ?', (module_id,))
-        module = cursor.fetchone()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM modules WHERE id = ?', (module_id,))
+            module = cursor.fetchone()
         return dict(module) if module else None
     
     # Quiz methods
     def add_quiz(self, module_id, title, questions, points):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO quizzes (module_id, title, questions, points)
-            VALUES (?, ?, ?, ?)
-        ''', (module_id, title, json.dumps(questions), points))
-        conn.commit()
-        quiz_id = cursor.lastrowid
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO quizzes (module_id, title, questions, points)
+                VALUES (?, ?, ?, ?)
+                RETURNING id
+            ''', (module_id, title, json.dumps(questions), points))
+            quiz_id = cursor.fetchone()['id']
+            conn.commit()
         return quiz_id
     
     def get_quiz(self, quiz_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM quizzes WHERE id = ?', (quiz_id,))
-        quiz = cursor.fetchone()
-        conn.close()
-        if quiz:
-            quiz_dict = dict(quiz)
-            quiz_dict['questions'] = json.loads(quiz_dict['questions'])
-            return quiz_dict
-        return None
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM quizzes WHERE id = ?', (quiz_id,))
+            quiz = cursor.fetchone()
+        return self.quiz_from_row(quiz)
     
     def get_module_quiz(self, module_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM quizzes WHERE module_id = ?', (module_id,))
-        quiz = cursor.fetchone()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM quizzes WHERE module_id = ?', (module_id,))
+            quiz = cursor.fetchone()
+        return self.quiz_from_row(quiz)
+    
+    def quiz_from_row(self, quiz):
         if quiz:
             quiz_dict = dict(quiz)
             quiz_dict['questions'] = json.loads(quiz_dict['questions'])
             return quiz_dict
         return None
     
-    def record_quiz_attempt(self, user_id, quiz_id, score, total_questions):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_module_with_quiz(self, module_id):
+        """A module and its quiz (or None), read on one connection"""
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM modules WHERE id = ?', (module_id,))
+            module = cursor.fetchone()
+            if not module:
+                return None
+            cursor.execute('SELECT * FROM quizzes WHERE module_id = ?', (module_id,))
+            quiz = cursor.fetchone()
+        module_dict = dict(module)
+        module_dict['quiz'] = self.quiz_from_row(quiz)
+        return module_dict
+    
+    # Recommendation methods
+    def create_recommendations_table(self, cursor, name):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                user_id INTEGER,
+                rank INTEGER,
+                item_type TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (user_id, rank)
+            ) WITHOUT ROWID
+        ''')
+    
+    def get_recommendable_items(self):
+        """(item_type, item_id) of every module, in course order, then every challenge"""
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM modules ORDER BY order_index, id')
+            items = [('module', row['id']) for row in cursor.fetchall()]
+            cursor.execute('SELECT id FROM challenges ORDER BY id')
+            items += [('challenge', row['id']) for row in cursor.fetchall()]
+        return items
+    
+    def get_interactions(self):
+        """(user_id, item_type, item_id, weight, done) for everything learners have done
+
+        A completed module counts 1, a quiz its best score as a fraction of the
+        module, a passed challenge 1 and an attempted one 0.5. done marks
+        completed modules and passed challenges.
+        """
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, 'module' AS item_type, module_id AS item_id, 1.0 AS weight, 1 AS done
+                FROM user_progress WHERE completed = 1
+                UNION ALL
+                SELECT quiz_attempts.user_id, 'module', quizzes.module_id,
+                       MAX(quiz_attempts.score * 1.0 / quiz_attempts.total_questions), 0
+                FROM quiz_attempts JOIN quizzes ON quizzes.id = quiz_attempts.quiz_id
+                WHERE quiz_attempts.total_questions > 0 AND quizzes.module_id IS NOT NULL
+                GROUP BY quiz_attempts.user_id, quizzes.module_id
+                UNION ALL
+                SELECT user_id, 'challenge', challenge_id,
+                       MAX(CASE WHEN status = 'passed' THEN 1.0 ELSE 0.5 END),
+                       MAX(CASE WHEN status = 'passed' THEN 1 ELSE 0 END)
+                FROM challenge_submissions
+                GROUP BY user_id, challenge_id
+            ''')
+            interactions = [(row['user_id'], row['item_type'], row['item_id'], float(row['weight']), row['done'])
+                            for row in cursor]
+        return interactions
+    
+    def replace_recommendations(self, rows, batch_size=50000):
+        """Swap in a new set of (user_id, rank, item_type, item_id, score) rows
+
+        The rows go into a staging table in batches, each its own short write
+        transaction, and replace the served table in one rename at the end.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DROP TABLE IF EXISTS recommendations_next')
+            self.create_recommendations_table(cursor, 'recommendations_next')
+            conn.commit()
+        
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    self.insert_recommendations(cursor, batch)
+                    conn.commit()
+                    batch = []
+            if batch:
+                self.insert_recommendations(cursor, batch)
+        
+            self.swap_recommendations(cursor)
+            conn.commit()
+    
+    def insert_recommendations(self, cursor, rows):
+        cursor.executemany('''
+            INSERT INTO recommendations_next (user_id, rank, item_type, item_id, score)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+    
+    def swap_recommendations(self, cursor):
+        cursor.execute('DROP TABLE recommendations')
+        cursor.execute('ALTER TABLE recommendations_next RENAME TO recommendations')
+    
+    def get_recommendations(self, user_id, limit=5):
+        """The user's precomputed recommendations, best first
+
+        A primary key lookup. Items the user has finished since the
+        recommendations were computed are skipped, and learners the last run
+        didn't know get the defaults.
+        """
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM recommendations WHERE user_id = ? LIMIT 1', (user_id,))
+            owner = user_id if cursor.fetchone() else RECOMMENDATION_DEFAULT_USER
+            cursor.execute('''
+                SELECT recommendations.item_type, recommendations.item_id, recommendations.score,
+                       COALESCE(modules.title, challenges.title) AS title,
+                       COALESCE(modules.difficulty, challenges.difficulty) AS difficulty
+                FROM recommendations
+                LEFT JOIN modules ON recommendations.item_type = 'module'
+                                 AND modules.id = recommendations.item_id
+                LEFT JOIN challenges ON recommendations.item_type = 'challenge'
+                                    AND challenges.id = recommendations.item_id
+                WHERE recommendations.user_id = ?
+                  AND COALESCE(modules.title, challenges.title) IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM user_progress
+                      WHERE recommendations.item_type = 'module' AND user_progress.user_id = ?
+                        AND user_progress.module_id = recommendations.item_id AND user_progress.completed = 1
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM challenge_submissions
+                      WHERE recommendations.item_type = 'challenge' AND challenge_submissions.user_id = ?
+                        AND challenge_submissions.challenge_id = recommendations.item_id
+                        AND challenge_submissions.status = 'passed'
+                  )
+                ORDER BY recommendations.rank
+                LIMIT ?
+            ''', (owner, user_id, user_id, limit))
+            recommendations = cursor.fetchall()
+        return [{
+            'type': row['item_type'],
+            'id': row['item_id'],
+            'title': row['title'],
+            'difficulty': row['difficulty'],
+            'score': round(row['score'], 4)
+        } for row in recommendations]
+    
+    # Search methods
+    def search(self, query, kind=None, limit=20, offset=0):
+        """Best matches for query as (results, has_more)
+
+        Every word of the query must match (the last one as a prefix), with
+        title matches weighted above body matches. kind restricts the results
+        to one of SEARCH_KINDS.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return [], False
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            rows = self.fetch_search_results(cursor, terms, kind, limit + 1, offset)
+        results = []
+        for row in rows[:limit]:
+            result = search_result(row['doc_id'], row['title'], row['snippet'], row['score'])
+            if row['module_id'] is not None:
+                result['module_id'] = row['module_id']
+            results.append(result)
+        return results, len(rows) > limit
+    
+    def fetch_search_results(self, cursor, terms, kind, limit, offset):
+        match = fts5_query(terms)
+        cursor.execute(f'''
+            SELECT COUNT(*) AS matches FROM (
+                SELECT 1 FROM search_index WHERE search_index MATCH ? LIMIT {SEARCH_RANK_LIMIT + 1}
+            )
+        ''', (match,))
+        if cursor.fetchone()['matches'] > SEARCH_RANK_LIMIT:
+            score, order = 'NULL', 'search_index.rowid DESC'
+        else:
+            # bm25() ranks better matches lower; title matches count ten times more
+            score, order = '-bm25(search_index, 10.0, 1.0)', 'bm25(search_index, 10.0, 1.0)'
+        kind_filter = f'AND search_index.rowid % 4 = {SEARCH_KINDS[kind]}' if kind else ''
+        cursor.execute(f'''
+            SELECT search_index.rowid AS doc_id, search_index.title,
+                   snippet(search_index, 1, '{MATCH_START}', '{MATCH_END}', '...', 24) AS snippet,
+                   {score} AS score,
+                   quizzes.module_id
+            FROM search_index
+            LEFT JOIN quizzes ON search_index.rowid % 4 = {SEARCH_KINDS['quiz']}
+                             AND quizzes.id = search_index.rowid / 4
+            WHERE search_index MATCH ? {kind_filter}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        ''', (match, limit, offset))
+        return cursor.fetchall()
+    
+    def record_quiz_attempt(self, user_id, quiz_id, score, total_questions, outcomes=None):
+        """Save a quiz attempt; outcomes (question index -> answered correctly)
+        also advances each question's review schedule"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, quiz_id, score, total_questions))
+            if outcomes:
+                self.record_reviews(cursor, user_id, quiz_id, outcomes, time.time())
+            self.record_user_event(cursor, user_id)
+            conn.commit()
+    
+    # Review methods
+    def record_reviews(self, cursor, user_id, quiz_id, outcomes, now):
         cursor.execute('''
-            INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, quiz_id, score, total_questions))
-        conn.commit()
-        conn.close()
+            SELECT * FROM review_items WHERE user_id = ? AND quiz_id = ?
+        ''', (user_id, quiz_id))
+        states = {row['question_index']: dict(row) for row in cursor.fetchall()}
+        for question_index, correct in outcomes.items():
+            state = schedule_review(states.get(question_index) or new_review_state(), correct, now)
+            cursor.execute('''
+                INSERT INTO review_items (user_id, quiz_id, question_index, ease, interval_days,
+                                          repetitions, lapses, due_at, reviewed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, quiz_id, question_index) DO UPDATE SET
+                    ease = excluded.ease,
+                    interval_days = excluded.interval_days,
+                    repetitions = excluded.repetitions,
+                    lapses = excluded.lapses,
+                    due_at = excluded.due_at,
+                    reviewed_at = excluded.reviewed_at
+            ''', (user_id, quiz_id, question_index, state['ease'], state['interval_days'],
+                  state['repetitions'], state['lapses'], state['due_at'], state['reviewed_at']))
+            states[question_index] = state
+        return states
+    
+    def answer_review(self, user_id, quiz_id, question_index, correct):
+        """Record one answer from the review queue; returns the new review state"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            state = self.record_reviews(cursor, user_id, quiz_id, {question_index: correct}, time.time())[question_index]
+            conn.commit()
+        return state
+    
+    def get_due_reviews(self, user_id, limit=20, now=None):
+        """The user's questions due for review, most overdue first
+
+        A range scan of the (user_id, due_at) index, so the cost depends on
+        how many items are returned, not on how many the user has.
+        """
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT review_items.quiz_id, review_items.question_index, review_items.due_at,
+                       review_items.repetitions, quizzes.module_id, quizzes.title, quizzes.questions
+                FROM review_items
+                JOIN quizzes ON quizzes.id = review_items.quiz_id
+                WHERE review_items.user_id = ? AND review_items.due_at <= ?
+                ORDER BY review_items.due_at
+                LIMIT ?
+            ''', (user_id, now or time.time(), limit))
+            rows = cursor.fetchall()
+        
+        questions = {}
+        reviews = []
+        for row in rows:
+            if row['quiz_id'] not in questions:
+                questions[row['quiz_id']] = json.loads(row['questions'])
+            quiz_questions = questions[row['quiz_id']]
+            # The quiz may have lost questions since this one was answered
+            if row['question_index'] >= len(quiz_questions):
+                continue
+            question = quiz_questions[row['question_index']]
+            reviews.append({
+                'quiz_id': row['quiz_id'],
+                'quiz_title': row['title'],
+                'module_id': row['module_id'],
+                'question_index': row['question_index'],
+                'question': question['question'],
+                'options': question['options'],
+                'repetitions': row['repetitions'],
+                'due_at': row['due_at']
+            })
+        return reviews
     
     # Challenge methods
-    def add_challenge(self, title, description, difficulty, starter_code, test_cases, hints, points):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO challenges (title, description, difficulty, starter_code, test_cases, hints, points)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, description, difficulty, starter_code, json.dumps(test_cases), hints, points))
-        conn.commit()
-        challenge_id = cursor.lastrowid
-        conn.close()
+    def prepare_expected_values(self, test_cases):
+        return json.dumps([prepare_expected(test_case) for test_case in test_cases])
+    
+    def load_test_cases(self, challenge_dict):
+        # Attach each test case's precomputed expected form for the grader
+        test_cases = json.loads(challenge_dict['test_cases'])
+        expected_values = json.loads(challenge_dict.pop('expected_values', None) or 'null')
+        if expected_values:
+            for test_case, expected_value in zip(test_cases, expected_values):
+                test_case['expected_value'] = expected_value
+        challenge_dict['test_cases'] = test_cases
+        challenge_dict['performance'] = json.loads(challenge_dict.get('performance') or 'null')
+        return challenge_dict
+    
+    def add_challenge(self, title, description, difficulty, starter_code, test_cases, hints, points,
+                      performance=None):
+        if performance is not None:
+            validate_performance(performance)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO challenges (title, description, difficulty, starter_code, test_cases, expected_values, hints, points,
+                                        performance)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (title, description, difficulty, starter_code, json.dumps(test_cases),
+                  self.prepare_expected_values(test_cases), hints, points,
+                  None if performance is None else json.dumps(performance)))
+            challenge_id = cursor.fetchone()['id']
+            self.index_plain_text(cursor, 'challenge', challenge_id, description)
+            conn.commit()
         return challenge_id
     
     def get_all_challenges(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM challenges')
-        challenges = cursor.fetchall()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM challenges')
+            challenges = cursor.fetchall()
         result = []
         for challenge in challenges:
-            challenge_dict = dict(challenge)
-            challenge_dict['test_cases'] = json.loads(challenge_dict['test_cases'])
-            result.append(challenge_dict)
+            result.append(self.load_test_cases(dict(challenge)))
         return result
     
     def get_challenge(self, challenge_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM challenges WHERE id = ?', (challenge_id,))
-        challenge = cursor.fetchone()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM challenges WHERE id = ?', (challenge_id,))
+            challenge = cursor.fetchone()
         if challenge:
-            challenge_dict = dict(challenge)
-            challenge_dict['test_cases'] = json.loads(challenge_dict['test_cases'])
-            return challenge_dict
+            return self.load_test_cases(dict(challenge))
         return None
     
     def record_submission(self, user_id, challenge_id, code, status, passed_tests, total_tests):
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        signature = submission_signature(code, self.get_starter_code(challenge_id))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO challenge_submissions (user_id, challenge_id, code, status, passed_tests, total_tests)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (user_id, challenge_id, code, status, passed_tests, total_tests))
+            self.index_submission(cursor, cursor.fetchone()['id'], challenge_id, signature)
+            conn.commit()
+    
+    # Plagiarism methods
+    def get_starter_code(self, challenge_id):
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT starter_code FROM challenges WHERE id = ?', (challenge_id,))
+            row = cursor.fetchone()
+        return row['starter_code'] if row else None
+    
+    def index_submission(self, cursor, submission_id, challenge_id, signature):
+        """Store a submission's signature (from plagiarism.submission_signature)
+        and file it under its LSH buckets"""
         cursor.execute('''
-            INSERT INTO challenge_submissions (user_id, challenge_id, code, status, passed_tests, total_tests)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, challenge_id, code, status, passed_tests, total_tests))
-        conn.commit()
-        conn.close()
+            INSERT INTO submission_signatures (submission_id, signature) VALUES (?, ?)
+            ON CONFLICT (submission_id) DO NOTHING
+        ''', (submission_id, signature))
+        if signature:
+            cursor.executemany('''
+                INSERT INTO submission_buckets (challenge_id, band, bucket, submission_id) VALUES (?, ?, ?, ?)
+                ON CONFLICT DO NOTHING
+            ''', [(challenge_id, band, bucket, submission_id) for band, bucket in signature_buckets(signature)])
+    
+    def index_submissions(self, batch_size=1000):
+        """Sign the submissions that have no signature yet; returns how many
+        
+        For submissions stored before signatures existed. Signing happens
+        outside the write transaction, one batch at a time.
+        """
+        indexed = 0
+        last_id = 0
+        while True:
+            with self.get_read_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT s.id, s.challenge_id, s.code, c.starter_code
+                    FROM challenge_submissions s
+                    LEFT JOIN challenges c ON c.id = s.challenge_id
+                    WHERE s.id > ?
+                      AND NOT EXISTS (SELECT 1 FROM submission_signatures WHERE submission_id = s.id)
+                    ORDER BY s.id
+                    LIMIT ?
+                ''', (last_id, batch_size))
+                batch = cursor.fetchall()
+            if not batch:
+                return indexed
+            
+            signed = [(row['id'], row['challenge_id'], submission_signature(row['code'], row['starter_code']))
+                      for row in batch]
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for submission_id, challenge_id, signature in signed:
+                    self.index_submission(cursor, submission_id, challenge_id, signature)
+                conn.commit()
+            indexed += len(batch)
+            last_id = batch[-1]['id']
+    
+    def get_similar_submissions(self, submission_id, threshold=SIMILARITY_THRESHOLD, limit=20):
+        """Other learners' submissions to the same challenge that look like
+        copies of this one, most similar first, one per learner
+        
+        Only submissions sharing an LSH bucket with this one are compared, so
+        the cost doesn't grow with the number of submissions. Returns None
+        when the submission doesn't exist or isn't signed yet.
+        """
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.user_id, s.challenge_id, sig.signature
+                FROM challenge_submissions s
+                JOIN submission_signatures sig ON sig.submission_id = s.id
+                WHERE s.id = ?
+            ''', (submission_id,))
+            submission = cursor.fetchone()
+            if submission is None:
+                return None
+            signature = bytes(submission['signature'])
+        
+            candidates = set()
+            for band, bucket in signature_buckets(signature) if signature else []:
+                cursor.execute('''
+                    SELECT submission_id FROM submission_buckets
+                    WHERE challenge_id = ? AND band = ? AND bucket = ?
+                    ORDER BY submission_id DESC
+                    LIMIT ?
+                ''', (submission['challenge_id'], band, bucket, PLAGIARISM_BUCKET_LIMIT))
+                candidates.update(row['submission_id'] for row in cursor.fetchall())
+            candidates.discard(submission_id)
+        
+            best = {}
+            candidates = sorted(candidates)
+            for start in range(0, len(candidates), 500):
+                chunk = candidates[start:start + 500]
+                cursor.execute(f'''
+                    SELECT s.id, s.user_id, u.username, s.status, s.passed_tests, s.total_tests,
+                           s.submitted_at, sig.signature
+                    FROM challenge_submissions s
+                    JOIN submission_signatures sig ON sig.submission_id = s.id
+                    LEFT JOIN users u ON u.id = s.user_id
+                    WHERE s.id IN ({', '.join('?' * len(chunk))}) AND s.user_id != ?
+                ''', (*chunk, submission['user_id']))
+                for row in cursor.fetchall():
+                    similarity = estimate_similarity(signature, bytes(row['signature']))
+                    if similarity >= threshold and similarity > best.get(row['user_id'], (0,))[0]:
+                        best[row['user_id']] = (similarity, row)
+        
+        matches = sorted(best.values(), key=lambda match: (-match[0], -match[1]['id']))[:limit]
+        return [{
+            'submission_id': row['id'],
+            'user_id': row['user_id'],
+            'username': row['username'],
+            'status': row['status'],
+            'passed_tests': row['passed_tests'],
+            'total_tests': row['total_tests'],
+            'submitted_at': utc_epoch(row['submitted_at']),
+            'similarity': round(similarity, 3)
+        } for similarity, row in matches]
+    
+    # Export methods
+    def get_export_page(self, name, after_id=0, limit=1000, since=None, until=None, module_id=None):
+        """Rows of one of EXPORT_SOURCES with ids above after_id, in id order
+        
+        Keyset pagination: each page is one short read that seeks straight to
+        after_id, so an export of any size holds no transaction open between
+        pages and later pages cost no more than the first. since (inclusive)
+        and until (exclusive) are 'YYYY-MM-DD HH:MM:SS' UTC strings.
+        """
+        source = EXPORT_SOURCES[name]
+        conditions = [f"{source['key']} > ?"]
+        params = [after_id]
+        if since:
+            conditions.append(f"{source['timestamp']} >= ?")
+            params.append(since)
+        if until:
+            conditions.append(f"{source['timestamp']} < ?")
+            params.append(until)
+        if module_id is not None:
+            conditions.append(source['module'])
+            params.append(module_id)
+        columns = ', '.join(f'{sql} AS {column}' for column, sql in source['columns'])
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {columns} FROM {source['from']}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {source['key']}
+                LIMIT ?
+            ''', (*params, limit))
+            rows = [dict(row) for row in cursor.fetchall()]
+        return rows
     
     # Progress methods
     def mark_module_complete(self, user_id, module_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_progress (user_id, module_id, completed, completed_at)
-            VALUES (?, ?, 1, ?)
-        ''', (user_id, module_id, datetime.now()))
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO user_progress (user_id, module_id, completed, completed_at)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (user_id, module_id) DO UPDATE
+                SET completed = excluded.completed, completed_at = excluded.completed_at
+            ''', (user_id, module_id, datetime.now()))
+            self.record_user_event(cursor, user_id)
+            conn.commit()
     
     def get_user_progress(self, user_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM user_progress WHERE user_id = ?
-        ''', (user_id,))
-        progress = cursor.fetchall()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM user_progress WHERE user_id = ?
+            ''', (user_id,))
+            progress = cursor.fetchall()
         return [dict(p) for p in progress]
     
     def get_user_stats(self, user_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            stats = self.fetch_user_stats(cursor, user_id)
+        return stats
+    
+    def fetch_user_stats(self, cursor, user_id):
         # Completed modules
         cursor.execute('''
             SELECT COUNT(*) as completed_modules FROM user_progress 
@@ -332,8 +1238,6 @@ class Database:
         ''', (user_id,))
         challenge_stats = cursor.fetchone()
         
-        conn.close()
-        
         return {
             'completed_modules': completed_modules,
             'quiz_attempts': quiz_stats['quiz_count'] or 0,
@@ -342,14 +1246,223 @@ class Database:
             'passed_challenges': challenge_stats['passed_challenges'] or 0
         }
     
+    def get_dashboard(self, user_id):
+        """Everything the dashboard shows (user, stats, module progress), read on one connection"""
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
+            if not user:
+                return None
+            stats = self.fetch_user_stats(cursor, user_id)
+            cursor.execute('SELECT * FROM user_progress WHERE user_id = ?', (user_id,))
+            progress = cursor.fetchall()
+        return {
+            'user': dict(user),
+            'stats': stats,
+            'progress': [dict(p) for p in progress]
+        }
+    
     # Leaderboard methods
     def get_leaderboard(self, limit=10):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, username, full_name, points FROM users
-            ORDER BY points DESC LIMIT ?
-        ''', (limit,))
-        leaderboard = cursor.fetchall()
-        conn.close()
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, username, full_name, points FROM users
+                ORDER BY points DESC, id LIMIT ?
+            ''', (limit,))
+            leaderboard = cursor.fetchall()
         return [dict(user) for user in leaderboard]
+    
+    # Grading job queue methods
+    def enqueue_grading_job(self, user_id, challenge_id, code, mode='run-all', priority=0, max_attempts=3):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Self-clocked fair queueing: a job's tag is its user's previous tag (or
+            # the scheduler clock, if the user has been idle) plus its weighted
+            # cost, so users who have used little CPU lately are served first
+            cursor.execute('''
+                INSERT INTO user_grading_usage (user_id) VALUES (?)
+                ON CONFLICT (user_id) DO NOTHING
+            ''', (user_id,))
+            cursor.execute('''
+                UPDATE user_grading_usage
+                SET virtual_finish = (
+                    SELECT CASE WHEN virtual_time > user_grading_usage.virtual_finish
+                                THEN virtual_time ELSE user_grading_usage.virtual_finish END
+                    FROM grading_scheduler WHERE id = 1
+                ) + ? / weight
+                WHERE user_id = ?
+                RETURNING virtual_finish
+            ''', (DEFAULT_GRADING_COST_MS, user_id))
+            virtual_finish = cursor.fetchone()['virtual_finish'] - priority * PRIORITY_HEAD_START_MS
+        
+            cursor.execute('''
+                INSERT INTO grading_jobs (user_id, challenge_id, code, mode, priority, virtual_finish, max_attempts, available_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (user_id, challenge_id, code, mode, priority, virtual_finish, max_attempts, time.time()))
+            job_id = cursor.fetchone()['id']
+            conn.commit()
+        return job_id
+    
+    def claim_grading_job(self, worker_id, lease_seconds=60):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+        
+            # Jobs whose worker died after their last allowed attempt are given up on
+            cursor.execute('''
+                UPDATE grading_jobs
+                SET status = 'error', error = 'Grader worker stopped responding', finished_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts
+            ''', (now,))
+        
+            # Take the best queued job, or one whose lease has expired
+            cursor.execute(f'''
+                UPDATE grading_jobs
+                SET status = 'running', attempts = attempts + 1, worker_id = ?,
+                    locked_until = ?, test_results = '[]', started_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM grading_jobs
+                    WHERE (status = 'queued' AND available_at <= ?)
+                       OR (status = 'running' AND locked_until < ?)
+                    ORDER BY virtual_finish, id
+                    LIMIT 1
+                    {self.claim_lock_clause}
+                )
+                RETURNING *
+            ''', (worker_id, now + lease_seconds, now, now))
+            job = cursor.fetchone()
+            if job:
+                # The scheduler clock follows the tag of the job being served
+                cursor.execute('''
+                    UPDATE grading_scheduler SET virtual_time = ?
+                    WHERE id = 1 AND virtual_time < ?
+                ''', (job['virtual_finish'], job['virtual_finish']))
+            conn.commit()
+        return dict(job) if job else None
+    
+    def update_grading_job_progress(self, job_id, worker_id, test_results, lease_seconds=60):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE grading_jobs SET test_results = ?, locked_until = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            ''', (json.dumps(test_results), time.time() + lease_seconds, job_id, worker_id))
+            conn.commit()
+    
+    def complete_grading_job(self, job_id, worker_id, result, points, signature=None):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # The submission, the points and the job state change commit together so
+            # a retried job can never record the same submission twice
+            cursor.execute('''
+                UPDATE grading_jobs
+                SET status = 'completed', result = ?, test_results = ?, cpu_ms = ?, locked_until = NULL,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+                RETURNING user_id, challenge_id, code, mode
+            ''', (json.dumps(result), json.dumps(result['test_results']), result.get('cpu_ms'), job_id, worker_id))
+            job = cursor.fetchone()
+            if job is None:
+                # The lease expired and another worker owns the job now
+                conn.rollback()
+                return False
+            if result.get('cpu_ms') is not None:
+                # Replace the estimated cost with what the job actually used, for
+                # the user's clock and for the jobs they still have queued, whose
+                # tags were stacked on the estimate
+                cursor.execute('''
+                    UPDATE user_grading_usage
+                    SET virtual_finish = virtual_finish + (? - ?) / weight
+                    WHERE user_id = ?
+                    RETURNING weight
+                ''', (result['cpu_ms'], DEFAULT_GRADING_COST_MS, job['user_id']))
+                usage = cursor.fetchone()
+                if usage:
+                    cursor.execute('''
+                        UPDATE grading_jobs
+                        SET virtual_finish = virtual_finish + (? - ?) / ?
+                        WHERE user_id = ? AND status = 'queued'
+                    ''', (result['cpu_ms'], DEFAULT_GRADING_COST_MS, usage['weight'], job['user_id']))
+            if job['mode'] == FAIL_FAST:
+                # Practice runs aren't submissions: the result stays on the job
+                # (and its CPU counts towards the quota) but nothing is awarded
+                conn.commit()
+                return True
+            cursor.execute('''
+                INSERT INTO challenge_submissions (user_id, challenge_id, code, status, passed_tests, total_tests, cpu_ms, max_rss_kb)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (job['user_id'], job['challenge_id'], job['code'], result['status'], result['passed'], result['total'],
+                  result.get('cpu_ms'), result.get('max_rss_kb')))
+            submission_id = cursor.fetchone()['id']
+            if signature is not None:
+                # Signed by the grader before the transaction began; submissions
+                # completed without one are left to index_submissions
+                self.index_submission(cursor, submission_id, job['challenge_id'], signature)
+            if points:
+                cursor.execute('''
+                    UPDATE users SET points = points + ? WHERE id = ?
+                ''', (points, job['user_id']))
+            self.record_user_event(cursor, job['user_id'])
+            conn.commit()
+        return True
+    
+    def fail_grading_job(self, job_id, worker_id, error, retry_delay=5):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE grading_jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'error' END,
+                    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+                    available_at = ?, locked_until = NULL, error = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            ''', (time.time() + retry_delay, error, job_id, worker_id))
+            conn.commit()
+
+    def set_grading_weight(self, user_id, weight):
+        """Set a user's share of grader CPU relative to others (default 1), for
+        jobs they queue from now on; False if there is no such user"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM users WHERE id = ?', (user_id,))
+            if cursor.fetchone() is None:
+                return False
+            cursor.execute('''
+                INSERT INTO user_grading_usage (user_id, weight) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET weight = excluded.weight
+            ''', (user_id, weight))
+            conn.commit()
+        return True
+
+    def get_user_cpu_usage(self, user_id, window_seconds):
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            window_start = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+            # Every grading job counts, practice runs included; jobs that haven't
+            # finished (or failed without a measurement) at the estimated cost, so
+            # a burst of submissions can't get ahead of the quota
+            cursor.execute('''
+                SELECT COALESCE(SUM(COALESCE(cpu_ms, ?)), 0) AS cpu_ms, MIN(created_at) AS oldest_at
+                FROM grading_jobs
+                WHERE user_id = ? AND created_at >= ?
+            ''', (DEFAULT_GRADING_COST_MS, user_id, window_start.strftime('%Y-%m-%d %H:%M:%S')))
+            usage = dict(cursor.fetchone())
+        if usage['oldest_at'] is not None:
+            usage['oldest_at'] = utc_epoch(usage['oldest_at'])
+        return usage
+    
+    def get_grading_job(self, job_id):
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM grading_jobs WHERE id = ?', (job_id,))
+            job = cursor.fetchone()
+        if job:
+            job_dict = dict(job)
+            job_dict['test_results'] = json.loads(job_dict['test_results'] or '[]')
+            job_dict['result'] = json.loads(job_dict['result']) if job_dict['result'] else None
+            return job_dict
+        return None
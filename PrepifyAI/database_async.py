@@ -0,0 +1,41 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from database import last_write_at
+
+class AsyncDatabase:
+    """Awaitable view of a Database for the ASGI app
+
+    Every query method of the wrapped Database (SQLite or PostgreSQL) becomes
+    a coroutine that runs the blocking call on a small thread pool, so a slow
+    query never stalls the event loop. The call runs in a copy of the caller's
+    context and a write it records (last_write_at) is copied back, which keeps
+    read-your-writes routing working across the thread hop.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            context = contextvars.copy_context()
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(context.run, method, *args, **kwargs)
+            )
+            written = context.get(last_write_at)
+            if written != last_write_at.get():
+                last_write_at.set(written)
+            return result
+
+        return call
+
+    def close(self):
+        self.executor.shutdown(wait=False)
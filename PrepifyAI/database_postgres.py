@@ -0,0 +1,405 @@
+import os
+from functools import lru_cache
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+from database import Database, PooledConnection
+from search import SEARCH_KINDS, MATCH_START, MATCH_END, tsquery
+
+# The search index's text for each searchable table, as in database.py
+SEARCH_SOURCES = [
+    ('modules', 'module', '{row}.title', 'strip_html({row}.content)'),
+    ('quizzes', 'quiz', '{row}.title',
+     "(SELECT string_agg(question ->> 'question', ' ') FROM json_array_elements({row}.questions::json) question)"),
+    ('challenges', 'challenge', '{row}.title', 'strip_html({row}.description)'),
+]
+
+@lru_cache(maxsize=None)
+def to_pyformat(sql):
+    # The shared queries use SQLite's ? placeholders; psycopg wants %s
+    return sql.replace('%', '%%').replace('?', '%s')
+
+class PostgresCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        if params:
+            self.cursor.execute(to_pyformat(sql), params)
+        else:
+            self.cursor.execute(sql)
+        return self
+
+    def executemany(self, sql, params_seq):
+        self.cursor.executemany(to_pyformat(sql), params_seq)
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class PostgresConnection(PooledConnection):
+    """Pooled psycopg connection that accepts the shared ?-style queries"""
+
+    def cursor(self):
+        return PostgresCursor(self.conn.cursor())
+
+class PostgresDatabase(Database):
+    """PostgreSQL storage backend for multi-node deployments
+
+    Reuses every query method of Database. Connections come from psycopg_pool
+    pools (DATABASE_POOL_SIZE, default 10), and statements run often enough
+    are prepared server-side on each pooled connection. Reads go to
+    DATABASE_READ_URL (e.g. a streaming replica) when it is set; a session
+    that just wrote keeps reading from the primary for DATABASE_REPLICA_LAG
+    seconds (default 5) so it always sees its own writes.
+    """
+    IntegrityError = psycopg.IntegrityError
+    # Let concurrent grader workers skip past a job another worker is claiming
+    claim_lock_clause = 'FOR UPDATE SKIP LOCKED'
+
+    def __init__(self, url, init=True):
+        self.read_url = os.environ.get('DATABASE_READ_URL')
+        self.replica_lag_seconds = float(os.environ.get('DATABASE_REPLICA_LAG', 5)) if self.read_url else 0
+        super().__init__(url, init)
+
+    def open_pool(self, url):
+        return ConnectionPool(
+            url,
+            min_size=1,
+            max_size=int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+            kwargs={
+                'row_factory': dict_row,
+                'prepare_threshold': 1,
+                # CURRENT_TIMESTAMP columns hold UTC, as they do in SQLite
+                'options': '-c timezone=UTC'
+            },
+            open=True
+        )
+
+    def connection_pools(self):
+        # Pool worker threads don't survive a fork, so each process opens its own
+        if self.pools_pid != os.getpid():
+            writer = self.open_pool(self.db_name)
+            readers = self.open_pool(self.read_url) if self.read_url else writer
+            self.pools = (writer, readers)
+            self.pools_pid = os.getpid()
+        return self.pools
+
+    def get_connection(self):
+        writer, _ = self.connection_pools()
+        return PostgresConnection(writer.getconn(), writer.putconn, on_commit=self.mark_write)
+
+    def get_read_connection(self):
+        if self.replica_lag_seconds and self.wrote_recently():
+            return self.get_connection()
+        _, readers = self.connection_pools()
+        return PostgresConnection(readers.getconn(), readers.putconn)
+
+    def init_db(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Serialize schema setup between processes starting at the same time
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('prepify.init_db'))")
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    full_name TEXT,
+                    points INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS modules (
+                    id SERIAL PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    order_index INTEGER
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS quizzes (
+                    id SERIAL PRIMARY KEY,
+                    module_id INTEGER REFERENCES modules (id),
+                    title TEXT NOT NULL,
+                    questions TEXT NOT NULL,
+                    points INTEGER DEFAULT 10
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS challenges (
+                    id SERIAL PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    starter_code TEXT,
+                    test_cases TEXT NOT NULL,
+                    expected_values TEXT,
+                    hints TEXT,
+                    points INTEGER DEFAULT 20,
+                    performance TEXT
+                )
+            ''')
+            # Added after the table was first created
+            cursor.execute('ALTER TABLE challenges ADD COLUMN IF NOT EXISTS performance TEXT')
+
+            # completed stays an integer so the shared queries can compare it to 1
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_progress (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users (id),
+                    module_id INTEGER REFERENCES modules (id),
+                    completed INTEGER DEFAULT 0,
+                    completed_at TIMESTAMP,
+                    UNIQUE (user_id, module_id)
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS quiz_attempts (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users (id),
+                    quiz_id INTEGER REFERENCES quizzes (id),
+                    score INTEGER,
+                    total_questions INTEGER,
+                    attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS challenge_submissions (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users (id),
+                    challenge_id INTEGER REFERENCES challenges (id),
+                    code TEXT NOT NULL,
+                    status TEXT,
+                    passed_tests INTEGER,
+                    total_tests INTEGER,
+                    cpu_ms DOUBLE PRECISION,
+                    max_rss_kb INTEGER,
+                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS grading_jobs (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users (id),
+                    challenge_id INTEGER REFERENCES challenges (id),
+                    code TEXT NOT NULL,
+                    mode TEXT DEFAULT 'run-all',
+                    status TEXT DEFAULT 'queued',
+                    priority INTEGER DEFAULT 0,
+                    virtual_finish DOUBLE PRECISION DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER DEFAULT 3,
+                    available_at DOUBLE PRECISION NOT NULL,
+                    locked_until DOUBLE PRECISION,
+                    worker_id TEXT,
+                    test_results TEXT DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    cpu_ms DOUBLE PRECISION
+                )
+            ''')
+            cursor.execute('ALTER TABLE grading_jobs ADD COLUMN IF NOT EXISTS cpu_ms DOUBLE PRECISION')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_grading_usage (
+                    user_id INTEGER PRIMARY KEY REFERENCES users (id),
+                    weight DOUBLE PRECISION DEFAULT 1,
+                    virtual_finish DOUBLE PRECISION DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS grading_scheduler (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    virtual_time DOUBLE PRECISION NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO grading_scheduler (id, virtual_time) VALUES (1, 0)
+                ON CONFLICT (id) DO NOTHING
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_events (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER,
+                    created_at DOUBLE PRECISION NOT NULL
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS review_items (
+                    user_id INTEGER REFERENCES users (id),
+                    quiz_id INTEGER REFERENCES quizzes (id),
+                    question_index INTEGER,
+                    ease DOUBLE PRECISION NOT NULL,
+                    interval_days DOUBLE PRECISION NOT NULL,
+                    repetitions INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    due_at DOUBLE PRECISION NOT NULL,
+                    reviewed_at DOUBLE PRECISION NOT NULL,
+                    PRIMARY KEY (user_id, quiz_id, question_index)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_review_items_due
+                ON review_items (user_id, due_at)
+            ''')
+
+            self.create_recommendations_table(cursor, 'recommendations')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS submission_signatures (
+                    submission_id INTEGER PRIMARY KEY REFERENCES challenge_submissions (id),
+                    signature BYTEA NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS submission_buckets (
+                    challenge_id INTEGER,
+                    band INTEGER,
+                    bucket BIGINT,
+                    submission_id INTEGER,
+                    PRIMARY KEY (challenge_id, band, bucket, submission_id)
+                )
+            ''')
+
+            cursor.execute('DROP INDEX IF EXISTS idx_grading_jobs_fair_claim')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_grading_jobs_tag_claim
+                ON grading_jobs (status, virtual_finish, id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_challenge_submissions_user_time
+                ON challenge_submissions (user_id, submitted_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_grading_jobs_user_time
+                ON grading_jobs (user_id, created_at)
+            ''')
+
+            self.backfill_expected_values(cursor)
+            self.create_search_index(cursor)
+
+            conn.commit()
+
+    def create_recommendations_table(self, cursor, name):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                user_id INTEGER,
+                rank INTEGER,
+                item_type TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                score DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (user_id, rank)
+            )
+        ''')
+
+    def swap_recommendations(self, cursor):
+        super().swap_recommendations(cursor)
+        # The primary key index keeps its name; free it for the next staging table
+        cursor.execute('ALTER INDEX recommendations_next_pkey RENAME TO recommendations_pkey')
+
+    def create_search_index(self, cursor):
+        # The 'simple' configuration doesn't stem, matching the SQLite index
+        # (see search.query_words)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS search_index (
+                doc_id BIGINT PRIMARY KEY,
+                title TEXT NOT NULL,
+                body TEXT NOT NULL,
+                document TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector('simple', title), 'A') ||
+                    setweight(to_tsvector('simple', body), 'B')
+                ) STORED
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_index_document ON search_index USING GIN (document)')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION strip_html(html TEXT) RETURNS TEXT AS $$
+                SELECT replace(replace(replace(replace(replace(replace(
+                    btrim(regexp_replace(regexp_replace(coalesce(html, ''), '<[^>]*>', ' ', 'g'), '\\s+', ' ', 'g')),
+                    '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', chr(39)), '&nbsp;', ' '), '&amp;', '&')
+            $$ LANGUAGE SQL IMMUTABLE
+        ''')
+        index_empty = cursor.execute('SELECT NOT EXISTS (SELECT 1 FROM search_index) AS empty').fetchone()['empty']
+        for table, kind, title, body in SEARCH_SOURCES:
+            code = SEARCH_KINDS[kind]
+            cursor.execute(f'''
+                CREATE OR REPLACE FUNCTION {table}_search_sync() RETURNS TRIGGER AS $$
+                BEGIN
+                    IF TG_OP <> 'INSERT' THEN
+                        DELETE FROM search_index WHERE doc_id = OLD.id * 4 + {code};
+                    END IF;
+                    IF TG_OP <> 'DELETE' THEN
+                        INSERT INTO search_index (doc_id, title, body)
+                        VALUES (NEW.id * 4 + {code}, {title.format(row='NEW')}, coalesce({body.format(row='NEW')}, ''));
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            ''')
+            cursor.execute(f'DROP TRIGGER IF EXISTS {table}_search_sync ON {table}')
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_search_sync AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION {table}_search_sync()
+            ''')
+            # The triggers keep it current from here on
+            if index_empty:
+                cursor.execute(f'''
+                    INSERT INTO search_index (doc_id, title, body)
+                    SELECT id * 4 + {code}, {title.format(row=table)}, coalesce({body.format(row=table)}, '')
+                    FROM {table}
+                ''')
+
+    def rebuild_search_index(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # create_search_index only fills an empty index
+            cursor.execute('DELETE FROM search_index')
+            self.create_search_index(cursor)
+            conn.commit()
+
+    def index_plain_text(self, cursor, kind, row_id, html):
+        # strip_html() is a server-side function here, so the triggers index plain text
+        pass
+
+    def fetch_search_results(self, cursor, terms, kind, limit, offset):
+        kind_filter = f'AND search_index.doc_id % 4 = {SEARCH_KINDS[kind]}' if kind else ''
+        cursor.execute(f'''
+            SELECT search_index.doc_id, search_index.title,
+                   ts_headline('simple', search_index.body, query,
+                               'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords=24, MinWords=12') AS snippet,
+                   ts_rank(search_index.document, query) AS score,
+                   quizzes.module_id
+            FROM search_index
+            CROSS JOIN to_tsquery('simple', ?) AS query
+            LEFT JOIN quizzes ON search_index.doc_id % 4 = {SEARCH_KINDS['quiz']}
+                             AND quizzes.id = search_index.doc_id / 4
+            WHERE search_index.document @@ query {kind_filter}
+            ORDER BY score DESC, search_index.doc_id
+            LIMIT ? OFFSET ?
+        ''', (tsquery(terms), limit, offset))
+        return cursor.fetchall()
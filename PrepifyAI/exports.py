@@ -0,0 +1,141 @@
+"""Streaming CSV and JSON Lines exports of users, quiz attempts and submissions
+
+    python exports.py TABLE [--format csv|jsonl] [--since DATE] [--until DATE]
+                            [--module ID] [--output FILE]
+
+TABLE is one of EXPORT_SOURCES (users, quiz_attempts, challenge_submissions).
+Rows are read a page at a time with keyset pagination (Database.get_export_page)
+and encoded as they arrive, so memory use doesn't depend on the export's size
+and the database never serves one long-running read. The same chunks back the
+/api/instructor/exports/<table> endpoints.
+"""
+import argparse
+import csv
+import io
+import sys
+from datetime import datetime, timezone
+
+from database import EXPORT_SOURCES, get_database
+from serialization import dumps_json
+
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+EXPORT_PAGE_SIZE = 1000
+
+def export_time(value):
+    """A since/until filter as the 'YYYY-MM-DD HH:MM:SS' UTC text both
+    backends compare timestamps with; accepts an ISO date or date and time"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid date: {value} (use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)')
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def export_params(name, args):
+    """Validated export options from request.args or the CLI's arguments
+
+    Raises ValueError with a message for the client.
+    """
+    export_format = args.get('format') or 'csv'
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    module_id = args.get('module')
+    if module_id is not None and module_id != '':
+        if EXPORT_SOURCES[name]['module'] is None:
+            raise ValueError(f'{name} cannot be filtered by module')
+        try:
+            module_id = int(module_id)
+        except ValueError:
+            raise ValueError('module must be a module id')
+    else:
+        module_id = None
+    return {
+        'export_format': export_format,
+        'since': export_time(args['since']) if args.get('since') else None,
+        'until': export_time(args['until']) if args.get('until') else None,
+        'module_id': module_id
+    }
+
+def export_columns(name):
+    return [column for column, _ in EXPORT_SOURCES[name]['columns']]
+
+def export_value(value):
+    # Postgres returns datetimes where SQLite returns text; export both alike
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+def csv_bytes(records):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(records)
+    return buffer.getvalue().encode()
+
+def encode_header(name, export_format):
+    return csv_bytes([export_columns(name)]) if export_format == 'csv' else b''
+
+def encode_rows(name, rows, export_format):
+    columns = export_columns(name)
+    if export_format == 'jsonl':
+        return b''.join(dumps_json({column: export_value(row[column]) for column in columns}) + b'\n'
+                        for row in rows)
+    return csv_bytes([export_value(row[column]) for column in columns] for row in rows)
+
+def export_chunks(get_page, name, export_format='csv', page_size=EXPORT_PAGE_SIZE, **filters):
+    """The export as a stream of byte chunks, one per page
+
+    get_page is Database.get_export_page (or anything with its signature).
+    """
+    header = encode_header(name, export_format)
+    if header:
+        yield header
+    after_id = 0
+    while True:
+        rows = get_page(name, after_id, page_size, **filters)
+        if not rows:
+            return
+        yield encode_rows(name, rows, export_format)
+        after_id = rows[-1]['id']
+
+async def export_chunks_async(get_page, name, export_format='csv', page_size=EXPORT_PAGE_SIZE, **filters):
+    """export_chunks for the ASGI app, where get_page is a coroutine function"""
+    header = encode_header(name, export_format)
+    if header:
+        yield header
+    after_id = 0
+    while True:
+        rows = await get_page(name, after_id, page_size, **filters)
+        if not rows:
+            return
+        yield encode_rows(name, rows, export_format)
+        after_id = rows[-1]['id']
+
+def export_filename(name, export_format):
+    return f'{name}.{export_format}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a table as CSV or JSON Lines')
+    parser.add_argument('table', choices=list(EXPORT_SOURCES))
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--since', help='only rows from this date or time on (UTC)')
+    parser.add_argument('--until', help='only rows before this date or time (UTC)')
+    parser.add_argument('--module', help='only rows about this module id')
+    parser.add_argument('--output', '-o', help='file to write (default: standard output)')
+    args = parser.parse_args()
+
+    try:
+        params = export_params(args.table, vars(args))
+    except ValueError as e:
+        parser.error(str(e))
+
+    db = get_database()
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_chunks(db.get_export_page, args.table, **params):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == '__main__':
+    main()
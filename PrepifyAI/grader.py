@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+
+from database import get_database
+from plagiarism import submission_signature
+from sandbox import FAIL_FAST
+from zygote import execute_code_forked
+
+# How long a worker may hold a job without reporting progress before another
+# worker is allowed to take it over
+LEASE_SECONDS = 60
+# How often a pool checks for dead workers to replace
+SUPERVISE_INTERVAL = 1
+
+def grade_job(db, job, worker_id):
+    """Run one claimed grading job and store its outcome"""
+    challenge = db.get_challenge(job['challenge_id'])
+    if not challenge:
+        db.fail_grading_job(job['id'], worker_id, 'Challenge not found', retry_delay=0)
+        return
+
+    test_results = []
+
+    def report_progress(test_result):
+        test_results.append(test_result)
+        db.update_grading_job_progress(job['id'], worker_id, test_results, LEASE_SECONDS)
+
+    result = execute_code_forked(job['code'], challenge['test_cases'], on_result=report_progress, mode=job['mode'],
+                                 performance=challenge.get('performance'))
+
+    if job['mode'] == FAIL_FAST:
+        # A practice run: graded, but neither stored as a submission nor scored
+        db.complete_grading_job(job['id'], worker_id, result, 0)
+        return
+
+    # Award points if all tests passed
+    points = challenge['points'] if result['status'] == 'passed' else 0
+    # Signed here, in the worker, so the write transaction stays short
+    signature = submission_signature(job['code'], challenge.get('starter_code'))
+    db.complete_grading_job(job['id'], worker_id, result, points, signature)
+
+def run_worker(db_name, worker_id, poll_interval):
+    """Grader worker loop: claim queued jobs from the database until stopped
+
+    SIGTERM lets the job in hand finish before the worker exits, so stopping
+    or reloading the server doesn't leave jobs to wait out their lease.
+    """
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    # The server process set up the schema before starting the pool
+    db = get_database(db_name, init=False)
+    while not stopping:
+        try:
+            job = db.claim_grading_job(worker_id, LEASE_SECONDS)
+        except Exception:
+            # e.g. "database is locked"; try again on the next poll
+            traceback.print_exc()
+            job = None
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            grade_job(db, job, worker_id)
+        except Exception:
+            try:
+                db.fail_grading_job(job['id'], worker_id, traceback.format_exc(limit=3))
+            except Exception:
+                # The job's lease runs out and another worker retries it
+                traceback.print_exc()
+
+class GraderPool:
+    """Pool of grader processes consuming the grading_jobs table
+
+    Workers are separate processes because the sandbox relies on SIGALRM,
+    which only works in a main thread. Each worker acts as a zygote: it has the
+    sandbox imported and forks a fresh child per job. Jobs live in SQLite, so
+    anything queued or half-graded when the server stops is picked up again on
+    the next start. A supervisor thread in the owning process replaces workers
+    that die.
+    """
+
+    def __init__(self, db_name='prepify.db', workers=None, poll_interval=0.2):
+        self.db_name = db_name
+        self.workers = workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self.processes = []
+        self.owner_pid = None
+        self.spawned = 0
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            # Start once per server process; a forked copy of the pool must not
+            # reuse worker handles that belong to its parent
+            if self.owner_pid == os.getpid():
+                return
+            self.owner_pid = os.getpid()
+            self.processes = []
+            self.stopping = threading.Event()
+            for _ in range(self.workers):
+                self.processes.append(self._spawn_worker())
+        threading.Thread(target=self._supervise, args=(self.stopping,), name='grader-supervisor',
+                         daemon=True).start()
+
+    def inherit(self):
+        """Use the workers started by the process this one was forked from
+
+        serve.py starts one pool in its master process; the web workers it
+        forks share it instead of each starting their own.
+        """
+        # The parent's supervisor thread isn't copied by fork, but its lock
+        # may have been held at that moment
+        self.lock = threading.Lock()
+        self.owner_pid = os.getpid()
+        self.processes = []
+
+    def _spawn_worker(self):
+        # Worker ids stay unique across replacements
+        worker_id = f'{os.getpid()}-{self.spawned}'
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(self.db_name, worker_id, self.poll_interval),
+            name=f'grader-{self.spawned}',
+            daemon=True
+        )
+        self.spawned += 1
+        process.start()
+        return process
+
+    def _supervise(self, stopping):
+        # A worker can die outside its job loop (killed, out of memory); its
+        # jobs are retried once their lease runs out, but only live workers
+        # can retry them
+        while not stopping.wait(SUPERVISE_INTERVAL):
+            with self.lock:
+                if stopping.is_set() or self.owner_pid != os.getpid():
+                    return
+                for i, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        process.join()
+                        self.processes[i] = self._spawn_worker()
+
+    def terminate(self):
+        """Stop replacing workers and ask the current ones to exit"""
+        self.stopping.set()
+        with self.lock:
+            for process in self.processes:
+                process.terminate()
+
+    def stop(self):
+        self.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.owner_pid = None
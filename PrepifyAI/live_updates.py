@@ -0,0 +1,154 @@
+import os
+import queue
+import threading
+import time
+import traceback
+
+# Push channel for the leaderboard and each user's progress. Points and
+# progress change in every web worker and in the grader processes, so the
+# changes are logged to the user_events table; one publisher thread per server
+# process reads that log and fans the result out to its connected clients.
+# However many clients are connected, a change costs one leaderboard query,
+# one encoding of the delta and one dashboard query per affected user.
+
+# How often the publisher checks user_events while clients are connected
+POLL_INTERVAL = 0.5
+# Events are only needed until every publisher has seen them
+EVENT_RETENTION_SECONDS = 3600
+PRUNE_INTERVAL = 60
+# A client that falls this far behind is disconnected (and reconnects with a
+# fresh snapshot) rather than buffering without bound
+SUBSCRIPTION_BACKLOG = 100
+
+def leaderboard_delta(old, new):
+    """Positional changes turning leaderboard `old` into `new`, or None
+
+    Clients apply it by truncating their list to `size` and then writing each
+    changed entry at its `rank`.
+    """
+    changes = [
+        dict(entry, rank=rank)
+        for rank, entry in enumerate(new)
+        if rank >= len(old) or old[rank] != entry
+    ]
+    if not changes and len(old) == len(new):
+        return None
+    return {'size': len(new), 'changes': changes}
+
+class Subscription:
+    """One connected client's queue of encoded events"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(SUBSCRIPTION_BACKLOG)
+        self.overflowed = False
+        self.closed = False
+
+    def open(self):
+        return not self.overflowed and not self.closed
+
+    def close(self):
+        # Ends the stream; the empty message wakes a client waiting in get()
+        self.closed = True
+        self.deliver(None)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class LivePublisher:
+    """Watches user_events and pushes leaderboard deltas and progress updates
+
+    encode(event, payload) turns an event into the text sent to clients
+    (done once per change, not per client) and dashboard_view shapes what
+    Database.get_dashboard returns for the client.
+    """
+
+    def __init__(self, db, encode, dashboard_view, limit=10, poll_interval=POLL_INTERVAL):
+        self.db = db
+        self.encode = encode
+        self.dashboard_view = dashboard_view
+        self.limit = limit
+        self.poll_interval = poll_interval
+        self.subscriptions = set()
+        self.leaderboard = []
+        self.last_event_id = 0
+        self.pruned_at = 0
+        self.owner_pid = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+
+    def subscribe(self, subscription):
+        """Register a client; returns the leaderboard its deltas will apply to"""
+        with self.lock:
+            # Threads don't survive a fork, so each server process runs its own
+            if self.owner_pid != os.getpid():
+                self.owner_pid = os.getpid()
+                self.subscriptions = set()
+                threading.Thread(target=self.run, name='live-publisher', daemon=True).start()
+            if not self.subscriptions:
+                # Idle until now: start from the current state
+                self.last_event_id = self.db.get_latest_user_event_id()
+                self.leaderboard = self.db.get_leaderboard(self.limit)
+            self.subscriptions.add(subscription)
+            if self.closed:
+                subscription.close()
+            self.wakeup.notify()
+            return self.leaderboard
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def close(self):
+        """End every stream, and any opened from now on, so a stopping server
+        isn't held up by clients that would stay connected indefinitely"""
+        with self.lock:
+            self.closed = True
+            for subscription in self.subscriptions:
+                subscription.close()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.subscriptions:
+                    self.wakeup.wait()
+                try:
+                    self.publish_changes()
+                except Exception:
+                    traceback.print_exc()
+            time.sleep(self.poll_interval)
+
+    def publish_changes(self):
+        self.last_event_id, user_ids = self.db.get_user_events_since(self.last_event_id)
+        if user_ids:
+            leaderboard = self.db.get_leaderboard(self.limit)
+            delta = leaderboard_delta(self.leaderboard, leaderboard)
+            self.leaderboard = leaderboard
+            if delta:
+                message = self.encode('leaderboard-delta', delta)
+                for subscription in self.subscriptions:
+                    subscription.deliver(message)
+
+            subscribers = {}
+            for subscription in self.subscriptions:
+                subscribers.setdefault(subscription.user_id, []).append(subscription)
+            for user_id in user_ids & subscribers.keys():
+                dashboard = self.db.get_dashboard(user_id)
+                if dashboard:
+                    message = self.encode('progress', self.dashboard_view(dashboard))
+                    for subscription in subscribers[user_id]:
+                        subscription.deliver(message)
+
+        if time.time() - self.pruned_at > PRUNE_INTERVAL:
+            self.pruned_at = time.time()
+            self.db.prune_user_events(self.pruned_at - EVENT_RETENTION_SECONDS)
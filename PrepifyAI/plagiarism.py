@@ -0,0 +1,195 @@
+"""Near-duplicate detection over challenge submissions
+
+Each submission is reduced to a MinHash signature: its code is parsed and
+normalized (identifiers renamed in order of appearance, string literals,
+comments and docstrings dropped, layout fixed by ast.unparse), split into
+overlapping runs of tokens, and the minimum of each of SIGNATURE_SIZE hash
+functions over those runs is kept. The fraction of equal positions in two
+signatures estimates the Jaccard similarity of their token runs. Runs that
+also occur in the challenge's starter code are left out, so the shared
+skeleton doesn't make every pair look alike.
+
+For lookups the signature is cut into LSH_BANDS bands; submissions whose
+band values all agree in at least one band land in the same bucket. Finding
+the submissions similar to one means reading its buckets, not comparing it
+with every other submission of the challenge.
+
+    python plagiarism.py index                  # sign submissions made before indexing existed
+    python plagiarism.py similar SUBMISSION_ID  # list likely copies of a submission
+"""
+import argparse
+import ast
+import builtins
+import hashlib
+import random
+import re
+import struct
+import time
+import zlib
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 64
+# 16 bands of 4 values: a pair at 0.7 similarity shares a bucket 99% of the
+# time, one at 0.3 about 12% of the time
+LSH_BANDS = 16
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+SIMILARITY_THRESHOLD = 0.7
+
+# Universal hashing (a * x + b) mod p with a prime just above 2**32; every
+# intermediate fits in 64 bits, so numpy computes the exact same values
+HASH_PRIME = 4294967311
+coefficients = random.Random(20251013)
+HASH_A = [coefficients.randrange(1, 2 ** 32) for _ in range(SIGNATURE_SIZE)]
+HASH_B = [coefficients.randrange(0, 2 ** 32) for _ in range(SIGNATURE_SIZE)]
+SIGNATURE_FORMAT = f'<{SIGNATURE_SIZE}I'
+
+# numpy (the plagiarism extra) makes signing several times faster and gives
+# the same signatures. It's imported on first use, so the web server, which
+# only looks signatures up, doesn't load it.
+numpy = None
+numpy_checked = False
+
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+KEPT_NAMES = frozenset(dir(builtins))
+
+class Normalizer(ast.NodeTransformer):
+    """Renames identifiers to v0, v1... and blanks out string literals
+
+    Builtins and attribute names are kept: they are what the code does, not
+    what the author chose to call things.
+    """
+
+    def __init__(self):
+        self.names = {}
+
+    def rename(self, name):
+        if name in KEPT_NAMES:
+            return name
+        if name not in self.names:
+            self.names[name] = f'v{len(self.names)}'
+        return self.names[name]
+
+    def visit_Name(self, node):
+        node.id = self.rename(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.rename(node.arg)
+        node.annotation = None
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.rename(node.name)
+        node.returns = None
+        return self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Global(self, node):
+        node.names = [self.rename(name) for name in node.names]
+        return node
+
+    visit_Nonlocal = visit_Global
+
+    def visit_ClassDef(self, node):
+        node.name = self.rename(node.name)
+        return self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        # Docstrings and other bare string statements
+        if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            return None
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str):
+            node.value = ''
+        return node
+
+    def visit_JoinedStr(self, node):
+        return ast.Constant('')
+
+def normalized_tokens(code):
+    try:
+        code = ast.unparse(Normalizer().visit(ast.parse(code)))
+    except (SyntaxError, ValueError, RecursionError):
+        # Still worth comparing: copies often share the same mistakes
+        pass
+    return TOKEN_RE.findall(code)
+
+def shingles(code):
+    """Hashes of the code's overlapping runs of SHINGLE_SIZE tokens"""
+    tokens = normalized_tokens(code or '')
+    if len(tokens) < SHINGLE_SIZE:
+        return {zlib.crc32(' '.join(tokens).encode())} if tokens else set()
+    return {zlib.crc32(' '.join(tokens[i:i + SHINGLE_SIZE]).encode())
+            for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+def get_numpy():
+    global numpy, numpy_checked
+    if not numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            pass
+        numpy_checked = True
+    return numpy
+
+def minhash(hashes):
+    if get_numpy() is not None:
+        values = numpy.fromiter(hashes, dtype=numpy.uint64, count=len(hashes))
+        a = numpy.array(HASH_A, dtype=numpy.uint64)[:, numpy.newaxis]
+        b = numpy.array(HASH_B, dtype=numpy.uint64)[:, numpy.newaxis]
+        return [int(v) & 0xFFFFFFFF for v in ((a * values + b) % numpy.uint64(HASH_PRIME)).min(axis=1)]
+    return [min([(a * h + b) % HASH_PRIME for h in hashes]) & 0xFFFFFFFF for a, b in zip(HASH_A, HASH_B)]
+
+def submission_signature(code, starter_code=None):
+    """Packed MinHash signature of a submission, or b'' when nothing of it
+    differs from the starter code"""
+    hashes = shingles(code)
+    if starter_code:
+        hashes -= shingles(starter_code)
+    if not hashes:
+        return b''
+    return struct.pack(SIGNATURE_FORMAT, *minhash(list(hashes)))
+
+def signature_buckets(signature):
+    """(band, bucket) pairs under which a signature is indexed"""
+    buckets = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * LSH_ROWS * 4:(band + 1) * LSH_ROWS * 4]
+        # Signed 64-bit, the widest integer both backends store
+        buckets.append((band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)))
+    return buckets
+
+def estimate_similarity(signature, other):
+    values = struct.unpack(SIGNATURE_FORMAT, signature)
+    others = struct.unpack(SIGNATURE_FORMAT, other)
+    return sum(1 for x, y in zip(values, others) if x == y) / SIGNATURE_SIZE
+
+def main():
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description='Near-duplicate detection over challenge submissions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('index', help='sign submissions that have no signature yet')
+    similar = commands.add_parser('similar', help="list other learners' submissions similar to one")
+    similar.add_argument('submission_id', type=int)
+    similar.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD)
+    similar.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.command == 'index':
+        print(f'indexed {db.index_submissions()} submissions')
+        return
+    matches = db.get_similar_submissions(args.submission_id, args.threshold, args.limit)
+    if matches is None:
+        parser.exit(1, f'submission {args.submission_id} not found or not indexed\n')
+    for match in matches:
+        submitted = time.strftime('%Y-%m-%d %H:%M', time.gmtime(match['submitted_at']))
+        print(f"{match['similarity']:.2f}  submission {match['submission_id']}  {match['username']}  "
+              f"{match['status']}  {submitted} UTC")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# Request rate limits for the routes that are worth abusing: logins (password
+# guessing), registrations (spam accounts), the chatbot (OpenAI spend) and
+# challenge submissions (grader CPU). Each rule is a token bucket holding
+# `capacity` requests that refills completely over `seconds`, kept per client
+# IP or per logged-in user ('user' falls back to the IP for anonymous
+# requests). A request must find a token in every bucket of its route.
+#
+# A bucket is stored as a single number: the time at which it will be full
+# again. Taking a token pushes that time one refill interval
+# (seconds / capacity) later, and a request is turned away if the bucket would
+# then still be empty, i.e. if the full-at time would move more than `seconds`
+# past now. A request takes its tokens from all of its buckets or from none, so
+# one that's turned away by one rule doesn't use up the others. Buckets whose
+# full-at time has passed are full, so dropping them loses nothing; that's how
+# the store stays small.
+
+# Endpoint name -> (scope, capacity, seconds) rules
+RATE_LIMITS = {
+    # Generous enough for a classroom behind one NAT address
+    'login': [('ip', 20, 60)],
+    'register': [('ip', 20, 600)],
+    'chatbot': [('user', 10, 60), ('ip', 60, 60)],
+    'submit_challenge': [('user', 20, 60)],
+}
+RATE_LIMIT_SCOPES = ('ip', 'user')
+
+# How often full buckets are dropped from the store
+PRUNE_INTERVAL = 60
+
+def parse_rate_limits(text):
+    """RATE_LIMITS overrides from the environment variable of the same name
+
+        login=ip:5/60,chatbot=user:10/60+ip:60/60,register=off
+
+    Each endpoint gets '+'-separated scope:capacity/seconds rules or 'off'.
+    'off' on its own disables rate limiting. Raises ValueError.
+    """
+    text = text.strip()
+    if text == 'off':
+        return {endpoint: [] for endpoint in RATE_LIMITS}
+    limits = {}
+    for entry in filter(None, (entry.strip() for entry in text.split(','))):
+        endpoint, _, rules = entry.partition('=')
+        if not endpoint or not rules:
+            raise ValueError(f'Invalid rate limit: {entry} (use endpoint=scope:capacity/seconds)')
+        limits[endpoint.strip()] = [] if rules.strip() == 'off' else [parse_rule(rule) for rule in rules.split('+')]
+    return limits
+
+def parse_rule(rule):
+    scope, _, rate = rule.strip().partition(':')
+    capacity, _, seconds = rate.partition('/')
+    try:
+        capacity, seconds = int(capacity), float(seconds)
+    except ValueError:
+        raise ValueError(f'Invalid rate limit rule: {rule} (use scope:capacity/seconds)')
+    if scope not in RATE_LIMIT_SCOPES:
+        raise ValueError(f"Invalid rate limit rule: {rule} (scope is one of: {', '.join(RATE_LIMIT_SCOPES)})")
+    if capacity < 1 or seconds <= 0:
+        raise ValueError(f'Invalid rate limit rule: {rule} (capacity and seconds must be positive)')
+    return (scope, capacity, seconds)
+
+def client_address(remote_addr, forwarded_for, trusted_proxies=0):
+    """The client's IP: behind trusted_proxies reverse proxies it's the
+    address the outermost of them saw, read from X-Forwarded-For. Hops
+    further left are whatever the client chose to send."""
+    if trusted_proxies and forwarded_for:
+        hops = forwarded_for.split(',')
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies].strip()
+    return remote_addr
+
+class MemoryBucketStore:
+    """Buckets in a dict of key -> full-at time, private to this process"""
+
+    def __init__(self):
+        self.full_at = {}
+        self.lock = threading.Lock()
+        self.pruned_at = time.monotonic()
+
+    def take(self, buckets):
+        """Take a token from each of the (key, interval, seconds) buckets, or
+        from none of them; returns 0, or the seconds until all have one"""
+        now = time.monotonic()
+        with self.lock:
+            taken = {}
+            wait = 0
+            for key, interval, seconds in buckets:
+                taken[key] = max(self.full_at.get(key, now), now) + interval
+                wait = max(wait, taken[key] - now - seconds)
+            if wait > 0:
+                return wait
+            self.full_at.update(taken)
+            if now - self.pruned_at > PRUNE_INTERVAL:
+                self.prune(now)
+        return 0
+
+    def prune(self, now):
+        self.full_at = {key: full_at for key, full_at in self.full_at.items() if full_at > now}
+        self.pruned_at = now
+
+class SQLiteBucketStore:
+    """Buckets in an SQLite file, shared by every process that opens it
+
+    Wall-clock time, unlike MemoryBucketStore, since the file outlives
+    processes. The file holds nothing that matters after a crash, so it's
+    written without syncing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.pruned_at = time.time()
+        conn = self.connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                full_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def connection(self):
+        # One per thread (and per process: a connection must not cross a fork)
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('PRAGMA busy_timeout=1000')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def take(self, buckets):
+        now = time.time()
+        conn = self.connection()
+        keys = ['\x1f'.join(map(str, key)) for key, _, _ in buckets]
+        # One statement either way, so checking the buckets and taking the
+        # tokens is atomic without an explicit transaction: buckets are only
+        # written when every one of them has a token to give
+        if len(buckets) == 1:
+            (_, interval, seconds), = buckets
+            rows = conn.execute('''
+                INSERT INTO rate_buckets (key, full_at) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET full_at = max(full_at, ?) + ?
+                WHERE max(full_at, ?) + ? - ? <= ?
+                RETURNING full_at
+            ''', (keys[0], now + interval, now, interval, now, interval, now, seconds)).fetchall()
+        else:
+            rows = conn.execute(take_statement(len(buckets)), [now] + [
+                value for key, (_, interval, seconds) in zip(keys, buckets) for value in (key, interval, seconds)
+            ] + [now]).fetchall()
+        if now - self.pruned_at > PRUNE_INTERVAL:
+            self.pruned_at = now
+            conn.execute('DELETE FROM rate_buckets WHERE full_at <= ?', (now,))
+        if rows:
+            return 0
+        full_at = dict(conn.execute(f"SELECT key, full_at FROM rate_buckets WHERE key IN ({', '.join('?' * len(keys))})",
+                                    keys).fetchall())
+        return max(max(full_at.get(key, now), now) + interval - now - seconds
+                   for key, (_, interval, seconds) in zip(keys, buckets))
+
+@lru_cache(maxsize=None)
+def take_statement(count):
+    """SQLiteBucketStore's upsert for `count` buckets"""
+    return f'''
+        WITH taken (key, full_at, seconds) AS (
+            SELECT column1, max(coalesce((SELECT full_at FROM rate_buckets WHERE key = column1), 0), ?) + column2, column3
+            FROM (VALUES {', '.join(['(?, ?, ?)'] * count)})
+        )
+        INSERT INTO rate_buckets (key, full_at)
+        SELECT key, full_at FROM taken
+        WHERE (SELECT max(full_at - ? - seconds) FROM taken) <= 0
+        ON CONFLICT (key) DO UPDATE SET full_at = excluded.full_at
+        RETURNING full_at
+    '''
+
+class RateLimiter:
+    """Checks requests against the rules for their endpoint"""
+
+    def __init__(self, limits=RATE_LIMITS, store=None):
+        self.limits = limits
+        self.store = store if store is not None else MemoryBucketStore()
+
+    def applies_to(self, endpoint):
+        return bool(self.limits.get(endpoint))
+
+    def retry_after(self, endpoint, ip, user_id=None):
+        """Seconds until the request would be allowed (rounded up), or None
+        if it's allowed now. An allowed request uses up its tokens."""
+        rules = self.limits.get(endpoint)
+        if not rules:
+            return None
+        # Each rule has its own bucket, so a route can pair a burst limit with
+        # a longer one in the same scope. A 'user' bucket for an anonymous
+        # client is keyed by its IP but stays apart from the route's 'ip' bucket
+        wait = self.store.take([
+            ((endpoint, i, scope, user_id if scope == 'user' and user_id is not None else ip), seconds / capacity, seconds)
+            for i, (scope, capacity, seconds) in enumerate(rules)
+        ])
+        return max(1, math.ceil(wait)) if wait else None
+
+def rate_limiter_from_env():
+    """The limiter configured by RATE_LIMITS and RATE_LIMIT_DB"""
+    limits = dict(RATE_LIMITS)
+    limits.update(parse_rate_limits(os.environ.get('RATE_LIMITS', '')))
+    path = os.environ.get('RATE_LIMIT_DB')
+    return RateLimiter(limits, SQLiteBucketStore(path) if path else None)
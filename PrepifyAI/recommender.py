@@ -0,0 +1,117 @@
+"""Offline job: each learner's recommended next modules and challenges
+
+    python recommender.py [--every SECONDS] [--per-user N]
+
+Builds a sparse learner x item matrix from module progress, quiz attempts
+and challenge submissions (see Database.get_interactions), scores items by
+item-item cosine similarity ("learners who did what you did also did...")
+and stores each learner's top unfinished items in the recommendations
+table, where the app serves them with a primary key lookup. Runs once, or
+every SECONDS when --every is given (or run it from cron).
+
+Needs the recommendations extra (numpy, scipy). The app itself doesn't
+import this module.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from database import RECOMMENDATION_DEFAULT_USER, get_database
+
+RECOMMENDATIONS_PER_USER = 10
+# Added to every item's score in proportion to how many learners engaged
+# with it: breaks ties, and ranks items for learners with no history
+POPULARITY_WEIGHT = 1e-3
+# Smaller still: among otherwise equal items, earlier ones in the course first
+COURSE_ORDER_WEIGHT = 1e-6
+# Learners scored at a time; bounds the dense score block in memory
+USER_BLOCK = 10000
+
+def item_similarity(matrix):
+    """Dense item x item cosine similarity of a learner x item matrix's columns"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = matrix @ sparse.diags(1 / norms)
+    similarity = (normalized.T @ normalized).toarray()
+    # An item doesn't recommend itself
+    np.fill_diagonal(similarity, 0)
+    return similarity
+
+def top_items(scores, done, per_user):
+    """Column indexes of each row's best scores, best first, skipping done items"""
+    scores = np.where(done, -np.inf, scores)
+    count = min(per_user, scores.shape[1])
+    top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(scores, top, axis=1)
+
+def compute_recommendations(items, interactions, per_user=RECOMMENDATIONS_PER_USER):
+    """Yield (user_id, rank, item_type, item_id, score) rows
+
+    items lists the (item_type, item_id) pairs that can be recommended and
+    interactions holds Database.get_interactions() rows. Rows for
+    RECOMMENDATION_DEFAULT_USER rank items by popularity, then course order.
+    """
+    if not items:
+        return
+    item_index = {item: i for i, item in enumerate(items)}
+    interactions = [row for row in interactions if (row[1], row[2]) in item_index]
+
+    user_ids, user_rows = np.unique(np.array([row[0] for row in interactions], dtype=np.int64),
+                                    return_inverse=True)
+    columns = np.array([item_index[(row[1], row[2])] for row in interactions], dtype=np.int64)
+    shape = (len(user_ids), len(items))
+    # Repeated (learner, item) entries add up, e.g. a completed module and its quiz
+    matrix = sparse.csr_matrix((np.array([row[3] for row in interactions], dtype=np.float64),
+                                (user_rows, columns)), shape=shape)
+    done = sparse.csr_matrix((np.array([row[4] for row in interactions], dtype=np.float64),
+                              (user_rows, columns)), shape=shape)
+
+    similarity = item_similarity(matrix)
+    engaged = np.asarray((matrix > 0).sum(axis=0), dtype=np.float64).ravel()
+    baseline = (POPULARITY_WEIGHT * engaged / max(engaged.max(), 1)
+                + COURSE_ORDER_WEIGHT * (1 - np.arange(len(items)) / len(items)))
+
+    for start in range(0, len(user_ids), USER_BLOCK):
+        block = slice(start, start + USER_BLOCK)
+        scores = np.asarray(matrix[block] @ similarity) + baseline
+        top, top_scores = top_items(scores, done[block].toarray() > 0, per_user)
+        for user_id, user_top, user_scores in zip(user_ids[block].tolist(), top.tolist(), top_scores.tolist()):
+            rank = 0
+            for column, score in zip(user_top, user_scores):
+                if score == -np.inf:
+                    break
+                rank += 1
+                yield (user_id, rank, items[column][0], items[column][1], score)
+
+    top, top_scores = top_items(baseline[np.newaxis, :], np.zeros((1, len(items)), dtype=bool), per_user)
+    for rank, (column, score) in enumerate(zip(top[0].tolist(), top_scores[0].tolist()), 1):
+        yield (RECOMMENDATION_DEFAULT_USER, rank, items[column][0], items[column][1], score)
+
+def refresh(db, per_user=RECOMMENDATIONS_PER_USER):
+    started = time.perf_counter()
+    items = db.get_recommendable_items()
+    interactions = db.get_interactions()
+    db.replace_recommendations(compute_recommendations(items, interactions, per_user))
+    print(f'recommendations: {len(interactions)} interactions, {len(items)} items, '
+          f'{time.perf_counter() - started:.1f}s', flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute learner recommendations')
+    parser.add_argument('--every', type=float, help='keep running, refreshing every SECONDS')
+    parser.add_argument('--per-user', type=int, default=RECOMMENDATIONS_PER_USER,
+                        help='recommendations stored per learner')
+    args = parser.parse_args()
+
+    db = get_database()
+    while True:
+        refresh(db, args.per_user)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Spaced repetition for quiz questions, using the SM-2 algorithm (SuperMemo 2).
+# Each (user, quiz, question) pair keeps a small state: an ease factor, the
+# current interval, a streak of correct answers and when it is due next.
+# Every answer moves the state forward from its previous value, so scheduling
+# never needs the attempt history.
+
+DAY_SECONDS = 86400
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# Answer quality on SM-2's 0-5 scale. Quizzes only tell right from wrong:
+# right is a correct response after some hesitation, wrong an incorrect one
+# where the correct answer seemed easy to recall.
+CORRECT_QUALITY = 4
+INCORRECT_QUALITY = 1
+
+def new_review_state():
+    return {'ease': DEFAULT_EASE, 'interval_days': 0, 'repetitions': 0, 'lapses': 0}
+
+def schedule_review(state, correct, now):
+    """The review state after answering a question at time now (epoch seconds)
+
+    A correct answer is due again after 1 day, then 6 days, then each interval
+    times the ease factor. A wrong answer starts the streak over at 1 day and
+    makes the question's ease factor lower.
+    """
+    quality = CORRECT_QUALITY if correct else INCORRECT_QUALITY
+    repetitions = state['repetitions']
+    lapses = state['lapses']
+
+    if correct:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = state['interval_days'] * state['ease']
+        repetitions += 1
+    else:
+        interval_days = 1
+        repetitions = 0
+        lapses += 1
+
+    ease = state['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return {
+        'ease': max(MIN_EASE, ease),
+        'interval_days': interval_days,
+        'repetitions': repetitions,
+        'lapses': lapses,
+        'due_at': now + interval_days * DAY_SECONDS,
+        'reviewed_at': now
+    }
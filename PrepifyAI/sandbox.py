@@ -0,0 +1,302 @@
+import importlib
+import io
+import math
+import random
+import signal
+import sys
+import time
+from contextlib import redirect_stdout
+
+from comparators import compare_output
+from complexity import DEFAULT_STEP_BUDGET, DEFAULT_TIME_BUDGET_MS, performance_verdict
+
+# Grading modes: run every test case (final submissions), stop at the first
+# failing one (quick practice runs), or run every test case and then profile
+# the submission against the challenge's performance spec
+RUN_ALL = 'run-all'
+FAIL_FAST = 'fail-fast'
+PERFORMANCE = 'performance'
+GRADING_MODES = (RUN_ALL, FAIL_FAST, PERFORMANCE)
+
+SUBMISSION_FILENAME = '<submission>'
+# Timed runs per input size; the fastest counts
+TIMING_REPEATS = 3
+
+# Wall-clock limit for a single test case
+TEST_TIMEOUT_SECONDS = 5
+
+# Safe modules whitelist for imports
+SAFE_MODULES = {'math', 'random', 'itertools', 'collections', 'functools'}
+
+# Import the whitelist up front so every sandbox (and every process forked
+# from this one) finds the modules already loaded
+for module_name in SAFE_MODULES:
+    importlib.import_module(module_name)
+
+# Custom import function that only allows whitelisted modules
+def safe_import(name, *args, **kwargs):
+    if name not in SAFE_MODULES:
+        raise ImportError(f"Import of '{name}' is not allowed. Only {SAFE_MODULES} are permitted.")
+    return __import__(name, *args, **kwargs)
+
+# Restricted builtins - only allow safe functions
+# Note: This is a basic sandbox for educational use only
+# Block introspection methods that could access dangerous modules
+safe_builtins = {
+    'abs': abs,
+    'all': all,
+    'any': any,
+    'bool': bool,
+    'dict': dict,
+    'enumerate': enumerate,
+    'float': float,
+    'int': int,
+    'len': len,
+    'list': list,
+    'max': max,
+    'min': min,
+    'pow': pow,
+    'print': print,
+    'range': range,
+    'round': round,
+    'set': set,
+    'sorted': sorted,
+    'str': str,
+    'sum': sum,
+    'tuple': tuple,
+    'zip': zip,
+    '__import__': safe_import,  # Restricted import with whitelist
+    # Pre-import safe modules
+    'math': math,
+    'random': random,
+    # Explicitly exclude: object, type, vars, dir, getattr, setattr, delattr, hasattr
+    # to prevent introspection attacks
+}
+
+def iter_test_results(code, test_cases, mode=RUN_ALL, performance=None):
+    """Run test cases one by one in the sandbox, yielding each result as it completes
+
+    The submission is compiled once up front; a syntax error is reported as a
+    single result instead of once per test case. In PERFORMANCE mode a
+    submission that passes every test case is then profiled (see
+    performance_result), which adds one more result.
+    """
+    try:
+        compiled_code = compile(code, SUBMISSION_FILENAME, 'exec')
+    except (SyntaxError, ValueError) as e:
+        yield {
+            'input': 'Compilation',
+            'error': f'{type(e).__name__}: {e}',
+            'passed': False
+        }
+        return
+    
+    for test_case in test_cases:
+        try:
+            # Timeout handler
+            def timeout_handler(signum, frame):
+                raise TimeoutError("Code execution timeout (5 seconds)")
+            
+            # Set 5 second timeout
+            signal.signal(signal.SIGALRM, timeout_handler)
+            signal.alarm(TEST_TIMEOUT_SECONDS)
+            
+            # Create restricted execution environment with limited builtins
+            exec_globals = {
+                '__builtins__': safe_builtins,
+                '__name__': '__main__',
+                '__doc__': None
+            }
+            
+            # Execute user code with restrictions
+            exec(compiled_code, exec_globals)
+            
+            # Capture output
+            output_buffer = io.StringIO()
+            
+            with redirect_stdout(output_buffer):
+                # Execute test case
+                exec(test_case['input'], exec_globals)
+                output = output_buffer.getvalue().strip()
+            
+            # Cancel timeout
+            signal.alarm(0)
+            
+            # Check if output matches expected
+            expected = str(test_case['expected']).strip()
+            actual = output
+            
+            test_result = {
+                'input': test_case.get('description', 'Test case'),
+                'expected': expected,
+                'actual': actual,
+                'passed': compare_output(actual, test_case, test_case.get('expected_value'))
+            }
+        except TimeoutError as e:
+            signal.alarm(0)
+            test_result = {
+                'input': test_case.get('description', 'Test case'),
+                'error': 'Execution timeout (max 5 seconds)',
+                'passed': False
+            }
+        except Exception as e:
+            signal.alarm(0)
+            test_result = {
+                'input': test_case.get('description', 'Test case'),
+                'error': str(e),
+                'passed': False
+            }
+
+        yield test_result
+        if not test_result['passed'] and mode in (FAIL_FAST, PERFORMANCE):
+            return
+    
+    if mode == PERFORMANCE and performance:
+        yield performance_result(compiled_code, performance)
+
+# Not an Exception, so a submission's "except Exception" can't swallow it
+class BudgetExceeded(BaseException):
+    pass
+
+def raise_time_budget_exceeded(signum, frame):
+    raise BudgetExceeded('time')
+
+def prepared_globals(compiled_code, setup_code, size):
+    # A fresh module per run, so state a submission caches between calls
+    # can't speed up later runs
+    exec_globals = {
+        '__builtins__': safe_builtins,
+        '__name__': '__main__',
+        '__doc__': None
+    }
+    with redirect_stdout(io.StringIO()):
+        exec(compiled_code, exec_globals)
+        # The same input for every run at this size
+        random.seed(size)
+        exec_globals['n'] = size
+        exec(setup_code, exec_globals)
+    return exec_globals
+
+def timed_call(call_code, exec_globals, budget_ms):
+    """CPU milliseconds of one evaluation of the call, stopped by SIGPROF once
+    it runs over budget_ms"""
+    signal.signal(signal.SIGPROF, raise_time_budget_exceeded)
+    signal.setitimer(signal.ITIMER_PROF, budget_ms / 1000)
+    try:
+        with redirect_stdout(io.StringIO()):
+            # The thread's CPU clock: the process-wide one can advance only
+            # in scheduler ticks while a profiling timer is armed
+            started = time.thread_time()
+            eval(call_code, exec_globals)
+            elapsed = (time.thread_time() - started) * 1000
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+    if elapsed > budget_ms:
+        raise BudgetExceeded('time')
+    return elapsed
+
+def counted_call(call_code, exec_globals, step_budget):
+    """Lines of submitted code executed by one evaluation of the call"""
+    steps = 0
+    
+    def trace_lines(frame, event, arg):
+        nonlocal steps
+        if event == 'line':
+            steps += 1
+            if steps > step_budget:
+                raise BudgetExceeded('steps')
+        return trace_lines
+    
+    def trace_calls(frame, event, arg):
+        # Only the submission's own frames; library code isn't its steps
+        return trace_lines if frame.f_code.co_filename == SUBMISSION_FILENAME else None
+    
+    with redirect_stdout(io.StringIO()):
+        sys.settrace(trace_calls)
+        try:
+            eval(call_code, exec_globals)
+        finally:
+            sys.settrace(None)
+    # The exception raised by the trace function is a BaseException, but a
+    # bare "except:" in the submission can still swallow it
+    if steps > step_budget:
+        raise BudgetExceeded('steps')
+    return steps
+
+def performance_result(compiled_code, performance):
+    """Profile a submission across the performance spec's input sizes
+
+    At each size the call is timed (CPU time, best of TIMING_REPEATS) and
+    then run once more under a line-tracing hook to count steps, which unlike
+    time is exact and repeatable. A run over the time or step budget fails
+    the check on the spot; otherwise it passes unless the fitted growth is
+    beyond the spec's max_growth.
+    """
+    setup_code = compile(performance['setup'], '<performance setup>', 'exec')
+    call_code = compile(performance['call'], '<performance call>', 'eval')
+    time_budget_ms = performance.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)
+    step_budget = performance.get('step_budget', DEFAULT_STEP_BUDGET)
+    profile = []
+    size = None
+    
+    def timeout_handler(signum, frame):
+        raise TimeoutError()
+    
+    signal.signal(signal.SIGALRM, timeout_handler)
+    signal.alarm(TEST_TIMEOUT_SECONDS)
+    try:
+        for size in performance['sizes']:
+            ms = min(timed_call(call_code, prepared_globals(compiled_code, setup_code, size), time_budget_ms)
+                     for _ in range(TIMING_REPEATS))
+            steps = counted_call(call_code, prepared_globals(compiled_code, setup_code, size), step_budget)
+            profile.append({'n': size, 'ms': round(ms, 3), 'steps': steps})
+        signal.alarm(0)
+    except BudgetExceeded as e:
+        signal.alarm(0)
+        if e.args[0] == 'time':
+            error = f'Took longer than the {time_budget_ms} ms budget at n={size}'
+        else:
+            error = f'Ran more than the {step_budget} step budget at n={size}'
+    except TimeoutError:
+        error = f'Execution timeout (max {TEST_TIMEOUT_SECONDS} seconds) at n={size}'
+    except Exception as e:
+        signal.alarm(0)
+        error = f'{type(e).__name__} at n={size}: {e}'
+    else:
+        return performance_verdict(performance, profile)
+    return {'input': 'Performance', 'error': error, 'profile': profile, 'passed': False}
+
+def grading_total(test_cases, mode=RUN_ALL, performance=None):
+    """How many results a grading run reports when nothing stops it early"""
+    return len(test_cases) + (1 if mode == PERFORMANCE and performance else 0)
+
+def grade_results(test_results_iter, total, on_result=None, mode=RUN_ALL):
+    """Collect streamed test results into the grading result returned to clients"""
+    passed = 0
+    test_results = []
+    
+    for test_result in test_results_iter:
+        test_results.append(test_result)
+        if test_result['passed']:
+            passed += 1
+        if on_result:
+            on_result(test_result)
+    
+    status = 'passed' if passed == total else 'failed'
+    
+    return {
+        'status': status,
+        'passed': passed,
+        'total': total,
+        'mode': mode,
+        'test_results': test_results
+    }
+
+def execute_code(code, test_cases, on_result=None, mode=RUN_ALL, performance=None):
+    """Execute Python code with test cases in a restricted sandbox
+
+    If on_result is given it is called with each test result as soon as that
+    test case finishes, so callers can report progress before grading ends.
+    """
+    return grade_results(iter_test_results(code, test_cases, mode, performance),
+                         grading_total(test_cases, mode, performance), on_result, mode)
@@ -0,0 +1,82 @@
+import argparse
+import html
+import re
+
+# Full-text search over modules, quizzes and challenges. Each backend keeps a
+# search_index table in sync with the source tables through triggers; a
+# document's id there packs its type and source id together (source id * 4 +
+# type code), so the triggers can find and replace it with a key lookup.
+
+SEARCH_KINDS = {'module': 1, 'quiz': 2, 'challenge': 3}
+KIND_NAMES = {code: kind for kind, code in SEARCH_KINDS.items()}
+
+# Markers the backends put around matched terms in snippets; they can't occur
+# in stripped text, so highlight() can HTML-escape the snippet first
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+MAX_QUERY_TERMS = 8
+
+TAG_RE = re.compile(r'<[^>]*>')
+TERM_RE = re.compile(r'\w+')
+
+def strip_html(text):
+    """Plain text of an HTML fragment, for indexing"""
+    if not text:
+        return ''
+    return ' '.join(html.unescape(TAG_RE.sub(' ', text)).split())
+
+def search_terms(query):
+    # Only word characters reach the backend's query syntax
+    return TERM_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+
+def query_words(terms):
+    """(word, is_prefix) pairs that all have to match
+
+    The last term is matched as a prefix so results follow typing, and a
+    plural is matched through its singular ("networks" finds "network").
+    Indexes aren't stemmed: a stem can't be prefix-matched by a half-typed
+    word ("learni" is not a prefix of "learn").
+    """
+    words = []
+    for i, term in enumerate(terms):
+        if i == len(terms) - 1:
+            words.append((term, True))
+        elif len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+            words.append((term[:-1], True))
+        else:
+            words.append((term, False))
+    return words
+
+def fts5_query(terms):
+    return ' '.join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in query_words(terms))
+
+def tsquery(terms):
+    return ' & '.join(f'{word}:*' if prefix else word for word, prefix in query_words(terms))
+
+def highlight(snippet):
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+def search_result(doc_id, title, snippet, score):
+    return {
+        'type': KIND_NAMES[doc_id % 4],
+        'id': doc_id // 4,
+        'title': title,
+        'snippet': highlight(snippet),
+        # None when the query was too broad to rank (see Database.search)
+        'score': round(score, 4) if score is not None else None
+    }
+
+def main():
+    from database import get_database
+
+    parser = argparse.ArgumentParser(description='Full-text search over modules, quizzes and challenges')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='reindex every module, quiz and challenge from the database')
+    parser.parse_args()
+
+    get_database().rebuild_search_index()
+    print('search index rebuilt')
+
+if __name__ == '__main__':
+    main()
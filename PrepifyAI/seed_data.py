@@ -1,7 +1,7 @@
-from database import Database
+from database import get_database
 
 def seed_database():
-    db = Database()
+    db = get_database()
     
     # Add learning modules
     modules_data = [
@@ -307,7 +307,15 @@ print(calculate_mean([1, 2, 3, 4, 5]))''',
                 }
             ],
             'hints': 'Sum all numbers and divide by the count of numbers.',
-            'points': 20
+            'points': 20,
+            'performance': {
+                'setup': 'numbers = [random.random() for _ in range(n)]',
+                'call': 'calculate_mean(numbers)',
+                'sizes': [10000, 20000, 40000, 80000],
+                'max_growth': 'linear',
+                'time_budget_ms': 50,
+                'step_budget': 400000
+            }
         },
         {
             'title': 'Euclidean Distance',
@@ -350,16 +358,26 @@ print(normalize([1, 2, 3, 4, 5]))''',
                 {
                     'description': 'Test 1: [1, 2, 3, 4, 5]',
                     'input': 'print(normalize([1, 2, 3, 4, 5]))',
-                    'expected': '[0.0, 0.25, 0.5, 0.75, 1.0]'
+                    'expected': '[0.0, 0.25, 0.5, 0.75, 1.0]',
+                    'compare': 'literal'
                 },
                 {
                     'description': 'Test 2: [10, 20, 30, 40]',
                     'input': 'print(normalize([10, 20, 30, 40]))',
-                    'expected': '[0.0, 0.3333333333333333, 0.6666666666666666, 1.0]'
+                    'expected': '[0.0, 0.3333333333333333, 0.6666666666666666, 1.0]',
+                    'compare': 'literal'
                 }
             ],
             'hints': 'Find min and max values, then apply formula (x - min) / (max - min) to each element.',
-            'points': 30
+            'points': 30,
+            'performance': {
+                'setup': 'data = [random.random() for _ in range(n)]',
+                'call': 'normalize(data)',
+                'sizes': [2000, 4000, 8000, 16000],
+                'max_growth': 'linear',
+                'time_budget_ms': 50,
+                'step_budget': 200000
+            }
         },
         {
             'title': 'Train-Test Split',
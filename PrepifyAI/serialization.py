@@ -0,0 +1,80 @@
+import decimal
+import json
+import uuid
+from datetime import date
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+# Optional speedups (the fast-encoding extra). Without them responses are
+# plain JSON from the standard library, exactly as before.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+def encode_default(o):
+    # Same conversions as Flask's default JSON provider
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not serializable')
+
+if orjson is not None:
+    # Dates go through encode_default so they look the same with either encoder
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps_json(obj):
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS)
+else:
+    def dumps_json(obj):
+        return json.dumps(obj, default=encode_default, separators=(',', ':')).encode()
+
+def dumps_msgpack(obj):
+    return msgpack.packb(obj, default=encode_default, use_bin_type=True)
+
+class CompactJSONProvider(DefaultJSONProvider):
+    """jsonify() with content negotiation
+
+    Responds with MessagePack when the client prefers it in its Accept header
+    (and msgpack is installed), otherwise with JSON encoded by orjson when
+    available. Debug mode keeps Flask's indented JSON.
+    """
+
+    def accept_mimetypes(self):
+        return request.accept_mimetypes
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_json(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if msgpack is None:
+            return self.json_response(args, kwargs)
+
+        accept = self.accept_mimetypes()
+        if accept.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE:
+            obj = self._prepare_response_obj(args, kwargs)
+            response = self._app.response_class(dumps_msgpack(obj), mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = self.json_response(args, kwargs)
+        # The body depends on Accept, so caches must key on it
+        response.vary.add('Accept')
+        return response
+
+    def json_response(self, args, kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_json(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,215 @@
+"""Production launcher: a preforking master in front of the Flask app
+
+    python serve.py [--bind 0.0.0.0:5000] [--workers N] [--graceful-timeout 30]
+
+The master imports app.py once (which runs the schema setup and migrations),
+starts the grader pool, then forks the web workers. Workers are copies of the
+warm master, so imports, compiled code and caches are shared copy-on-write
+instead of being rebuilt N times; gc.freeze() keeps the garbage collector from
+touching (and so copying) those pages later.
+
+Signals to the master:
+- SIGHUP: graceful reload. The master checks that the current code imports,
+  then re-executes itself in place (same pid, same listening socket), preloads
+  the new code, starts new workers and only then retires the old ones, so the
+  socket never stops accepting connections.
+- SIGTERM / SIGINT: graceful shutdown. Workers stop accepting and finish the
+  requests in hand; anything still running after --graceful-timeout is killed.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+# Resolved at startup, so a reload finds the code wherever the master was
+# launched from
+SCRIPT = os.path.abspath(__file__)
+APP_DIR = os.path.dirname(SCRIPT)
+
+# Carried across the re-exec on reload
+LISTEN_FD_ENV = 'PREPIFY_LISTEN_FD'
+RETIRING_PIDS_ENV = 'PREPIFY_RETIRING_PIDS'
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run Prepify with preforked workers')
+    parser.add_argument('--bind', default=f"0.0.0.0:{os.environ.get('PORT', 5000)}",
+                        help='host:port to listen on (default 0.0.0.0:$PORT or 5000)')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1,
+                        help='web worker processes (default $WEB_CONCURRENCY or one per CPU)')
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help='seconds a stopping worker may spend finishing its requests')
+    return parser.parse_args()
+
+def open_listener(bind):
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        # Reloaded: keep accepting on the socket the previous image opened
+        listener = socket.socket(fileno=int(fd))
+    else:
+        host, _, port = bind.rpartition(':')
+        listener = socket.create_server((host or '0.0.0.0', int(port)), backlog=2048)
+    listener.set_inheritable(True)
+    return listener
+
+def run_worker(listener, app_module):
+    """Serve requests from the shared listening socket until told to stop"""
+    app_module.grader_pool.inherit()
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app_module.app, threaded=True, fd=listener.fileno())
+    # Let in-flight requests finish when the server closes
+    server.daemon_threads = False
+
+    def shutdown():
+        # Open event streams end first; the server waits for every request
+        app_module.close_streams()
+        server.shutdown()
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, so it can't run in this thread
+        threading.Thread(target=shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server.serve_forever()
+    server.server_close()
+
+class Master:
+    def __init__(self, listener, app_module, workers, graceful_timeout):
+        self.listener = listener
+        self.app_module = app_module
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers = set()
+        # pid -> time after which a stopping process is killed
+        self.retiring = {}
+        self.signals = []
+
+    def log(self, message):
+        print(f'[serve {os.getpid()}] {message}', file=sys.stderr, flush=True)
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                run_worker(self.listener, self.app_module)
+                exit_code = 0
+            finally:
+                # Skip the master's atexit handlers (multiprocessing's would
+                # terminate the grader pool, which belongs to the master)
+                os._exit(exit_code)
+        self.workers.add(pid)
+
+    def retire(self, pids):
+        deadline = time.time() + self.graceful_timeout
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                continue
+            self.workers.discard(pid)
+            self.retiring[pid] = deadline
+
+    def reap(self):
+        # Only wait on our own pids; the grader pool reaps its processes itself
+        for pid in list(self.workers) + list(self.retiring):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                if pid in self.workers:
+                    self.log(f'worker {pid} exited, replacing it')
+                self.workers.discard(pid)
+                self.retiring.pop(pid, None)
+
+    def kill_overdue(self):
+        now = time.time()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def reload(self):
+        # Refuse to replace working code with code that doesn't import
+        check = subprocess.run([sys.executable, '-c', 'import app'], cwd=APP_DIR, capture_output=True, text=True)
+        if check.returncode != 0:
+            self.log('reload aborted, app failed to import:\n' + check.stderr)
+            return
+        self.log('reloading')
+        retiring = list(self.workers) + list(self.retiring)
+        retiring += [process.pid for process in self.app_module.grader_pool.processes]
+        os.environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        os.environ[RETIRING_PIDS_ENV] = ','.join(str(pid) for pid in retiring)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, [sys.executable, SCRIPT] + sys.argv[1:])
+
+    def shutdown(self):
+        self.log('shutting down')
+        self.retire(list(self.workers))
+        grader_pool = self.app_module.grader_pool
+        grader_pool.terminate()
+        deadline = time.time() + self.graceful_timeout
+        while self.retiring and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.kill_overdue()
+        for process in grader_pool.processes:
+            process.join(max(0, deadline - time.time()))
+            if process.is_alive():
+                process.kill()
+
+    def run(self, retiring=()):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        for _ in range(self.worker_count):
+            self.spawn_worker()
+        # Processes left over from before a reload are reaped like workers
+        self.retire(retiring)
+        host, port = self.listener.getsockname()[:2]
+        self.log(f'listening on {host}:{port} with {self.worker_count} workers')
+
+        while True:
+            if self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reload()
+                else:
+                    self.shutdown()
+                    return
+            self.reap()
+            self.kill_overdue()
+            while len(self.workers) < self.worker_count:
+                self.spawn_worker()
+            time.sleep(0.2)
+
+def main():
+    args = parse_args()
+    listener = open_listener(args.bind)
+    retiring = [int(pid) for pid in os.environ.pop(RETIRING_PIDS_ENV, '').split(',') if pid]
+
+    # Preload: schema setup, imports and the OpenAI client happen once, here
+    import app as app_module
+    # app.py defers importing openai to the first chatbot call; do it here so
+    # the workers share one copy
+    import openai
+    gc.freeze()
+    app_module.grader_pool.start()
+
+    Master(listener, app_module, args.workers, args.graceful_timeout).run(retiring)
+
+if __name__ == '__main__':
+    main()
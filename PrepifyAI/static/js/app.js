@@ -4,12 +4,30 @@ let currentModule = null;
 let currentQuiz = null;
 let currentChallenge = null;
 
+// API responses come as MessagePack when msgpack.js is loaded (smaller and
+// faster to parse), JSON otherwise; readBody handles either
+const API_ACCEPT = typeof decodeMsgpack === 'function'
+    ? 'application/msgpack, application/json;q=0.9'
+    : 'application/json';
+
+function apiFetch(url, options = {}) {
+    return fetch(url, {...options, headers: {Accept: API_ACCEPT, ...options.headers}});
+}
+
+async function readBody(response) {
+    const contentType = response.headers.get('Content-Type') || '';
+    if (contentType.startsWith('application/msgpack')) {
+        return decodeMsgpack(await response.arrayBuffer());
+    }
+    return response.json();
+}
+
 // Check if user is authenticated
 async function checkAuth() {
     try {
-        const response = await fetch('/api/user');
+        const response = await apiFetch('/api/user');
         if (response.ok) {
-            currentUser = await response.json();
+            currentUser = await readBody(response);
             showAuthenticatedUI();
             return true;
         }
@@ -27,6 +45,7 @@ function showAuthenticatedUI() {
     document.getElementById('landing-page').classList.add('hidden');
     showPage('dashboard');
     loadDashboard();
+    startLiveUpdates();
 }
 
 function showUnauthenticatedUI() {
@@ -36,7 +55,7 @@ function showUnauthenticatedUI() {
 }
 
 function showPage(page) {
-    const pages = ['landing-page', 'learn-page', 'code-page', 'chatbot-page', 'dashboard-page', 'leaderboard-page'];
+    const pages = ['landing-page', 'learn-page', 'code-page', 'search-page', 'chatbot-page', 'dashboard-page', 'leaderboard-page'];
     pages.forEach(p => {
         document.getElementById(p).classList.add('hidden');
     });
@@ -45,6 +64,7 @@ function showPage(page) {
         'home': 'landing-page',
         'learn': 'learn-page',
         'code': 'code-page',
+        'search': 'search-page',
         'chatbot': 'chatbot-page',
         'dashboard': 'dashboard-page',
         'leaderboard': 'leaderboard-page'
@@ -57,6 +77,8 @@ function showPage(page) {
     if (page === 'learn') loadModules();
     if (page === 'code') loadChallenges();
     if (page === 'dashboard') loadDashboard();
+    if (page === 'dashboard') loadReviews();
+    if (page === 'dashboard') loadRecommendations();
     if (page === 'leaderboard') loadLeaderboard();
 }
 
@@ -83,13 +105,13 @@ async function login() {
     const password = document.getElementById('login-password').value;
     
     try {
-        const response = await fetch('/api/login', {
+        const response = await apiFetch('/api/login', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({username, password})
         });
         
-        const data = await response.json();
+        const data = await readBody(response);
         if (data.success) {
             currentUser = data.user;
             closeAuthModal();
@@ -109,13 +131,13 @@ async function register() {
     const password = document.getElementById('register-password').value;
     
     try {
-        const response = await fetch('/api/register', {
+        const response = await apiFetch('/api/register', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({username, email, full_name, password})
         });
         
-        const data = await response.json();
+        const data = await readBody(response);
         if (data.success) {
             alert('Registration successful! Please login.');
             showAuthModal('login');
@@ -128,16 +150,53 @@ async function register() {
 }
 
 async function logout() {
-    await fetch('/api/logout', {method: 'POST'});
+    await apiFetch('/api/logout', {method: 'POST'});
     currentUser = null;
+    stopLiveUpdates();
     showUnauthenticatedUI();
 }
 
+// Live updates: the server pushes leaderboard changes and this user's
+// progress over one event stream, so the dashboard and leaderboard stay
+// current without polling. EventSource reconnects (and gets a fresh
+// snapshot) by itself if the stream drops.
+let liveEvents = null;
+let leaderboardEntries = null;
+
+function startLiveUpdates() {
+    if (!window.EventSource || liveEvents) return;
+    
+    liveEvents = new EventSource('/api/events');
+    liveEvents.addEventListener('leaderboard', (e) => {
+        leaderboardEntries = JSON.parse(e.data);
+        renderLeaderboard(leaderboardEntries);
+    });
+    liveEvents.addEventListener('leaderboard-delta', (e) => {
+        const delta = JSON.parse(e.data);
+        leaderboardEntries.length = delta.size;
+        delta.changes.forEach(entry => {
+            leaderboardEntries[entry.rank] = entry;
+        });
+        renderLeaderboard(leaderboardEntries);
+    });
+    liveEvents.addEventListener('progress', (e) => {
+        renderDashboard(JSON.parse(e.data));
+    });
+}
+
+function stopLiveUpdates() {
+    if (liveEvents) {
+        liveEvents.close();
+        liveEvents = null;
+    }
+    leaderboardEntries = null;
+}
+
 // Learning Modules
 async function loadModules() {
     try {
-        const response = await fetch('/api/modules');
-        const modules = await response.json();
+        const response = await apiFetch('/api/modules');
+        const modules = await readBody(response);
         
         const container = document.getElementById('modules-container');
         container.innerHTML = modules.map(module => `
@@ -159,8 +218,9 @@ async function loadModules() {
 
 async function openModule(moduleId) {
     try {
-        const response = await fetch(`/api/modules/${moduleId}`);
-        currentModule = await response.json();
+        // The quiz comes along so "Take Quiz" doesn't need another request
+        const response = await apiFetch(`/api/modules/${moduleId}?include=quiz`);
+        currentModule = await readBody(response);
         
         document.getElementById('module-title').textContent = currentModule.title;
         document.getElementById('module-content').innerHTML = currentModule.content;
@@ -178,7 +238,7 @@ async function completeModule() {
     if (!currentModule) return;
     
     try {
-        await fetch(`/api/modules/${currentModule.id}/complete`, {method: 'POST'});
+        await apiFetch(`/api/modules/${currentModule.id}/complete`, {method: 'POST'});
         alert('Module completed! +5 points');
         closeModuleModal();
         loadDashboard();
@@ -191,8 +251,12 @@ async function startQuiz() {
     if (!currentModule) return;
     
     try {
-        const response = await fetch(`/api/quiz/${currentModule.id}`);
-        currentQuiz = await response.json();
+        if (currentModule.quiz) {
+            currentQuiz = currentModule.quiz;
+        } else {
+            const response = await apiFetch(`/api/quiz/${currentModule.id}`);
+            currentQuiz = await readBody(response);
+        }
         
         document.getElementById('quiz-title').textContent = currentQuiz.title;
         
@@ -228,7 +292,7 @@ async function submitQuiz() {
     });
     
     try {
-        const response = await fetch('/api/quiz/submit', {
+        const response = await apiFetch('/api/quiz/submit', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -237,7 +301,7 @@ async function submitQuiz() {
             })
         });
         
-        const result = await response.json();
+        const result = await readBody(response);
         
         const resultsHTML = `
             <div class="text-center mb-6">
@@ -276,8 +340,8 @@ function closeQuizResult() {
 // Coding Challenges
 async function loadChallenges() {
     try {
-        const response = await fetch('/api/challenges');
-        const challenges = await response.json();
+        const response = await apiFetch('/api/challenges');
+        const challenges = await readBody(response);
         
         const container = document.getElementById('challenges-list');
         container.innerHTML = challenges.map(challenge => `
@@ -306,8 +370,8 @@ async function loadChallenges() {
 
 async function openChallenge(challengeId) {
     try {
-        const response = await fetch(`/api/challenges/${challengeId}`);
-        currentChallenge = await response.json();
+        const response = await apiFetch(`/api/challenges/${challengeId}`);
+        currentChallenge = await readBody(response);
         
         document.getElementById('challenge-title').textContent = currentChallenge.title;
         document.getElementById('challenge-difficulty').textContent = currentChallenge.difficulty;
@@ -320,6 +384,10 @@ async function openChallenge(challengeId) {
         document.getElementById('challenge-hints').innerHTML = `<strong>💡 Hints:</strong> ${currentChallenge.hints}`;
         document.getElementById('code-editor').value = currentChallenge.starter_code || '';
         document.getElementById('code-result').innerHTML = '';
+        // Only challenges with a performance check offer one
+        const performanceButton = document.getElementById('performance-button');
+        performanceButton.classList.toggle('hidden', !currentChallenge.performance);
+        performanceButton.title = currentChallenge.performance || '';
         document.getElementById('challenge-modal').classList.remove('hidden');
     } catch (error) {
         console.error('Failed to load challenge:', error);
@@ -337,51 +405,143 @@ function resetCode() {
     }
 }
 
-async function submitCode() {
+// mode is 'run-all' for final submissions, 'fail-fast' for quick test runs or
+// 'performance' to run the tests and then the challenge's performance check
+async function submitCode(mode = 'run-all') {
     if (!currentChallenge) return;
     
     const code = document.getElementById('code-editor').value;
     
     try {
-        const response = await fetch(`/api/challenges/${currentChallenge.id}/submit`, {
+        const response = await apiFetch(`/api/challenges/${currentChallenge.id}/submit`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({code})
+            body: JSON.stringify({code, mode})
         });
         
-        const result = await response.json();
-        
-        const resultHTML = `
-            <div class="p-4 rounded ${result.status === 'passed' ? 'bg-green-100' : 'bg-red-100'}">
-                <h4 class="font-bold text-lg mb-2">
-                    ${result.status === 'passed' ? '✓ All Tests Passed!' : '✗ Some Tests Failed'}
-                </h4>
-                <p class="mb-3">Tests Passed: ${result.passed}/${result.total}</p>
-                ${result.status === 'passed' ? `<p class="text-green-600 font-semibold">+${currentChallenge.points} points earned!</p>` : ''}
-                <div class="mt-4 space-y-2">
-                    ${result.test_results.map(test => `
-                        <div class="p-2 bg-white rounded text-sm">
-                            <p class="font-semibold">${test.input}</p>
-                            ${test.error ? 
-                                `<p class="text-red-600">Error: ${test.error}</p>` :
-                                `<p>Expected: ${test.expected} | Got: ${test.actual} 
-                                ${test.passed ? '<span class="text-green-600">✓</span>' : '<span class="text-red-600">✗</span>'}</p>`
-                            }
-                        </div>
-                    `).join('')}
-                </div>
-            </div>
-        `;
-        
-        document.getElementById('code-result').innerHTML = resultHTML;
-        if (result.status === 'passed') {
-            loadDashboard();
+        const job = await readBody(response);
+        if (!response.ok) {
+            document.getElementById('code-result').innerHTML = `<p class="text-red-600">Error: ${job.error}</p>`;
+            return;
         }
+        
+        const progress = [];
+        renderGradingProgress(progress, job.total);
+        followGradingJob(job.job_id, progress, job.total);
     } catch (error) {
         console.error('Failed to submit code:', error);
     }
 }
 
+// Grading runs in the background; results arrive over SSE, or by polling
+// in browsers without EventSource
+function followGradingJob(jobId, progress, total) {
+    if (!window.EventSource) {
+        pollGradingJob(jobId, total);
+        return;
+    }
+    
+    const source = new EventSource(`/api/grading/jobs/${jobId}/events`);
+    source.addEventListener('progress', (e) => {
+        progress.push(JSON.parse(e.data));
+        renderGradingProgress(progress, total);
+    });
+    source.addEventListener('retry', () => {
+        progress.length = 0;
+        renderGradingProgress(progress, total);
+    });
+    source.addEventListener('done', (e) => {
+        source.close();
+        showGradingOutcome(JSON.parse(e.data));
+    });
+    source.addEventListener('timeout', () => {
+        source.close();
+        pollGradingJob(jobId, total);
+    });
+    source.onerror = () => {
+        source.close();
+        pollGradingJob(jobId, total);
+    };
+}
+
+async function pollGradingJob(jobId, total) {
+    try {
+        const response = await apiFetch(`/api/grading/jobs/${jobId}`);
+        const job = await readBody(response);
+        if (job.status === 'completed' || job.status === 'error') {
+            showGradingOutcome(job);
+            return;
+        }
+        renderGradingProgress(job.test_results, total);
+        setTimeout(() => pollGradingJob(jobId, total), 1000);
+    } catch (error) {
+        console.error('Failed to fetch grading job:', error);
+    }
+}
+
+function showGradingOutcome(job) {
+    if (job.status === 'error') {
+        document.getElementById('code-result').innerHTML = `
+            <div class="p-4 rounded bg-red-100">
+                <p class="text-red-600">Error: ${job.error}</p>
+            </div>
+        `;
+        return;
+    }
+    renderCodeResult(job.result);
+    if (job.result.status === 'passed' && job.result.mode !== 'fail-fast') {
+        loadDashboard();
+    }
+}
+
+function renderTestResult(test) {
+    return `
+        <div class="p-2 bg-white rounded text-sm">
+            <p class="font-semibold">${test.input}</p>
+            ${test.error ? 
+                `<p class="text-red-600">Error: ${test.error}</p>` :
+                `<p>Expected: ${test.expected} | Got: ${test.actual} 
+                ${test.passed ? '<span class="text-green-600">✓</span>' : '<span class="text-red-600">✗</span>'}</p>`
+            }
+        </div>
+    `;
+}
+
+function renderGradingProgress(testResults, total) {
+    document.getElementById('code-result').innerHTML = `
+        <div class="p-4 rounded bg-gray-100">
+            <h4 class="font-bold text-lg mb-2">
+                <i class="fas fa-spinner fa-spin"></i> Grading...
+            </h4>
+            <p class="mb-3">Tests Run: ${testResults.length}/${total}</p>
+            <div class="mt-4 space-y-2">
+                ${testResults.map(renderTestResult).join('')}
+            </div>
+        </div>
+    `;
+}
+
+function renderCodeResult(result) {
+    const resultHTML = `
+        <div class="p-4 rounded ${result.status === 'passed' ? 'bg-green-100' : 'bg-red-100'}">
+            <h4 class="font-bold text-lg mb-2">
+                ${result.status === 'passed' ? '✓ All Tests Passed!' : '✗ Some Tests Failed'}
+            </h4>
+            <p class="mb-3">Tests Passed: ${result.passed}/${result.total}</p>
+            ${result.cpu_ms !== undefined ? `<p class="text-sm text-gray-600 mb-3">CPU: ${result.cpu_ms} ms | Memory: ${(result.max_rss_kb / 1024).toFixed(1)} MB</p>` : ''}
+            ${result.test_results.length < result.total ? `<p class="text-sm text-gray-600 mb-3">Stopped early; ${result.total - result.test_results.length} test(s) not run.</p>` : ''}
+            ${result.mode === 'fail-fast' ?
+                `<p class="text-sm text-gray-600 mb-3">Practice run: no points awarded.</p>` :
+                result.status === 'passed' ? `<p class="text-green-600 font-semibold">+${currentChallenge.points} points earned!</p>` : ''}
+            <div class="mt-4 space-y-2">
+                ${result.test_results.map(renderTestResult).join('')}
+            </div>
+        </div>
+    `;
+    
+    document.getElementById('code-result').innerHTML = resultHTML;
+}
+
 // AI Chatbot
 async function sendMessage() {
     const input = document.getElementById('chat-input');
@@ -412,13 +572,13 @@ async function sendMessage() {
     `;
     
     try {
-        const response = await fetch('/api/chatbot', {
+        const response = await apiFetch('/api/chatbot', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({message})
         });
         
-        const data = await response.json();
+        const data = await readBody(response);
         
         // Remove loading indicator
         const loadingEl = document.getElementById('bot-loading');
@@ -462,94 +622,281 @@ let progressChart = null;
 
 async function loadDashboard() {
     try {
-        const [progressResponse, userResponse] = await Promise.all([
-            fetch('/api/progress'),
-            fetch('/api/user')
-        ]);
+        const response = await apiFetch('/api/dashboard');
+        renderDashboard(await readBody(response));
+    } catch (error) {
+        console.error('Failed to load dashboard:', error);
+    }
+}
+
+function renderDashboard(progressData) {
+    const userData = progressData.user;
+    
+    document.getElementById('total-points').textContent = userData.points;
+    document.getElementById('completed-modules').textContent = progressData.stats.completed_modules;
+    document.getElementById('avg-quiz-score').textContent = progressData.stats.avg_quiz_score + '%';
+    document.getElementById('passed-challenges').textContent = progressData.stats.passed_challenges;
+    
+    // Update chart
+    const ctx = document.getElementById('progress-chart');
+    if (ctx) {
+        if (progressChart) {
+            progressChart.destroy();
+        }
         
-        const progressData = await progressResponse.json();
-        const userData = await userResponse.json();
+        progressChart = new Chart(ctx, {
+            type: 'bar',
+            data: {
+                labels: ['Modules', 'Quizzes', 'Challenges', 'Total Points'],
+                datasets: [{
+                    label: 'Your Progress',
+                    data: [
+                        progressData.stats.completed_modules,
+                        progressData.stats.quiz_attempts,
+                        progressData.stats.passed_challenges,
+                        userData.points
+                    ],
+                    backgroundColor: [
+                        'rgba(34, 197, 94, 0.5)',
+                        'rgba(59, 130, 246, 0.5)',
+                        'rgba(168, 85, 247, 0.5)',
+                        'rgba(99, 102, 241, 0.5)'
+                    ],
+                    borderColor: [
+                        'rgb(34, 197, 94)',
+                        'rgb(59, 130, 246)',
+                        'rgb(168, 85, 247)',
+                        'rgb(99, 102, 241)'
+                    ],
+                    borderWidth: 2
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: true,
+                scales: {
+                    y: {
+                        beginAtZero: true
+                    }
+                }
+            }
+        });
+    }
+}
+
+// Recommendations: precomputed from what learners with similar history did next
+async function loadRecommendations() {
+    try {
+        const response = await apiFetch('/api/recommendations');
+        const recommendations = await readBody(response);
         
-        document.getElementById('total-points').textContent = userData.points;
-        document.getElementById('completed-modules').textContent = progressData.stats.completed_modules;
-        document.getElementById('avg-quiz-score').textContent = progressData.stats.avg_quiz_score + '%';
-        document.getElementById('passed-challenges').textContent = progressData.stats.passed_challenges;
+        const container = document.getElementById('recommendations-list');
+        if (recommendations.length === 0) {
+            container.innerHTML = '<p class="text-gray-600">Recommendations will appear here once you have started some modules.</p>';
+            return;
+        }
+        container.innerHTML = recommendations.map(item => `
+            <div class="flex justify-between items-center p-3 rounded border hover:bg-gray-50 cursor-pointer"
+                 onclick="openContent('${item.type}', ${item.id})">
+                <div>
+                    <span class="text-xs font-semibold text-indigo-600 mr-2">${CONTENT_TYPE_LABELS[item.type]}</span>
+                    <span class="font-semibold">${item.title}</span>
+                </div>
+                <span class="text-sm text-gray-500">${item.difficulty}</span>
+            </div>
+        `).join('');
+    } catch (error) {
+        console.error('Failed to load recommendations:', error);
+    }
+}
+
+// Review queue: quiz questions due again under the spaced-repetition schedule
+let reviewQueue = [];
+let reviewHasMore = false;
+
+async function loadReviews() {
+    try {
+        const response = await apiFetch('/api/review/due');
+        const data = await readBody(response);
+        reviewQueue = data.reviews;
+        reviewHasMore = data.has_more;
+        renderReviewCard();
+    } catch (error) {
+        console.error('Failed to load reviews:', error);
+    }
+}
+
+function renderReviewCard() {
+    const card = document.getElementById('review-card');
+    document.getElementById('review-due-count').textContent = reviewQueue.length
+        ? `${reviewQueue.length}${reviewHasMore ? '+' : ''} due`
+        : '';
+    
+    if (reviewQueue.length === 0) {
+        card.innerHTML = '<p class="text-gray-600">Nothing to review right now. Questions from your quizzes come back here when they are due.</p>';
+        return;
+    }
+    
+    const item = reviewQueue[0];
+    card.innerHTML = `
+        <p class="text-sm text-gray-500 mb-2">${item.quiz_title}</p>
+        <p class="font-semibold mb-3">${item.question}</p>
+        ${item.options.map((option, optIndex) => `
+            <button onclick="answerReview(${optIndex})" class="block w-full text-left mb-2 p-2 rounded border hover:bg-gray-100">
+                ${option}
+            </button>
+        `).join('')}
+    `;
+}
+
+async function answerReview(answer) {
+    const item = reviewQueue[0];
+    if (!item) return;
+    
+    try {
+        const response = await apiFetch('/api/review/answer', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                quiz_id: item.quiz_id,
+                question_index: item.question_index,
+                answer: answer
+            })
+        });
+        const result = await readBody(response);
+        const days = Math.round(result.interval_days);
         
-        // Update chart
-        const ctx = document.getElementById('progress-chart');
-        if (ctx) {
-            if (progressChart) {
-                progressChart.destroy();
-            }
-            
-            progressChart = new Chart(ctx, {
-                type: 'bar',
-                data: {
-                    labels: ['Modules', 'Quizzes', 'Challenges', 'Total Points'],
-                    datasets: [{
-                        label: 'Your Progress',
-                        data: [
-                            progressData.stats.completed_modules,
-                            progressData.stats.quiz_attempts,
-                            progressData.stats.passed_challenges,
-                            userData.points
-                        ],
-                        backgroundColor: [
-                            'rgba(34, 197, 94, 0.5)',
-                            'rgba(59, 130, 246, 0.5)',
-                            'rgba(168, 85, 247, 0.5)',
-                            'rgba(99, 102, 241, 0.5)'
-                        ],
-                        borderColor: [
-                            'rgb(34, 197, 94)',
-                            'rgb(59, 130, 246)',
-                            'rgb(168, 85, 247)',
-                            'rgb(99, 102, 241)'
-                        ],
-                        borderWidth: 2
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    maintainAspectRatio: true,
-                    scales: {
-                        y: {
-                            beginAtZero: true
-                        }
-                    }
+        document.getElementById('review-card').innerHTML = `
+            <p class="font-semibold mb-2">${item.question}</p>
+            <p class="mb-2">
+                ${result.correct ?
+                    '<span class="text-green-600">✓ Correct</span>' :
+                    `<span class="text-red-600">✗ Wrong - Correct answer: ${item.options[result.correct_answer]}</span>`
                 }
-            });
+            </p>
+            <p class="text-sm text-gray-500 mb-4">Next review in ${days} day${days === 1 ? '' : 's'}</p>
+            <button onclick="nextReview()" class="bg-indigo-600 text-white px-6 py-2 rounded hover:bg-indigo-700">Next</button>
+        `;
+    } catch (error) {
+        console.error('Failed to answer review:', error);
+    }
+}
+
+function nextReview() {
+    reviewQueue.shift();
+    if (reviewQueue.length === 0 && reviewHasMore) {
+        loadReviews();
+        return;
+    }
+    renderReviewCard();
+}
+
+// Search
+const SEARCH_DELAY_MS = 200;
+const CONTENT_TYPE_LABELS = {module: 'Module', quiz: 'Quiz', challenge: 'Challenge'};
+let searchTimer = null;
+let searchPage = 1;
+// Only the newest search may render; earlier responses can arrive after it
+let searchSequence = 0;
+
+function scheduleSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => runSearch(1), SEARCH_DELAY_MS);
+}
+
+async function runSearch(page) {
+    const query = document.getElementById('search-input').value.trim();
+    const type = document.getElementById('search-type').value;
+    const sequence = ++searchSequence;
+    searchPage = page;
+    
+    if (!query) {
+        renderSearchResults({results: [], page: 1, has_more: false}, query);
+        return;
+    }
+    
+    try {
+        const params = new URLSearchParams({q: query, page});
+        if (type) params.set('type', type);
+        const response = await apiFetch(`/api/search?${params}`);
+        const data = await readBody(response);
+        if (sequence === searchSequence) {
+            renderSearchResults(data, query);
         }
     } catch (error) {
-        console.error('Failed to load dashboard:', error);
+        console.error('Search failed:', error);
+    }
+}
+
+function renderSearchResults(data, query) {
+    const container = document.getElementById('search-results');
+    if (query && data.results.length === 0) {
+        container.innerHTML = '<p class="text-gray-600">No matches found.</p>';
+    } else {
+        // Snippets arrive HTML-escaped, with matches wrapped in <mark>
+        container.innerHTML = data.results.map(result => `
+            <div class="bg-white rounded-lg shadow-lg p-6 hover:shadow-xl transition cursor-pointer"
+                 onclick="openContent('${result.type}', ${result.id}, ${result.module_id || 'null'})">
+                <span class="inline-block px-3 py-1 rounded text-xs font-semibold mb-2 bg-indigo-100 text-indigo-800">
+                    ${CONTENT_TYPE_LABELS[result.type]}
+                </span>
+                <h3 class="text-xl font-bold mb-2">${result.title}</h3>
+                <p class="text-gray-600">${result.snippet}</p>
+            </div>
+        `).join('');
+    }
+    document.getElementById('search-prev').classList.toggle('hidden', data.page <= 1);
+    document.getElementById('search-next').classList.toggle('hidden', !data.has_more);
+}
+
+// Opens a module, a quiz (through its module) or a challenge from anywhere
+async function openContent(type, id, moduleId) {
+    if (type === 'challenge') {
+        showPage('code');
+        openChallenge(id);
+        return;
+    }
+    showPage('learn');
+    if (type === 'module') {
+        openModule(id);
+    } else {
+        await openModule(moduleId);
+        startQuiz();
     }
 }
 
 // Leaderboard
 async function loadLeaderboard() {
     try {
-        const response = await fetch('/api/leaderboard');
-        const leaderboard = await response.json();
-        
-        const tbody = document.getElementById('leaderboard-body');
-        tbody.innerHTML = leaderboard.map((user, index) => `
-            <tr class="${index < 3 ? 'bg-yellow-50' : 'hover:bg-gray-50'}">
-                <td class="px-6 py-4">
-                    ${index === 0 ? '🥇' : index === 1 ? '🥈' : index === 2 ? '🥉' : index + 1}
-                </td>
-                <td class="px-6 py-4 font-semibold">${user.full_name || 'Anonymous'}</td>
-                <td class="px-6 py-4">${user.username}</td>
-                <td class="px-6 py-4">
-                    <span class="inline-block bg-indigo-100 text-indigo-800 px-3 py-1 rounded font-semibold">
-                        ${user.points} pts
-                    </span>
-                </td>
-            </tr>
-        `).join('');
+        // Kept current by the live update stream once it is connected
+        if (leaderboardEntries) {
+            renderLeaderboard(leaderboardEntries);
+            return;
+        }
+        const response = await apiFetch('/api/leaderboard');
+        renderLeaderboard(await readBody(response));
     } catch (error) {
         console.error('Failed to load leaderboard:', error);
     }
 }
 
+function renderLeaderboard(leaderboard) {
+    const tbody = document.getElementById('leaderboard-body');
+    tbody.innerHTML = leaderboard.map((user, index) => `
+        <tr class="${index < 3 ? 'bg-yellow-50' : 'hover:bg-gray-50'}">
+            <td class="px-6 py-4">
+                ${index === 0 ? '🥇' : index === 1 ? '🥈' : index === 2 ? '🥉' : index + 1}
+            </td>
+            <td class="px-6 py-4 font-semibold">${user.full_name || 'Anonymous'}</td>
+            <td class="px-6 py-4">${user.username}</td>
+            <td class="px-6 py-4">
+                <span class="inline-block bg-indigo-100 text-indigo-800 px-3 py-1 rounded font-semibold">
+                    ${user.points} pts
+                </span>
+            </td>
+        </tr>
+    `).join('');
+}
+
 // Initialize
 checkAuth();
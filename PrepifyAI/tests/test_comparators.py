@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from comparators import compare_output, prepare_expected
+
+def matches(actual, expected, **options):
+    """compare_output as grading calls it, with the expected side prepared
+    (and round-tripped through JSON storage) when the comparator supports it"""
+    test_case = dict(options, expected=expected)
+    return compare_output(actual, test_case, json.loads(json.dumps(prepare_expected(test_case))))
+
+def test_exact_is_the_default():
+    assert matches('42', '42')
+    assert not matches('42.0', '42')
+    assert not matches('a  b', 'a b')
+
+def test_whitespace():
+    assert matches('a   b\n c', 'a b c', compare='whitespace')
+    assert not matches('ab c', 'a b c', compare='whitespace')
+
+@pytest.mark.parametrize('actual, expected', [
+    ('0.30000000000000004', '0.3'),
+    ('Total: 3.0 items', 'Total: 3 items'),
+    ('5.55e-17', '0'),
+    ('5.55e-17', '0.0'),
+    ('nan', 'nan'),
+    ('Hannan 3', 'Hannan 3'),
+])
+def test_numeric_matches(actual, expected):
+    assert matches(actual, expected, compare='numeric')
+
+@pytest.mark.parametrize('actual, expected', [
+    ('1000000000001', '1000000000000'),
+    ('12345678901234567890', '12345678901234567891'),
+    ('0.31', '0.3'),
+    ('Total: 3 items', 'Total: 3 boxes'),
+    ('Hannan 3', 'Hanna 3'),
+    ('1 2', '1'),
+])
+def test_numeric_mismatches(actual, expected):
+    assert not matches(actual, expected, compare='numeric')
+
+def test_numeric_tolerances():
+    assert matches('1.0001', '1', compare='numeric', tolerance=1e-3)
+    assert matches('5.55e-17', '0', compare='numeric', tolerance=1e-6)
+    assert not matches('1e-12', '0', compare='numeric', abs_tolerance=0)
+
+@pytest.mark.parametrize('actual, expected', [
+    ('[1, 2, 3]', '(1, 2, 3)'),
+    ("{'a': [0.1, 0.2]}", "{'a': [0.1, 0.2000000000001]}"),
+    ('[5.55e-17, 1]', '[0, 1]'),
+    ('[True, None]', '[True, None]'),
+])
+def test_literal_matches(actual, expected):
+    assert matches(actual, expected, compare='literal')
+
+@pytest.mark.parametrize('actual, expected', [
+    ('True', '1'),
+    ('False', '0.0'),
+    ('1', 'True'),
+    ('[True, 0]', '[1, False]'),
+    ('[1, 2]', '[1, 2, 3]'),
+    ("{'a': 1}", "{'b': 1}"),
+    ('not a literal', '[1]'),
+])
+def test_literal_mismatches(actual, expected):
+    assert not matches(actual, expected, compare='literal')
+
+def test_unknown_comparator():
+    with pytest.raises(ValueError):
+        prepare_expected({'expected': '1', 'compare': 'fuzzy'})
@@ -0,0 +1,231 @@
+"""The storage backends must behave the same: every test here runs against a
+fresh SQLite file and, when PREPIFY_TEST_POSTGRES_URL points at a server
+where it may create databases, a fresh PostgreSQL database.
+
+    PREPIFY_TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres python -m pytest tests
+"""
+import os
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import get_database
+
+POSTGRES_URL = os.environ.get('PREPIFY_TEST_POSTGRES_URL')
+
+QUESTIONS = [
+    {'question': 'What does len([1, 2]) return?', 'options': ['1', '2'], 'correct': 1},
+    {'question': 'Is a tuple mutable?', 'options': ['Yes', 'No'], 'correct': 1},
+]
+TEST_CASES = [{'description': 'adds', 'input': 'print(add(1, 2))', 'expected': '3'}]
+
+def postgres_database():
+    """A scratch database on the test server: yields its URL, then drops it"""
+    if not POSTGRES_URL:
+        pytest.skip('PREPIFY_TEST_POSTGRES_URL is not set')
+    psycopg = pytest.importorskip('psycopg')
+    try:
+        admin = psycopg.connect(POSTGRES_URL, autocommit=True)
+    except psycopg.OperationalError as e:
+        pytest.skip(f'PostgreSQL is unavailable: {e}')
+    name = f'prepify_test_{uuid.uuid4().hex}'
+    admin.execute(f'CREATE DATABASE {name}')
+    try:
+        yield urlsplit(POSTGRES_URL)._replace(path=f'/{name}').geturl()
+    finally:
+        admin.execute(f'DROP DATABASE {name} WITH (FORCE)')
+        admin.close()
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def db(request, tmp_path):
+    if request.param == 'sqlite':
+        yield get_database(str(tmp_path / 'prepify.db'))
+        return
+    urls = postgres_database()
+    database = get_database(next(urls))
+    yield database
+    for pool in set(database.connection_pools()):
+        pool.close()
+    urls.close()
+
+def create_users(db, *names):
+    return [db.create_user(name, f'{name}@example.com', 'secret', name.title()) for name in names]
+
+def add_challenge(db, points=20):
+    return db.add_challenge('Add', '<p>Add two numbers</p>', 'beginner', 'def add(a, b):\n    pass',
+                            TEST_CASES, 'Use +', points)
+
+def result(status, passed, total=1):
+    return {'status': status, 'passed': passed, 'total': total, 'mode': 'run-all', 'test_results': [],
+            'cpu_ms': 5.0}
+
+def test_users_and_points(db):
+    user_id, = create_users(db, 'ada')
+    assert db.create_user('ada', 'other@example.com', 'secret', 'Ada') is None
+    assert db.authenticate_user('ada', 'secret')['id'] == user_id
+    assert db.authenticate_user('ada', 'wrong') is None
+
+    db.update_user_points(user_id, 15)
+    db.update_user_points(user_id, 10)
+    assert db.get_user(user_id)['points'] == 25
+    assert db.get_user(user_id + 1000) is None
+
+def test_quiz_attempts(db):
+    user_id, = create_users(db, 'ada')
+    module_id = db.add_module('Lists', 'python', 'beginner', '<p>Lists</p>', 1)
+    quiz_id = db.add_quiz(module_id, 'Lists quiz', QUESTIONS, 10)
+    db.record_quiz_attempt(user_id, quiz_id, 1, 2)
+    db.record_quiz_attempt(user_id, quiz_id, 2, 2)
+    db.mark_module_complete(user_id, module_id)
+
+    stats = db.get_user_stats(user_id)
+    assert stats['quiz_attempts'] == 2
+    assert stats['avg_quiz_score'] == 75
+    assert stats['completed_modules'] == 1
+    assert db.get_module_quiz(module_id)['questions'] == QUESTIONS
+
+def test_challenge_submissions(db):
+    user_id, = create_users(db, 'ada')
+    challenge_id = add_challenge(db)
+    db.record_submission(user_id, challenge_id, 'def add(a, b):\n    return a - b', 'failed', 0, 1)
+    db.record_submission(user_id, challenge_id, 'def add(a, b):\n    return a + b', 'passed', 1, 1)
+
+    stats = db.get_user_stats(user_id)
+    assert stats['total_submissions'] == 2
+    assert stats['passed_challenges'] == 1
+    assert db.get_challenge(challenge_id)['test_cases'][0]['expected'] == '3'
+
+def test_leaderboard(db):
+    ada, bob, cy = create_users(db, 'ada', 'bob', 'cy')
+    db.update_user_points(bob, 30)
+    db.update_user_points(cy, 30)
+    db.update_user_points(ada, 10)
+
+    # Ties go to the earlier account
+    assert [user['id'] for user in db.get_leaderboard()] == [bob, cy, ada]
+    assert [user['points'] for user in db.get_leaderboard(limit=2)] == [30, 30]
+
+def test_review_scheduling(db):
+    user_id, = create_users(db, 'ada')
+    module_id = db.add_module('Lists', 'python', 'beginner', '<p>Lists</p>', 1)
+    quiz_id = db.add_quiz(module_id, 'Lists quiz', QUESTIONS, 10)
+    now = time.time()
+    db.record_quiz_attempt(user_id, quiz_id, 1, 2, {0: True, 1: False})
+
+    assert db.get_due_reviews(user_id, now=now) == []
+    due = db.get_due_reviews(user_id, now=now + 2 * 86400)
+    assert [review['question_index'] for review in due] == [0, 1]
+    assert due[1]['question'] == QUESTIONS[1]['question']
+
+    # A second correct answer pushes the question out to 6 days
+    state = db.answer_review(user_id, quiz_id, 0, True)
+    assert state['repetitions'] == 2
+    assert state['interval_days'] == 6
+    due = db.get_due_reviews(user_id, now=now + 2 * 86400)
+    assert [review['question_index'] for review in due] == [1]
+
+def test_search_indexes_text_not_markup(db):
+    module_id = db.add_module('Lists', 'python', 'beginner', '<strong>Slicing</strong> lists', 1)
+    assert [result['id'] for result in db.search('slicing')[0]] == [module_id]
+    assert db.search('strong') == ([], False)
+
+    # Written by another client, bypassing the app; a rebuild strips it
+    with db.get_connection() as conn:
+        conn.execute('UPDATE modules SET content = ? WHERE id = ?', ('<em>Striding</em> lists', module_id))
+        conn.commit()
+    db.rebuild_search_index()
+    assert [result['id'] for result in db.search('striding')[0]] == [module_id]
+    assert db.search('em') == ([], False)
+
+def test_grading_claim_progress_complete(db):
+    user_id, = create_users(db, 'ada')
+    challenge_id = add_challenge(db)
+    job_id = db.enqueue_grading_job(user_id, challenge_id, 'def add(a, b):\n    return a + b')
+
+    job = db.claim_grading_job('worker-1')
+    assert (job['id'], job['status'], job['attempts']) == (job_id, 'running', 1)
+    assert db.claim_grading_job('worker-2') is None
+
+    db.update_grading_job_progress(job_id, 'worker-1', [{'input': 'adds', 'passed': True}])
+    assert db.get_grading_job(job_id)['test_results'] == [{'input': 'adds', 'passed': True}]
+
+    assert not db.complete_grading_job(job_id, 'worker-2', result('passed', 1), 20)
+    assert db.complete_grading_job(job_id, 'worker-1', result('passed', 1), 20)
+    job = db.get_grading_job(job_id)
+    assert job['status'] == 'completed'
+    assert job['result']['status'] == 'passed'
+    assert db.get_user(user_id)['points'] == 20
+    assert db.get_user_stats(user_id)['passed_challenges'] == 1
+    assert db.get_user_cpu_usage(user_id, 3600)['cpu_ms'] == 5.0
+
+def test_grading_failure_retries(db):
+    user_id, = create_users(db, 'ada')
+    job_id = db.enqueue_grading_job(user_id, add_challenge(db), 'def add(a, b): pass', max_attempts=2)
+
+    db.claim_grading_job('worker-1')
+    db.fail_grading_job(job_id, 'worker-1', 'Grader crashed', retry_delay=60)
+    assert db.get_grading_job(job_id)['status'] == 'queued'
+    # Not available again until the retry delay is over
+    assert db.claim_grading_job('worker-2') is None
+
+    job_id = db.enqueue_grading_job(user_id, add_challenge(db), 'def add(a, b): pass', max_attempts=2)
+    for attempt in (1, 2):
+        assert db.claim_grading_job('worker-1')['attempts'] == attempt
+        db.fail_grading_job(job_id, 'worker-1', 'Grader crashed', retry_delay=0)
+    job = db.get_grading_job(job_id)
+    assert (job['status'], job['error']) == ('error', 'Grader crashed')
+    assert db.get_user_stats(user_id)['total_submissions'] == 0
+
+def test_grading_weights(db):
+    ada, bob = create_users(db, 'ada', 'bob')
+    challenge_id = add_challenge(db)
+    assert db.set_grading_weight(ada, 4)
+    assert not db.set_grading_weight(bob + 1000, 4)
+
+    # Ada's jobs cost her a quarter as much of her share, so both of hers
+    # go ahead of Bob's job even though his was queued first
+    bob_job = db.enqueue_grading_job(bob, challenge_id, 'def add(a, b): pass')
+    ada_jobs = [db.enqueue_grading_job(ada, challenge_id, 'def add(a, b): pass') for _ in range(2)]
+    claimed = [db.claim_grading_job('worker-1')['id'] for _ in range(3)]
+    assert claimed == ada_jobs + [bob_job]
+
+def test_grading_lease_expiry(db):
+    user_id, = create_users(db, 'ada')
+    job_id = db.enqueue_grading_job(user_id, add_challenge(db), 'def add(a, b): pass', max_attempts=2)
+
+    # A worker that stops renewing its lease loses the job to another one
+    db.claim_grading_job('worker-1', lease_seconds=-1)
+    job = db.claim_grading_job('worker-2', lease_seconds=-1)
+    assert (job['id'], job['worker_id'], job['attempts']) == (job_id, 'worker-2', 2)
+    assert not db.complete_grading_job(job_id, 'worker-1', result('failed', 0), 0)
+
+    # Once out of attempts an expired job is given up on
+    assert db.claim_grading_job('worker-3') is None
+    job = db.get_grading_job(job_id)
+    assert (job['status'], job['error']) == ('error', 'Grader worker stopped responding')
+
+def test_failed_write_releases_the_writer(db):
+    user_id, = create_users(db, 'ada')
+    job_id = db.enqueue_grading_job(user_id, add_challenge(db), 'def add(a, b): pass')
+    db.claim_grading_job('worker-1')
+
+    # Raises after the job's UPDATE, half way through the transaction. The
+    # traceback (kept alive here, as a debugger or logging would) must not
+    # keep the connection from going back to its pool
+    broken = result('passed', 1)
+    del broken['passed']
+    with pytest.raises(KeyError) as failure:
+        db.complete_grading_job(job_id, 'worker-1', broken, 20)
+
+    started = time.monotonic()
+    db.fail_grading_job(job_id, 'worker-1', 'Grader crashed')
+    assert time.monotonic() - started < 1
+    assert failure.traceback
+    job = db.get_grading_job(job_id)
+    assert (job['status'], job['error'], job['result']) == ('queued', 'Grader crashed', None)
@@ -0,0 +1,113 @@
+import json
+import os
+import resource
+import select
+import signal
+import time
+
+from sandbox import RUN_ALL, TEST_TIMEOUT_SECONDS, grade_results, grading_total, iter_test_results
+
+# Zygote-style execution: the calling process has already imported the
+# sandbox (the SAFE_MODULES whitelist and the restricted builtins table), so
+# each job runs in a copy-on-write fork of it instead of a cold interpreter.
+# A fresh child per job also means a submission that mutates math or random
+# cannot leak into the next one.
+
+# Extra time allowed per test case beyond the in-sandbox alarm before the
+# child is killed outright (e.g. a C-level loop that never yields to SIGALRM)
+KILL_GRACE_SECONDS = 2
+
+def run_child(write_fd, forked_at, code, test_cases, mode, performance):
+    # Stream one JSON message per line: startup latency, each result, then done.
+    # The first message also carries the memory the child started with: the
+    # pages it shares with the zygote count towards its peak RSS
+    with os.fdopen(write_fd, 'w') as out:
+        out.write(json.dumps({
+            'startup_ms': (time.monotonic() - forked_at) * 1000,
+            'inherited_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        }) + '\n')
+        out.flush()
+        for test_result in iter_test_results(code, test_cases, mode, performance):
+            out.write(json.dumps({'result': test_result}) + '\n')
+            out.flush()
+        out.write(json.dumps({'done': True}) + '\n')
+
+def iter_forked_results(code, test_cases, mode=RUN_ALL, stats=None, performance=None):
+    """Run the sandbox in a forked child, yielding test results as the child reports them"""
+    read_fd, write_fd = os.pipe()
+    forked_at = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            os.close(read_fd)
+            run_child(write_fd, forked_at, code, test_cases, mode, performance)
+            exit_code = 0
+        finally:
+            # Skip the parent's atexit handlers and buffered state
+            os._exit(exit_code)
+
+    os.close(write_fd)
+    finished = False
+    reported = 0
+    buffer = b''
+    try:
+        while not finished:
+            ready, _, _ = select.select([read_fd], [], [], TEST_TIMEOUT_SECONDS + KILL_GRACE_SECONDS)
+            if not ready:
+                os.kill(pid, signal.SIGKILL)
+                yield sandbox_failure(test_cases, reported, 'Execution timeout (max 5 seconds)')
+                return
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            *lines, buffer = (buffer + chunk).split(b'\n')
+            for line in lines:
+                message = json.loads(line)
+                if 'startup_ms' in message:
+                    if stats is not None:
+                        stats['startup_ms'] = message['startup_ms']
+                        stats['inherited_rss_kb'] = message['inherited_rss_kb']
+                elif 'result' in message:
+                    reported += 1
+                    yield message['result']
+                else:
+                    finished = True
+        if not finished:
+            yield sandbox_failure(test_cases, reported, 'Sandbox process exited unexpectedly')
+    finally:
+        os.close(read_fd)
+        if not finished:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        # Resource usage of the child alone, for per-user accounting; memory
+        # is what the submission added on top of the zygote's
+        _, _, usage = os.wait4(pid, 0)
+        if stats is not None:
+            stats['cpu_ms'] = (usage.ru_utime + usage.ru_stime) * 1000
+            stats['max_rss_kb'] = max(0, usage.ru_maxrss - stats.get('inherited_rss_kb', 0))
+
+def sandbox_failure(test_cases, reported, error):
+    # Attribute the failure to the test case the child was running
+    if reported < len(test_cases):
+        description = test_cases[reported].get('description', 'Test case')
+    else:
+        description = 'Sandbox'
+    return {'input': description, 'error': error, 'passed': False}
+
+def execute_code_forked(code, test_cases, on_result=None, mode=RUN_ALL, performance=None):
+    """Same contract as sandbox.execute_code, but each call runs in a fresh forked child"""
+    stats = {}
+    result = grade_results(
+        iter_forked_results(code, test_cases, mode, stats, performance),
+        grading_total(test_cases, mode, performance),
+        on_result,
+        mode
+    )
+    if 'startup_ms' in stats:
+        result['startup_ms'] = round(stats['startup_ms'], 3)
+    result['cpu_ms'] = round(stats['cpu_ms'], 3)
+    result['max_rss_kb'] = stats['max_rss_kb']
+    return result